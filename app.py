@@ -1,13 +1,20 @@
 import os
+import json
+import asyncio
 import logging
+import threading
 import time
-from typing import List
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
-from src.document_processor import DocumentProcessor
 from src.rag_engine import RAGEngine
-from src.llm_client import LLMClient
+from src.llm_client import GENERATION_ERROR, LLMClient
+from src.admission import PRIORITY_DEFAULT, PRIORITY_INTERACTIVE, Overloaded
+from src.answer_cache import AnswerCache
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -28,94 +35,413 @@ app = FastAPI(
 rag_engine = None
 llm_client = None
 doc_processor = None
+answer_cache = None
+rebuild_lock = threading.Lock()
+# CPU-bound work (query embedding, search, rerank) runs here, never on the event loop;
+# requests beyond SEARCH_WORKERS queue for a free worker
+search_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SEARCH_WORKERS", "2")),
+    thread_name_prefix="search"
+)
+
+PIPELINE_MODES = ["serial", "speculative"]
+# serial: expand, then search the expansion; speculative: search the raw question while
+# expanding, then merge in the expansion's results if they arrive within the budget
+pipeline_mode = os.getenv("PIPELINE_MODE", "serial")
+if pipeline_mode not in PIPELINE_MODES:
+    raise ValueError(f"Unknown PIPELINE_MODE '{pipeline_mode}', expected one of {PIPELINE_MODES}")
+expansion_budget = float(os.getenv("EXPANSION_BUDGET_MS", "3000")) / 1000
 
 class ChatRequest(BaseModel):
     question: str
+    # Optional scope: only chunks from these source files / in these languages ("en", "th")
+    sources: Optional[List[str]] = None
+    languages: Optional[List[str]] = None
 
 class ChatResponse(BaseModel):
     answer: str
     expanded_query: str
     retrieved_docs: List[dict]
     processing_time: float
+    # "hit" (same question), "semantic" (near-duplicate) or "miss", plus running counts
+    cache: Optional[dict] = None
 
 class RebuildResponse(BaseModel):
     status: str
     message: str
 
+def docs_metadata(docs) -> List[dict]:
+    return [
+        {
+            "source": d.metadata.get("source"),
+            "page": d.metadata.get("logical_page"),
+            "score": "N/A" 
+        } 
+        for d in docs
+    ]
+
+def cache_scope(request: ChatRequest) -> tuple:
+    # Answers are only reused for the same index contents and the same filters
+    return (tuple(sorted(request.sources or [])), tuple(sorted(request.languages or [])))
+
+async def run_blocking(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(search_executor, partial(func, *args, **kwargs))
+
+async def retrieve_context(engine: RAGEngine, request: ChatRequest,
+                           priority: int = PRIORITY_DEFAULT) -> Tuple[str, list, dict]:
+    """Expanded query, retrieved chunks and stage timings for a chat request, per PIPELINE_MODE."""
+    start_time = time.time()
+    query = request.question
+
+    def search(text: str):
+        # Timings are thread-local: read them on the worker that ran the search
+        docs = engine.search(text, sources=request.sources, languages=request.languages)
+        return docs, engine.last_timings()
+
+    if pipeline_mode == "serial":
+        expanded_query = await llm_client.aexpand_query(query, priority)
+        expansion_time = time.time() - start_time
+        docs, search_timings = await run_blocking(search, expanded_query)
+        return expanded_query, docs, {"expansion": round(expansion_time, 2), "search_stages_ms": search_timings}
+
+    cached_expansion = llm_client.cached_expansion(query)
+    if cached_expansion is not None:
+        # No expansion latency to hide: the raw-question search would only be discarded
+        docs, search_timings = await run_blocking(search, cached_expansion)
+        return cached_expansion, docs, {"expansion": round(time.time() - start_time, 2),
+                                        "search_stages_ms": search_timings, "expansion_used": True}
+
+    raw_search = asyncio.ensure_future(run_blocking(search, query))
+    expansion = asyncio.ensure_future(llm_client.aexpand_query(query, priority))
+    try:
+        # Shielded: a late expansion still completes and lands in the expansion cache
+        expanded_query = await asyncio.wait_for(asyncio.shield(expansion), expansion_budget)
+    except asyncio.TimeoutError:
+        expanded_query = None
+    expansion_time = time.time() - start_time
+
+    raw_docs, search_timings = await raw_search
+    timings = {"expansion": round(expansion_time, 2), "search_stages_ms": search_timings}
+    # A timed-out or failed expansion (the raw query back) leaves the raw-question results
+    if not expanded_query or expanded_query == query:
+        timings["expansion_used"] = False
+        return query, raw_docs, timings
+
+    expanded_docs, timings["expanded_search_stages_ms"] = await run_blocking(search, expanded_query)
+    timings["expansion_used"] = True
+    return expanded_query, engine.merge_results([expanded_docs, raw_docs]), timings
+
+def get_doc_processor():
+    # Created on the first ingestion: docling imports torch, which serving an existing index never needs
+    global doc_processor
+    if doc_processor is None:
+        from src.document_processor import DocumentProcessor
+        doc_processor = DocumentProcessor()
+    return doc_processor
+
+def get_page_store_path() -> str:
+    return os.path.join(os.getenv("OUTPUT_PATH", "ingested_data/"), "ingested_documents.jsonl")
+
 @app.on_event("startup")
 async def startup_event():
-    global rag_engine, llm_client, doc_processor
+    global rag_engine, llm_client, answer_cache
     
     logger.info("Starting Cyber-RAG Server...")
     
-    doc_processor = DocumentProcessor()
     rag_engine = RAGEngine()
     llm_client = LLMClient() 
+    # Question embeddings come from the engine's model, shared by every index version
+    answer_cache = AnswerCache(
+        rag_engine.embeddings,
+        max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+        ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+        # Unset: exact matches only; near-duplicate matching is opt-in
+        threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD")) if os.getenv("ANSWER_CACHE_THRESHOLD") else None
+    )
     
-    json_path = os.path.join(os.getenv("OUTPUT_PATH", "ingested_data/"), "ingested_documents.json")
+    store_path = get_page_store_path()
     
-    if os.path.exists(json_path) and not rag_engine.load_index():
-        logger.info("Index not found on disk. Building from JSON...")
-        docs = rag_engine.load_documents_from_json(json_path)
-        rag_engine.build_index(docs)
-    elif rag_engine.load_index():
+    if rag_engine.load_index():
         logger.info("Database loaded successfully.")
+    elif os.path.exists(store_path):
+        logger.info("Index not found on disk. Building from page store...")
+        docs = rag_engine.iter_documents_from_jsonl(store_path)
+        rag_engine.build_index(docs)
     else:
         logger.warning("No data found. Please call /rebuild-index endpoint.")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if rag_engine:
+        rag_engine.rerank_scorer.log_stats()
+    if answer_cache:
+        answer_cache.log_stats()
+    if llm_client:
+        await llm_client.aclose()
+    search_executor.shutdown(wait=False)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "service": "Cyber-RAG"}
 
+@app.get("/queue")
+async def queue_stats():
+    """Slots, queue depth and wait times of the expander and generator models, and cache hit rates."""
+    if not llm_client:
+        raise HTTPException(status_code=503, detail="System is initializing.")
+    stats = llm_client.admission_stats()
+    if rag_engine:
+        # Pair scores are shared by every index version, so this covers the process lifetime
+        stats["rerank_cache"] = rag_engine.rerank_scorer.stats()
+    if answer_cache:
+        stats["answer_cache"] = answer_cache.stats()
+    return stats
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
     start_time = time.time()
     query = request.question
+    # One snapshot per request: a rebuild may swap the global engine mid-request
+    engine = rag_engine
     
-    if not rag_engine:
+    if not engine:
         raise HTTPException(status_code=503, detail="System is initializing or index not ready.")
 
     try:
-        expanded_query = llm_client.expand_query(query)
-        
-        retrieved_docs = rag_engine.search(expanded_query)
+        scope = cache_scope(request)
+        cached, question_vector, similarity = await run_blocking(
+            answer_cache.lookup, query, engine.cache_version, scope
+        )
+        if cached:
+            return ChatResponse(
+                answer=cached.answer,
+                expanded_query=cached.expanded_query,
+                retrieved_docs=cached.retrieved_docs,
+                processing_time=round(time.time() - start_time, 2),
+                cache={"status": "hit" if similarity == 1.0 else "semantic",
+                       "similarity": round(similarity, 4), **answer_cache.stats()}
+            )
+
+        # Refused before retrieval rather than after it, when the generator is already saturated
+        llm_client.generate_admission.check()
+        expanded_query, retrieved_docs, _ = await retrieve_context(engine, request)
         
-        final_answer = llm_client.generate_answer(query, retrieved_docs)
+        final_answer = await llm_client.agenerate_answer(query, retrieved_docs)
         
-        docs_metadata = [
-            {
-                "source": d.metadata.get("source"),
-                "page": d.metadata.get("logical_page"),
-                "score": "N/A" 
-            } 
-            for d in retrieved_docs
-        ]
+        citations = docs_metadata(retrieved_docs)
+
+        if final_answer != GENERATION_ERROR:
+            answer_cache.store(query, engine.cache_version, scope, final_answer,
+                               expanded_query, citations, vector=question_vector)
 
         process_time = time.time() - start_time
         
         return ChatResponse(
             answer=final_answer,
             expanded_query=expanded_query,
-            retrieved_docs=docs_metadata,
-            processing_time=round(process_time, 2)
+            retrieved_docs=citations,
+            processing_time=round(process_time, 2),
+            cache={"status": "miss", **answer_cache.stats()}
         )
 
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error(f"Error processing chat: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """/chat as newline-delimited JSON events, sent as soon as each stage has them.
+
+    {"type": "retrieval", ...} with the expanded query and citations once the search
+    is done, then {"type": "token", "content": ...} per generated piece of the answer,
+    then {"type": "done", ...} with timings (or {"type": "error", "detail": ...}).
+    A saturated generator refuses the request up front with 429/503 and Retry-After.
+    """
+    start_time = time.time()
+    query = request.question
+    engine = rag_engine
+
+    if not engine:
+        raise HTTPException(status_code=503, detail="System is initializing or index not ready.")
+
+    def event(payload: dict) -> str:
+        return json.dumps(payload, ensure_ascii=False) + "\n"
+
+    scope = cache_scope(request)
+    cached, question_vector, similarity = await run_blocking(
+        answer_cache.lookup, query, engine.cache_version, scope
+    )
+    if not cached:
+        # While the status can still be 429/503; later overloads are reported in-band
+        llm_client.generate_admission.check()
+
+    async def events():
+        try:
+            if cached:
+                yield event({"type": "retrieval", "expanded_query": cached.expanded_query,
+                             "retrieved_docs": cached.retrieved_docs,
+                             "retrieval_time": round(time.time() - start_time, 2)})
+                yield event({"type": "token", "content": cached.answer})
+                yield event({"type": "done", "processing_time": round(time.time() - start_time, 2),
+                             "cache": {"status": "hit" if similarity == 1.0 else "semantic",
+                                       "similarity": round(similarity, 4), **answer_cache.stats()}})
+                return
+
+            expanded_query, retrieved_docs, retrieval_timings = await retrieve_context(engine, request, PRIORITY_INTERACTIVE)
+            retrieval_time = time.time() - start_time
+            citations = docs_metadata(retrieved_docs)
+            yield event({"type": "retrieval", "expanded_query": expanded_query,
+                         "retrieved_docs": citations, "retrieval_time": round(retrieval_time, 2)})
+
+            pieces = []
+            first_token_time = None
+            async for token in llm_client.astream_answer(query, retrieved_docs, PRIORITY_INTERACTIVE):
+                if first_token_time is None:
+                    first_token_time = time.time() - start_time
+                pieces.append(token)
+                yield event({"type": "token", "content": token})
+
+            final_answer = "".join(pieces).strip()
+            if not final_answer.endswith(GENERATION_ERROR):
+                answer_cache.store(query, engine.cache_version, scope, final_answer,
+                                   expanded_query, citations, vector=question_vector)
+
+            process_time = time.time() - start_time
+            yield event({
+                "type": "done",
+                "processing_time": round(process_time, 2),
+                "timings": {
+                    "retrieval": round(retrieval_time, 2),
+                    "first_token": round(first_token_time or process_time, 2),
+                    "generation": round(process_time - retrieval_time, 2),
+                    **retrieval_timings
+                },
+                "cache": {"status": "miss", **answer_cache.stats()}
+            })
+
+        except Overloaded as e:
+            yield event({"type": "error", "detail": str(e), "status": e.status_code,
+                         "retry_after": e.retry_after})
+        except Exception as e:
+            # Headers are already sent, so failures are reported in-band
+            logger.error(f"Error processing chat stream: {e}")
+            yield event({"type": "error", "detail": str(e)})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 @app.post("/rebuild-index", response_model=RebuildResponse)
 async def rebuild_index_endpoint(background_tasks: BackgroundTasks):
     def task():
-        logger.info("Rebuilding Index started...")
-        dataset_path = os.getenv("DATASET_PATH", "dataset/")
-        docs = doc_processor.ingest_manual(dataset_path)
-        rag_engine.build_index(docs)
-        logger.info(" Rebuild Complete!")
+        global rag_engine
+        try:
+            from src.document_processor import write_page_store
+            logger.info("Rebuilding Index started...")
+            dataset_path = os.getenv("DATASET_PATH", "dataset/")
+            # Built on a separate engine (sharing the loaded models) into a new index
+            # version, so /chat keeps serving the current snapshot until the swap
+            new_engine = rag_engine.new_instance()
+            # Pages stream from OCR straight into chunking/embedding while being saved
+            docs = get_doc_processor().iter_documents(dataset_path)
+            new_engine.build_index(write_page_store(docs, get_page_store_path()))
+
+            if new_engine.compression_retriever:
+                rag_engine = new_engine
+                logger.info(f" Rebuild Complete! Serving index version {new_engine.index_version}.")
+            else:
+                logger.warning("Rebuild produced no index; still serving the previous version.")
+        except Exception as e:
+            logger.error(f"Rebuild failed, still serving the previous version: {e}")
+        finally:
+            rebuild_lock.release()
+
+    if not rebuild_lock.acquire(blocking=False):
+        return RebuildResponse(status="running", message="A rebuild is already in progress.")
 
     background_tasks.add_task(task)
     return RebuildResponse(status="accepted", message="Rebuilding started in background. Check logs for progress.")
 
+def update_source(source: str, pages: list) -> int:
+    """Upserts (or, with no pages, deletes) one source file without a full rebuild.
+
+    The change is applied to a separate engine loaded from the current index
+    version, so /chat keeps serving the old snapshot until the swap. It is
+    journaled in that version and replayed on the next load_index.
+    """
+    from src.document_processor import replace_source_pages
+
+    global rag_engine
+    new_engine = rag_engine.new_instance()
+    if not new_engine.load_index():
+        raise RuntimeError("No index to update; call /rebuild-index first.")
+    if pages:
+        chunks = new_engine.upsert_source(source, pages)
+    else:
+        chunks = new_engine.delete_source(source)
+    replace_source_pages(get_page_store_path(), source, pages)
+    rag_engine = new_engine
+    return chunks
+
+def source_file(source: str) -> str:
+    if os.path.basename(source) != source or not source.endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Expected a PDF file name from DATASET_PATH.")
+    return os.path.join(os.getenv("DATASET_PATH", "dataset/"), source)
+
+@app.put("/sources/{source}", response_model=RebuildResponse)
+async def upsert_source_endpoint(source: str, background_tasks: BackgroundTasks):
+    """Adds or re-ingests one PDF from DATASET_PATH, embedding only its pages."""
+    file_path = source_file(source)
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail=f"{source} not found in DATASET_PATH.")
+
+    def task():
+        try:
+            from src.document_processor import IngestionError
+            pages = list(get_doc_processor().iter_file(file_path))
+            if not pages:
+                raise IngestionError(f"No pages extracted from {source}")
+            chunks = update_source(source, pages)
+            logger.info(f"Upserted {source} ({len(pages)} pages, {chunks} chunks).")
+        except Exception as e:
+            logger.error(f"Update of {source} failed, still serving the previous index: {e}")
+        finally:
+            rebuild_lock.release()
+
+    if not rebuild_lock.acquire(blocking=False):
+        return RebuildResponse(status="running", message="A rebuild or source update is already in progress.")
+
+    background_tasks.add_task(task)
+    return RebuildResponse(status="accepted", message=f"Ingesting {source} in background. Check logs for progress.")
+
+@app.delete("/sources/{source}", response_model=RebuildResponse)
+async def delete_source_endpoint(source: str, background_tasks: BackgroundTasks):
+    """Removes one source from the index and page store (remove the PDF too, or a full rebuild brings it back)."""
+    source_file(source)
+
+    def task():
+        try:
+            chunks = update_source(source, [])
+            logger.info(f"Deleted {source} ({chunks} chunks).")
+        except Exception as e:
+            logger.error(f"Deletion of {source} failed, still serving the previous index: {e}")
+        finally:
+            rebuild_lock.release()
+
+    if not rebuild_lock.acquire(blocking=False):
+        return RebuildResponse(status="running", message="A rebuild or source update is already in progress.")
+
+    background_tasks.add_task(task)
+    return RebuildResponse(status="accepted", message=f"Removing {source} in background. Check logs for progress.")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -11,7 +11,7 @@ echo "========================================="
 
 # Quick check for pre-ingested data (inline)
 echo "Step 1: Checking pre-ingested data..."
-INGESTED_FILE="ingested_data/ingested_documents.json"
+INGESTED_FILE="ingested_data/ingested_documents.jsonl"
 
 if [ -f "$INGESTED_FILE" ]; then
     FILE_SIZE=$(stat -f%z "$INGESTED_FILE" 2>/dev/null || stat -c%s "$INGESTED_FILE" 2>/dev/null)
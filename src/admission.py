@@ -0,0 +1,150 @@
+import math
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List
+
+import numpy as np
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S"
+)
+logger = logging.getLogger(__name__)
+
+# Lower runs first; FIFO within a priority
+PRIORITY_INTERACTIVE = 0  # someone is watching a /chat/stream response
+PRIORITY_DEFAULT = 1
+
+class Overloaded(Exception):
+    """Raised instead of queueing work that could not start within the deadline."""
+
+    def __init__(self, name: str, reason: str, retry_after: float, status_code: int):
+        self.name = name
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"{name} is overloaded ({reason}), retry in {self.retry_after}s")
+        self.status_code = status_code
+
+class AdmissionController:
+    """Concurrency limit with a bounded priority queue for one model, on the event loop.
+
+    At most `max_concurrency` calls run at once; the rest wait in priority order.
+    A call is refused right away, rather than left to time out inside Ollama, when
+    `max_queue` calls are already waiting (429) or when the wait estimated from the
+    recent call duration would exceed `max_wait` seconds (503); a call still
+    waiting after `max_wait` is refused as well (503).
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int = 32, max_wait: float = 30.0):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self._active = 0
+        self._waiters: List[list] = []  # heap of [priority, seq, future]
+        self._seq = itertools.count()
+        self._service_s = None  # moving average of call duration
+        self._waits = deque(maxlen=512)
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def estimated_wait(self) -> float:
+        """Seconds a call submitted now would wait for a slot."""
+        if self._active < self.max_concurrency and not self._waiters:
+            return 0.0
+        # Every `max_concurrency` calls ahead cost one average call duration
+        rounds = len(self._waiters) // self.max_concurrency + 1
+        return rounds * (self._service_s or 0.0)
+
+    def check(self):
+        """Raises Overloaded if a call submitted now would be refused."""
+        if self._active < self.max_concurrency and not self._waiters:
+            return
+        wait = self.estimated_wait()
+        error = None
+        if len(self._waiters) >= self.max_queue:
+            error = Overloaded(self.name, "queue full", wait, 429)
+        elif wait > self.max_wait:
+            error = Overloaded(self.name, f"estimated wait {wait:.0f}s", wait, 503)
+        if error:
+            self.rejected += 1
+            logger.warning(f"Rejected: {error}")
+            raise error
+
+    async def _acquire(self, priority: int):
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            self.admitted += 1
+            return
+        self.check()
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), future]
+        heapq.heappush(self._waiters, entry)
+        try:
+            # The slot is handed over by _release, already counted in _active
+            await asyncio.wait_for(future, self.max_wait)
+        except asyncio.TimeoutError:
+            self._discard(entry)
+            self.timed_out += 1
+            error = Overloaded(self.name, f"no slot within {self.max_wait:g}s", self.estimated_wait(), 503)
+            logger.warning(f"Rejected: {error}")
+            raise error
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            else:
+                self._discard(entry)
+            raise
+
+    def _discard(self, entry: list):
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+
+    def _release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(True)
+                self.admitted += 1
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_DEFAULT) -> AsyncIterator[None]:
+        """Holds one of the model's slots for the duration of the block."""
+        start = time.monotonic()
+        await self._acquire(priority)
+        admitted = time.monotonic()
+        self._waits.append(admitted - start)
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - admitted
+            self._service_s = duration if self._service_s is None else 0.8 * self._service_s + 0.2 * duration
+            self._release()
+
+    def stats(self) -> Dict[str, float]:
+        waits = np.asarray(self._waits) * 1000 if self._waits else np.zeros(1)
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_ms_p50": round(float(np.percentile(waits, 50)), 1),
+            "wait_ms_p95": round(float(np.percentile(waits, 95)), 1),
+            "service_ms_avg": round((self._service_s or 0.0) * 1000, 1),
+            "estimated_wait_ms": round(self.estimated_wait() * 1000, 1)
+        }
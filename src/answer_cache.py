@@ -0,0 +1,159 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.rerank_cache import normalize_query
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S"
+)
+logger = logging.getLogger(__name__)
+
+class CachedAnswer(NamedTuple):
+    answer: str
+    expanded_query: str
+    retrieved_docs: List[dict]
+    index_version: str
+    scope: Hashable
+    vector: Optional[np.ndarray]
+    created: float
+
+class AnswerCache:
+    """In-memory TTL/LRU cache of /chat answers for repeated and near-duplicate questions.
+
+    A question matches an entry exactly, after NFC and whitespace normalization, case
+    folded. With a `threshold`, it can also match semantically, when the cosine
+    similarity of the question embeddings is at least `threshold`; this is off by
+    default because questions that differ in one term ("what is XSS" / "what is CSRF")
+    can embed almost identically. Entries only match within the same index version and
+    search scope (filters), so a rebuild or incremental update never serves a stale answer.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_entries: int = 1000,
+                 ttl_seconds: float = 3600, threshold: Optional[float] = None):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+
+        self._entries: "OrderedDict[Tuple[str, Hashable, str], CachedAnswer]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @property
+    def semantic(self) -> bool:
+        return self.threshold is not None
+
+    @staticmethod
+    def _normalize(question: str) -> str:
+        return normalize_query(question).casefold()
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _expired(self, entry: CachedAnswer, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry.created > self.ttl_seconds
+
+    def _evict(self, now: float):
+        # Called under the lock: expired entries first, then least recently used
+        for key in [key for key, entry in self._entries.items() if self._expired(entry, now)]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lookup(self, question: str, index_version: str,
+               scope: Hashable = None) -> Tuple[Optional[CachedAnswer], Optional[np.ndarray], float]:
+        """Cached answer (or None), the question embedding if one was computed, and the match similarity.
+
+        Without a threshold only exact matches are looked up and nothing is embedded.
+
+        Pass the returned embedding to `store` on a miss so the question is embedded once.
+        """
+        if not self.enabled:
+            return None, None, 0.0
+
+        key = (index_version, scope, self._normalize(question))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry, now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry, None, 1.0
+            if not self.semantic:
+                self.misses += 1
+                return None, None, 0.0
+
+        vector = self._embed(question)
+        with self._lock:
+            self._evict(now)
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry.index_version == index_version and entry.scope == scope
+            ]
+            if candidates:
+                similarities = np.stack([entry.vector for _, entry in candidates]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    return entry, vector, float(similarities[best])
+            self.misses += 1
+        return None, vector, 0.0
+
+    def store(self, question: str, index_version: str, scope: Hashable, answer: str,
+              expanded_query: str, retrieved_docs: List[dict], vector: Optional[np.ndarray] = None):
+        if not self.enabled:
+            return
+        entry = CachedAnswer(
+            answer=answer,
+            expanded_query=expanded_query,
+            retrieved_docs=retrieved_docs,
+            index_version=index_version,
+            scope=scope,
+            vector=vector if vector is not None or not self.semantic else self._embed(question),
+            created=time.monotonic()
+        )
+        key = (index_version, scope, self._normalize(question))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict(time.monotonic())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "entries": len(self._entries)
+            }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"Answer cache: {stats['hits']} hits ({stats['semantic_hits']} semantic), "
+            f"{stats['misses']} misses ({stats['hit_rate']:.1%} hit rate), {stats['entries']} answers cached"
+        )
@@ -0,0 +1,107 @@
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Generic, List, Sequence, Tuple, TypeVar
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S"
+)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+class MicroBatcher(Generic[T, R]):
+    """Runs `fn` once over the items submitted by concurrent callers.
+
+    A worker thread waits for the first request, then keeps collecting for up to
+    `max_wait_ms` or until `max_batch_size` items are queued, calls `fn` on all of
+    them and hands each caller back its own slice of the results. A request larger
+    than `max_batch_size` is never split; it simply closes the batch.
+    """
+
+    def __init__(self, fn: Callable[[List[T]], Sequence[R]], max_batch_size: int = 64,
+                 max_wait_ms: float = 10, name: str = "batcher"):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+
+        self._queue: Deque[Tuple[List[T], Future]] = deque()
+        self._queued_items = 0
+        self._condition = threading.Condition()
+        self._closed = False
+        self.batches = 0
+        self.requests = 0
+
+        self._worker = threading.Thread(target=self._run, name=f"{name}-worker", daemon=True)
+        self._worker.start()
+
+    def submit(self, items: Sequence[T]) -> List[R]:
+        """Results of `fn` for `items`, computed in a batch with other callers' items."""
+        items = list(items)
+        if not items:
+            return []
+        future: Future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError(f"{self.name} is closed")
+            self._queue.append((items, future))
+            self._queued_items += len(items)
+            self._condition.notify()
+        return future.result()
+
+    def _take_batch(self) -> List[Tuple[List[T], Future]]:
+        with self._condition:
+            while not self._queue and not self._closed:
+                self._condition.wait()
+            if not self._queue:
+                return []
+            # The window opens with the first queued request
+            deadline = time.monotonic() + self.max_wait
+            while self._queued_items < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch, size = [], 0
+            while self._queue and (not batch or size + len(self._queue[0][0]) <= self.max_batch_size):
+                items, future = self._queue.popleft()
+                batch.append((items, future))
+                size += len(items)
+            self._queued_items -= size
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            try:
+                results = list(self.fn([item for items, _ in batch for item in items]))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.requests += len(batch)
+            start = 0
+            for items, future in batch:
+                future.set_result(results[start:start + len(items)])
+                start += len(items)
+
+    def mean_requests_per_batch(self) -> float:
+        return self.requests / self.batches if self.batches else 0.0
+
+    def close(self):
+        """Stops the worker after the queued requests are served."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._worker.join()
@@ -0,0 +1,404 @@
+import os
+import math
+import mmap
+import struct
+from bisect import bisect_left
+from typing import Callable, Collection, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from scipy import sparse
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.chunk_store import ChunkStore
+
+# File layout (little endian, sections 8-byte aligned):
+#   header | uint32 doc_len[n_docs] | uint64 vocab_offsets[n_terms + 1] | vocab bytes
+#   | float64 idf[n_terms] | uint64 postings_offsets[n_terms + 1]
+#   | uint32 postings_docs[n_postings] | uint32 postings_tfs[n_postings]
+#   | float64 postings_weights[n_postings]   (version 2+)
+# The vocabulary is sorted by UTF-8 bytes and postings are term-major, doc-ascending.
+# Each weight is the full BM25 term score of its posting, so a query only sums postings.
+MAGIC = b"BM25IDX\0"
+VERSION = 2
+HEADER = struct.Struct("<8sIIQQQQddddd")
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+class _Vocabulary(Sequence):
+    """Sorted term list over a byte blob, searchable with bisect without decoding it."""
+
+    def __init__(self, offsets: np.ndarray, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return bytes(self.blob[int(self.offsets[i]):int(self.offsets[i + 1])])
+
+    def find(self, term: str) -> int:
+        key = term.encode("utf-8", "surrogatepass")
+        i = bisect_left(self, key)
+        return i if i < len(self) and self[i] == key else -1
+
+def _calc_idf(doc_freqs: Iterable[int], corpus_size: int, epsilon: float):
+    # Same arithmetic and summation order as rank_bm25.BM25Okapi._calc_idf
+    idf = []
+    idf_sum = 0
+    negative = []
+    for i, freq in enumerate(doc_freqs):
+        value = math.log(corpus_size - freq + 0.5) - math.log(freq + 0.5)
+        idf.append(value)
+        idf_sum += value
+        if value < 0:
+            negative.append(i)
+    average_idf = idf_sum / len(idf) if idf else 0.0
+
+    eps = epsilon * average_idf
+    for i in negative:
+        idf[i] = eps
+    return np.asarray(idf, dtype=np.float64), average_idf
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without sorting the whole array.
+
+    Ties are ordered by descending index, as `np.argsort(scores)[::-1]` does for
+    stably sorted input.
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    kth = np.partition(scores, n - k)[n - k]
+    above = np.flatnonzero(scores > kth)
+    tied = np.flatnonzero(scores == kth)[::-1][:k - len(above)]
+    candidates = np.concatenate([above, tied])
+    return candidates[np.lexsort((-candidates, -scores[candidates]))]
+
+class BM25Index:
+    """Okapi BM25 over array-backed postings, scoring identically to rank_bm25.BM25Okapi."""
+
+    def __init__(self, doc_len, vocab_offsets, vocab_blob, idf, postings_offsets,
+                 postings_docs, postings_tfs, avgdl, average_idf,
+                 k1=1.5, b=0.75, epsilon=0.25, postings_weights=None, mm=None):
+        self.doc_len = doc_len
+        self.vocab = _Vocabulary(vocab_offsets, vocab_blob)
+        self.idf = idf
+        self.postings_offsets = postings_offsets
+        self.postings_docs = postings_docs
+        self.postings_tfs = postings_tfs
+        self.avgdl = avgdl
+        self.average_idf = average_idf
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.postings_weights = postings_weights if postings_weights is not None else self._compute_weights()
+        self._matrix = None
+        # Keeps the mapping alive while the arrays above point into it
+        self._mm = mm
+
+    @property
+    def corpus_size(self) -> int:
+        return len(self.doc_len)
+
+    def _compute_weights(self) -> np.ndarray:
+        # Same elementwise arithmetic as BM25Okapi.get_scores, so summed weights are bit-identical
+        term_idf = np.repeat(np.asarray(self.idf, dtype=np.float64),
+                             np.diff(self.postings_offsets).astype(np.int64))
+        q_freq = np.asarray(self.postings_tfs, dtype=np.int64)
+        doc_len = np.asarray(self.doc_len, dtype=np.int64)[self.postings_docs]
+        if not len(q_freq):
+            return np.zeros(0, dtype=np.float64)
+        return term_idf * (q_freq * (self.k1 + 1) /
+                           (q_freq + self.k1 * (1 - self.b + self.b * doc_len / self.avgdl)))
+
+    @classmethod
+    def from_tokenized(cls, corpus: Iterable[List[str]], k1=1.5, b=0.75, epsilon=0.25) -> "BM25Index":
+        term_ids = {}
+        term_col, doc_col, tf_col, doc_len = [], [], [], []
+
+        for doc_id, tokens in enumerate(corpus):
+            freqs = {}
+            for token in tokens:
+                freqs[token] = freqs.get(token, 0) + 1
+            doc_len.append(len(tokens))
+            for token, count in freqs.items():
+                term_col.append(term_ids.setdefault(token, len(term_ids)))
+                doc_col.append(doc_id)
+                tf_col.append(count)
+
+        terms = list(term_ids)
+        term_col = np.asarray(term_col, dtype=np.int64)
+        doc_freqs = np.bincount(term_col, minlength=len(terms))
+
+        # IDF in first-seen term order so the float sums match rank_bm25 bit for bit
+        corpus_size = len(doc_len)
+        idf, average_idf = _calc_idf(doc_freqs.tolist(), corpus_size, epsilon)
+        avgdl = sum(doc_len) / corpus_size if corpus_size else 0.0
+
+        return cls._from_columns(terms, term_col, np.asarray(doc_col, dtype=np.int64),
+                                 np.asarray(tf_col, dtype=np.int64), np.asarray(doc_len, dtype=np.uint32),
+                                 idf, avgdl, average_idf, k1, b, epsilon)
+
+    @classmethod
+    def _from_columns(cls, terms: List[str], term_col, doc_col, tf_col, doc_len,
+                      idf, avgdl, average_idf, k1, b, epsilon) -> "BM25Index":
+        encoded = [term.encode("utf-8", "surrogatepass") for term in terms]
+        order = sorted(range(len(terms)), key=encoded.__getitem__)
+        rank = np.empty(len(terms), dtype=np.int64)
+        rank[order] = np.arange(len(terms))
+
+        vocab_offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+        vocab_offsets[1:] = np.cumsum([len(encoded[i]) for i in order], dtype=np.uint64)
+        vocab_blob = b"".join(encoded[i] for i in order)
+
+        # Stable sort keeps each postings list in ascending doc order
+        sorted_terms = rank[term_col]
+        perm = np.argsort(sorted_terms, kind="stable")
+        postings_offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+        postings_offsets[1:] = np.cumsum(np.bincount(sorted_terms, minlength=len(terms)), dtype=np.uint64)
+
+        return cls(
+            doc_len=doc_len,
+            vocab_offsets=vocab_offsets,
+            vocab_blob=vocab_blob,
+            idf=idf[order] if len(terms) else idf,
+            postings_offsets=postings_offsets,
+            postings_docs=doc_col[perm].astype(np.uint32),
+            postings_tfs=tf_col[perm].astype(np.uint32),
+            avgdl=avgdl,
+            average_idf=average_idf,
+            k1=k1, b=b, epsilon=epsilon
+        )
+
+    def _columns(self):
+        term_col = np.repeat(np.arange(len(self.vocab), dtype=np.int64),
+                             np.diff(self.postings_offsets).astype(np.int64))
+        terms = [term.decode("utf-8", "surrogatepass") for term in self.vocab]
+        return (terms, term_col, self.postings_docs.astype(np.int64),
+                self.postings_tfs.astype(np.int64), np.asarray(self.doc_len, dtype=np.uint32))
+
+    def _rebuild(self, terms, term_col, doc_col, tf_col, doc_len) -> "BM25Index":
+        # Drop terms that no longer occur, then recompute corpus statistics
+        doc_freqs = np.bincount(term_col, minlength=len(terms))
+        live = np.flatnonzero(doc_freqs)
+        remap = np.full(len(terms), -1, dtype=np.int64)
+        remap[live] = np.arange(len(live))
+        terms = [terms[i] for i in live]
+        term_col = remap[term_col]
+
+        corpus_size = len(doc_len)
+        idf, average_idf = _calc_idf(doc_freqs[live].tolist(), corpus_size, self.epsilon)
+        avgdl = int(doc_len.sum()) / corpus_size if corpus_size else 0.0
+        return BM25Index._from_columns(terms, term_col, doc_col, tf_col, doc_len, idf,
+                                       avgdl, average_idf, self.k1, self.b, self.epsilon)
+
+    def add(self, corpus: Iterable[List[str]]) -> "BM25Index":
+        """New index with `corpus` appended after the existing documents.
+
+        Only the new documents are tokenized, but every weight depends on the corpus
+        size and average length, so df, IDF, avgdl and all postings are recomputed
+        from the existing arrays: the cost is linear in the total postings. Scores
+        equal a fresh build up to float rounding of the IDF average (1e-12 relative).
+        """
+        terms, term_col, doc_col, tf_col, doc_len = self._columns()
+        term_ids = {term: i for i, term in enumerate(terms)}
+
+        new_terms, new_docs, new_tfs, new_len = [], [], [], []
+        for doc_id, tokens in enumerate(corpus, start=self.corpus_size):
+            freqs = {}
+            for token in tokens:
+                freqs[token] = freqs.get(token, 0) + 1
+            new_len.append(len(tokens))
+            for token, count in freqs.items():
+                if token not in term_ids:
+                    term_ids[token] = len(terms)
+                    terms.append(token)
+                new_terms.append(term_ids[token])
+                new_docs.append(doc_id)
+                new_tfs.append(count)
+
+        return self._rebuild(
+            terms,
+            np.concatenate([term_col, np.asarray(new_terms, dtype=np.int64)]),
+            np.concatenate([doc_col, np.asarray(new_docs, dtype=np.int64)]),
+            np.concatenate([tf_col, np.asarray(new_tfs, dtype=np.int64)]),
+            np.concatenate([doc_len, np.asarray(new_len, dtype=np.uint32)])
+        )
+
+    def remove(self, keep: np.ndarray) -> "BM25Index":
+        """New index with only the documents where `keep` is set, recomputed like `add`."""
+        terms, term_col, doc_col, tf_col, doc_len = self._columns()
+        new_ids = np.cumsum(keep) - 1
+        mask = keep[doc_col]
+        return self._rebuild(terms, term_col[mask], new_ids[doc_col[mask]], tf_col[mask], doc_len[keep])
+
+    def get_scores(self, query: List[str]) -> np.ndarray:
+        score = np.zeros(self.corpus_size)
+        for q in query:
+            term = self.vocab.find(q)
+            if term < 0:
+                continue
+            start, end = int(self.postings_offsets[term]), int(self.postings_offsets[term + 1])
+            # Only the postings of q are touched; every other document would add exactly 0
+            score[self.postings_docs[start:end]] += self.postings_weights[start:end]
+        return score
+
+    @property
+    def matrix(self) -> sparse.csr_matrix:
+        """Term x document weight matrix over the postings arrays."""
+        if self._matrix is None:
+            self._matrix = sparse.csr_matrix(
+                (self.postings_weights, self.postings_docs.astype(np.int64), self.postings_offsets.astype(np.int64)),
+                shape=(len(self.vocab), self.corpus_size)
+            )
+        return self._matrix
+
+    def score_batch(self, queries: List[List[str]]) -> np.ndarray:
+        """Scores several tokenized queries with one sparse product, shape (queries, docs).
+
+        Repeated query terms count once per occurrence, as in `get_scores`; sums may
+        differ from it in the last bit because the addition order differs.
+        """
+        rows, cols = [], []
+        for row, query in enumerate(queries):
+            for q in query:
+                term = self.vocab.find(q)
+                if term >= 0:
+                    rows.append(row)
+                    cols.append(term)
+
+        counts = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)),
+            shape=(len(queries), len(self.vocab))
+        )
+        return (counts @ self.matrix).toarray()
+
+    def save(self, path: str):
+        vocab_blob = bytes(self.vocab.blob)
+        header = HEADER.pack(
+            MAGIC, VERSION, 0, self.corpus_size, len(self.vocab), len(self.postings_docs), len(vocab_blob),
+            self.k1, self.b, self.epsilon, self.avgdl, self.average_idf
+        )
+        sections = [
+            np.asarray(self.doc_len, dtype=np.uint32).tobytes(),
+            np.asarray(self.vocab.offsets, dtype=np.uint64).tobytes(),
+            vocab_blob,
+            np.asarray(self.idf, dtype=np.float64).tobytes(),
+            np.asarray(self.postings_offsets, dtype=np.uint64).tobytes(),
+            np.asarray(self.postings_docs, dtype=np.uint32).tobytes(),
+            np.asarray(self.postings_tfs, dtype=np.uint32).tobytes(),
+            np.asarray(self.postings_weights, dtype=np.float64).tobytes()
+        ]
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            for section in [b""] + sections:
+                f.write(b"\0" * (_align(f.tell()) - f.tell()))
+                f.write(section)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, _, n_docs, n_terms, n_postings, vocab_bytes,
+         k1, b, epsilon, avgdl, average_idf) = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a BM25 index: {path}")
+        if version not in (1, VERSION):
+            raise ValueError(f"Unsupported BM25 index version {version}: {path}")
+
+        offset = _align(HEADER.size)
+
+        def take(dtype, count):
+            nonlocal offset
+            array = np.frombuffer(mm, dtype=dtype, count=count, offset=offset)
+            offset = _align(offset + array.nbytes)
+            return array
+
+        doc_len = take(np.uint32, n_docs)
+        vocab_offsets = take(np.uint64, n_terms + 1)
+        vocab_blob = memoryview(mm)[offset:offset + vocab_bytes]
+        offset = _align(offset + vocab_bytes)
+        idf = take(np.float64, n_terms)
+        postings_offsets = take(np.uint64, n_terms + 1)
+        postings_docs = take(np.uint32, n_postings)
+        postings_tfs = take(np.uint32, n_postings)
+        # Version 1 files have no precomputed weights; they are derived on load instead
+        postings_weights = take(np.float64, n_postings) if version >= 2 else None
+
+        return cls(doc_len, vocab_offsets, vocab_blob, idf, postings_offsets, postings_docs,
+                   postings_tfs, avgdl, average_idf, k1=k1, b=b, epsilon=epsilon,
+                   postings_weights=postings_weights, mm=mm)
+
+class BM25IndexRetriever(BaseRetriever):
+    """Keyword retriever over a BM25Index and the ChunkStore holding its documents."""
+
+    index: BM25Index
+    chunks: ChunkStore
+    preprocess_func: Callable[[str], List[str]]
+    k: int = 4
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Document], preprocess_func: Callable[[str], List[str]],
+                       **kwargs) -> "BM25IndexRetriever":
+        documents = list(documents)
+        index = BM25Index.from_tokenized(preprocess_func(doc.page_content) for doc in documents)
+        return cls(index=index, chunks=ChunkStore(documents), preprocess_func=preprocess_func, **kwargs)
+
+    @classmethod
+    def load(cls, index_path: str, chunks_path: str, preprocess_func: Callable[[str], List[str]],
+             **kwargs) -> "BM25IndexRetriever":
+        return cls(index=BM25Index.load(index_path), chunks=ChunkStore.open(chunks_path),
+                   preprocess_func=preprocess_func, **kwargs)
+
+    def save(self, index_path: str, chunks_path: str):
+        self.index.save(index_path)
+        self.chunks.save(chunks_path)
+
+    def add_documents(self, documents: List[Document]):
+        """Appends `documents`; see `BM25Index.add` for what is recomputed."""
+        self.index = self.index.add(self.preprocess_func(doc.page_content) for doc in documents)
+        self.chunks.extend(documents)
+
+    def remove_matching(self, filters: Dict[str, Collection[str]]) -> int:
+        """Removes the chunks matching `filters`, found from the stored field codes without decoding."""
+        keep = ~self.chunks.mask(filters)
+        removed = int(len(keep) - keep.sum())
+        if removed:
+            self.index = self.index.remove(keep)
+            self.chunks = self.chunks.select(np.flatnonzero(keep))
+        return removed
+
+    def _top_documents(self, scores: np.ndarray, rows: Optional[np.ndarray]) -> List[Document]:
+        if rows is None:
+            return [self.chunks[int(i)] for i in top_k(scores, self.k)]
+        # Top-k among the filtered rows only, so a filter never leaves fewer than k hits
+        return [self.chunks[int(rows[i])] for i in top_k(scores[rows], self.k)]
+
+    def _filter_rows(self, filters: Optional[Dict[str, Collection[str]]]) -> Optional[np.ndarray]:
+        return np.flatnonzero(self.chunks.mask(filters)) if filters else None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+        filters: Optional[Dict[str, Collection[str]]] = None
+    ) -> List[Document]:
+        scores = self.index.get_scores(self.preprocess_func(query))
+        return self._top_documents(scores, self._filter_rows(filters))
+
+    def search_batch(self, queries: List[str],
+                     filters: Optional[Dict[str, Collection[str]]] = None) -> List[List[Document]]:
+        scores = self.index.score_batch([self.preprocess_func(query) for query in queries])
+        rows = self._filter_rows(filters)
+        return [self._top_documents(row, rows) for row in scores]
@@ -0,0 +1,266 @@
+import os
+import json
+import mmap
+import struct
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+# File layout: header | uint64 offsets[count + 1] | JSON records (one per chunk)
+# Header: magic, version, stamp (random per write, shared with the fields sidecar), count
+MAGIC = b"CHUNKS\0\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQ")
+
+# Metadata fields searches can be filtered on. Their per-row value codes are written
+# next to the store (<path>.fields.json) so filter masks never decode chunk records.
+FILTER_FIELDS = ("source", "language")
+
+def fields_path(path: str) -> str:
+    return f"{path}.fields.json"
+
+def matches(metadata: dict, filters: Dict[str, Iterable[str]]) -> bool:
+    return all(metadata.get(field) in allowed for field, allowed in filters.items())
+
+class ChunkStore:
+    """Read-only, memory-mapped chunk texts addressed by row number.
+
+    Chunks are decoded on access, so opening a store is O(1) and the pages are
+    shared between processes. Edits (`select`, `extend`) are kept in memory
+    until `save` rewrites the file.
+    """
+
+    def __init__(self, documents: Optional[List[Document]] = None):
+        self._mm = None
+        self._offsets = np.zeros(1, dtype=np.uint64)
+        self._base = 0
+        # None: rows map 1:1 onto the file. Otherwise >= 0 is a file row, < 0 an in-memory chunk
+        self._rows = None
+        self._extra = []
+        # field -> (values, code per file row); loaded from the sidecar or decoded on first use
+        self._file_fields: Dict[str, Tuple[list, np.ndarray]] = {}
+        # field -> (values, code per row of this view)
+        self._codes: Dict[str, Tuple[list, np.ndarray]] = {}
+        if documents:
+            self.extend(documents)
+
+    @classmethod
+    def open(cls, path: str) -> "ChunkStore":
+        store = cls()
+        with open(path, 'rb') as f:
+            store._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, stamp, count = HEADER.unpack_from(store._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a chunk store: {path}")
+        if version != VERSION:
+            raise ValueError(f"Unsupported chunk store version {version}: {path}")
+
+        store._offsets = np.frombuffer(store._mm, dtype=np.uint64, count=count + 1, offset=HEADER.size)
+        store._base = HEADER.size + (count + 1) * 8
+
+        if os.path.exists(fields_path(path)):
+            with open(fields_path(path), 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            # A sidecar from another write of this path is ignored, never trusted
+            if saved.get("stamp") == stamp:
+                store._file_fields = {
+                    field: (item["values"], np.asarray(item["codes"], dtype=np.int32))
+                    for field, item in saved["fields"].items()
+                }
+        return store
+
+    @staticmethod
+    def write(path: str, documents: Iterable[Document]):
+        records = []
+        fields = {field: ({}, []) for field in FILTER_FIELDS}
+        for doc in documents:
+            records.append(
+                json.dumps({"content": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False).encode("utf-8")
+            )
+            for field, (index, codes) in fields.items():
+                codes.append(index.setdefault(doc.metadata.get(field), len(index)))
+        offsets = np.zeros(len(records) + 1, dtype=np.uint64)
+        offsets[1:] = np.cumsum([len(r) for r in records], dtype=np.uint64)
+
+        stamp = int.from_bytes(os.urandom(4), "little") or 1
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, stamp, len(records)))
+            f.write(offsets.tobytes())
+            for record in records:
+                f.write(record)
+
+        with open(f"{fields_path(path)}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({
+                "stamp": stamp,
+                "fields": {field: {"values": list(index), "codes": codes} for field, (index, codes) in fields.items()}
+            }, f, ensure_ascii=False)
+        os.replace(f"{fields_path(path)}.tmp", fields_path(path))
+        os.replace(tmp_path, path)
+
+    def _file_count(self) -> int:
+        return len(self._offsets) - 1
+
+    def _row_ids(self) -> np.ndarray:
+        if self._rows is None:
+            return np.arange(self._file_count(), dtype=np.int64)
+        return self._rows
+
+    def __len__(self) -> int:
+        return self._file_count() if self._rows is None else len(self._rows)
+
+    def _read(self, row: int) -> Document:
+        start = self._base + int(self._offsets[row])
+        end = self._base + int(self._offsets[row + 1])
+        item = json.loads(self._mm[start:end])
+        return Document(page_content=item["content"], metadata=item["metadata"])
+
+    def __getitem__(self, i: int) -> Document:
+        if self._rows is None:
+            if not 0 <= i < self._file_count():
+                raise IndexError(i)
+            return self._read(i)
+
+        row = int(self._rows[i])
+        return self._read(row) if row >= 0 else self._extra[-row - 1]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def select(self, indices: Iterable[int]) -> "ChunkStore":
+        store = ChunkStore()
+        store._mm, store._offsets, store._base, store._extra = self._mm, self._offsets, self._base, self._extra
+        store._file_fields = self._file_fields
+        store._rows = self._row_ids()[np.asarray(list(indices), dtype=np.int64)]
+        return store
+
+    def extend(self, documents: Iterable[Document]):
+        start = len(self._extra)
+        self._extra = self._extra + list(documents)
+        new_rows = -np.arange(start + 1, len(self._extra) + 1, dtype=np.int64)
+        self._rows = np.concatenate([self._row_ids(), new_rows])
+        self._codes = {}
+
+    def save(self, path: str):
+        ChunkStore.write(path, list(self))
+
+    def _file_field(self, field: str) -> Tuple[list, np.ndarray]:
+        if field not in self._file_fields:
+            # No sidecar (older store): decode each file record once
+            index = {}
+            codes = np.array([index.setdefault(self._read(row).metadata.get(field), len(index))
+                              for row in range(self._file_count())], dtype=np.int32)
+            self._file_fields[field] = (list(index), codes)
+        return self._file_fields[field]
+
+    def _field_codes(self, field: str) -> Tuple[list, np.ndarray]:
+        if field not in self._codes:
+            rows = self._row_ids()
+            file_values, file_codes = self._file_field(field)
+            values = list(file_values)
+            index = {value: code for code, value in enumerate(values)}
+
+            codes = np.empty(len(rows), dtype=np.int32)
+            in_file = rows >= 0
+            codes[in_file] = file_codes[rows[in_file]]
+            for i in np.flatnonzero(~in_file):
+                value = self._extra[-rows[i] - 1].metadata.get(field)
+                if value not in index:
+                    index[value] = len(values)
+                    values.append(value)
+                codes[i] = index[value]
+            self._codes[field] = (values, codes)
+        return self._codes[field]
+
+    def mask(self, filters: Dict[str, Iterable[str]]) -> np.ndarray:
+        """Boolean row mask of the chunks whose metadata matches every filter."""
+        result = np.ones(len(self), dtype=bool)
+        for field, allowed in filters.items():
+            allowed = set(allowed)
+            values, codes = self._field_codes(field)
+            result &= np.isin(codes, [code for code, value in enumerate(values) if value in allowed])
+        return result
+
+
+def row_id(row: int) -> str:
+    # Docstore id of a chunk loaded from a ChunkStore file; "@" never starts a chunk id
+    return f"@{row}"
+
+def _parse_row_id(doc_id: str) -> Optional[int]:
+    if isinstance(doc_id, str) and doc_id.startswith("@") and doc_id[1:].isdigit():
+        return int(doc_id[1:])
+    return None
+
+class ChunkDocstore(Docstore, AddableMixin):
+    """LangChain docstore over a ChunkStore; only searched ids are decoded.
+
+    Rows of the file are addressed as "@<row>". Documents added or deleted after
+    loading are tracked in memory until the store is written out again.
+    """
+
+    def __init__(self, chunks: ChunkStore):
+        self.chunks = chunks
+        self._added: Dict[str, Document] = {}
+        self._deleted = set()
+
+    def _in_file(self, doc_id: str) -> bool:
+        row = _parse_row_id(doc_id)
+        return row is not None and row < len(self.chunks) and doc_id not in self._deleted
+
+    def search(self, search: str) -> Union[str, Document]:
+        if search in self._added:
+            return self._added[search]
+        if self._in_file(search):
+            return self.chunks[_parse_row_id(search)]
+        return f"ID {search} not found."
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = [doc_id for doc_id in texts if doc_id in self._added or self._in_file(doc_id)]
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._added.update(texts)
+
+    def delete(self, ids: List) -> None:
+        for doc_id in ids:
+            if doc_id in self._added:
+                del self._added[doc_id]
+            elif self._in_file(doc_id):
+                self._deleted.add(doc_id)
+            else:
+                raise ValueError(f"ID {doc_id} not found.")
+
+class RowIdMap(MutableMapping):
+    """FAISS position -> docstore id map that is implicit ("@<row>") for the loaded rows."""
+
+    def __init__(self, rows: int):
+        self._rows = rows
+        self._overrides: Dict[int, str] = {}
+
+    def __getitem__(self, position: int) -> str:
+        if position in self._overrides:
+            return self._overrides[position]
+        if 0 <= position < self._rows:
+            return row_id(position)
+        raise KeyError(position)
+
+    def __setitem__(self, position: int, doc_id: str):
+        self._overrides[position] = doc_id
+
+    def __delitem__(self, position: int):
+        raise TypeError("Positions cannot be removed from a RowIdMap")
+
+    def __iter__(self) -> Iterator[int]:
+        yield from range(self._rows)
+        yield from sorted(p for p in self._overrides if p >= self._rows)
+
+    def __len__(self) -> int:
+        return self._rows + sum(1 for p in self._overrides if p >= self._rows)
+
+    def file_positions(self) -> int:
+        """Number of leading positions that still map 1:1 onto the rows of the loaded file."""
+        return min([self._rows] + list(self._overrides))
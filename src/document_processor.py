@@ -2,8 +2,14 @@ import os
 import logging
 import warnings
 import json
+import time
+import unicodedata
+import multiprocessing as mp
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from io import BytesIO
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from importlib.metadata import version, PackageNotFoundError
 
 from langchain_core.documents import Document
 import pypdfium2 as pdfium
@@ -13,6 +19,10 @@ from pythainlp.util import normalize
 from docling.document_converter import DocumentConverter, PdfFormatOption, ImageFormatOption
 from docling.datamodel.base_models import InputFormat, DocumentStream
 from docling.datamodel.pipeline_options import EasyOcrOptions, PdfPipelineOptions
+from docling_core.types.doc.document import DoclingDocument, DOCUMENT_TOKENS_EXPORT_LABELS, DEFAULT_CONTENT_LAYERS
+from docling_core.transforms.serializer.markdown import MarkdownDocSerializer, MarkdownParams
+
+from src.ingestion_cache import IngestionCache
 
 warnings.filterwarnings("ignore")
 
@@ -23,33 +33,152 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Page routing: pages whose embedded text layer is missing or garbled go to OCR
+MIN_TEXT_CHARS = 10
+MAX_GARBLED_RATIO = 0.02
+
+# OCR render scale: default for pages without any text layer, otherwise adapted
+# so that glyphs are rendered at roughly OCR_TARGET_GLYPH_PX pixels high
+OCR_RENDER_SCALE = 3.0
+OCR_TARGET_GLYPH_PX = 20
+OCR_MIN_SCALE = 1.5
+OCR_MAX_SCALE = 4.0
+
+# Thai vowels/tone marks that must follow a Thai base character
+_THAI_COMBINING = set("\u0e31\u0e34\u0e35\u0e36\u0e37\u0e38\u0e39\u0e3a\u0e47\u0e48\u0e49\u0e4a\u0e4b\u0e4c\u0e4d\u0e4e")
+
+try:
+    _DOCLING_VERSION = version("docling")
+except PackageNotFoundError:
+    _DOCLING_VERSION = "unknown"
+
+class IngestionError(Exception):
+    """Raised at the end of an ingestion run that lost pages, so its output is not published."""
+
+# Per-process converter of an OCR pool worker (warmed once by _init_ocr_worker)
+_worker_converter = None
+
+def _is_thai(char: str) -> bool:
+    return "\u0e00" <= char <= "\u0e7f"
+
+def _garbled_ratio(text: str) -> float:
+    chars = [c for c in text if not c.isspace()]
+    if not chars:
+        return 1.0
+
+    bad = 0
+    prev = ""
+    for c in chars:
+        # Control, private-use, unassigned and replacement characters are typical
+        # of fonts without a usable ToUnicode map (e.g. legacy Thai fonts)
+        if unicodedata.category(c) in ("Cc", "Co", "Cn", "Cs") or c == "\ufffd":
+            bad += 1
+        elif c in _THAI_COMBINING and not _is_thai(prev):
+            bad += 1
+        prev = c
+    return bad / len(chars)
+
+def _detect_language(text: str) -> str:
+    letters = [c for c in text if c.isalpha()]
+    if not letters:
+        return "en"
+    thai = sum(1 for c in letters if _is_thai(c))
+    return "th" if thai / len(letters) >= 0.2 else "en"
+
+def export_markdown_by_page(document: DoclingDocument) -> Dict[int, str]:
+    # export_to_markdown(page_no=p) walks the whole document tree on every call,
+    # so exporting page by page is quadratic in page count. Instead walk the
+    # document once, serialize every top-level part with the same parameters as
+    # export_to_markdown and bucket the parts by the page of their items.
+    serializer = MarkdownDocSerializer(
+        doc=document,
+        params=MarkdownParams(labels=DOCUMENT_TOKENS_EXPORT_LABELS, layers=DEFAULT_CONTENT_LAYERS)
+    )
+
+    if document.body.meta:
+        return {page_no: document.export_to_markdown(page_no=page_no) for page_no in document.pages}
+
+    buckets = defaultdict(list)
+    split_pages = set()
+    for part in serializer.get_parts():
+        pages = {item.prov[0].page_no for item in part.get_unique_doc_items() if item.prov}
+        if len(pages) > 1:
+            # e.g. a list continuing on the next page: the per-page export only
+            # keeps the items of that page, so these pages are exported as before
+            split_pages.update(pages)
+        elif pages:
+            buckets[pages.pop()].append(part.text)
+        # Parts without provenance are excluded from every per-page export
+
+    texts = {}
+    for page_no in document.pages:
+        if page_no in split_pages:
+            texts[page_no] = document.export_to_markdown(page_no=page_no)
+        else:
+            texts[page_no] = "\n\n".join(buckets.get(page_no, []))
+    return texts
+
+def _build_ocr_converter() -> DocumentConverter:
+    # Setup OCR Converter (Image -> EasyOCR)
+    ocr_options = EasyOcrOptions(lang=['th', 'en'], use_gpu=False) 
+    
+    ocr_pipeline_opts = PdfPipelineOptions(
+        do_ocr=True,
+        do_table_structure=True,
+        ocr_options=ocr_options
+    )
+    
+    return DocumentConverter(
+        format_options={
+            InputFormat.IMAGE: ImageFormatOption(pipeline_options=ocr_pipeline_opts)
+        }
+    )
+
+def _ocr_page_bitmap(converter: DocumentConverter, page_idx: int, raw: bytes, size: Tuple[int, int]) -> Optional[str]:
+    # None on failure, unlike "" for a page without text: failed pages must not be cached
+    pil_image = Image.frombytes("L", size, raw)
+
+    # Uncompressed BMP only prepends a header to the raw pixels,
+    # unlike PNG there is no zlib encode/decode round-trip per page
+    img_byte_arr = BytesIO()
+    pil_image.save(img_byte_arr, format='BMP')
+    img_byte_arr.seek(0)
+
+    doc_stream = DocumentStream(name=f"page_{page_idx}.bmp", stream=img_byte_arr)
+
+    try:
+        conv_result = converter.convert(doc_stream)
+        return conv_result.document.export_to_markdown()
+    except Exception as e:
+        logger.warning(f"OCR failed on page {page_idx}: {e}")
+        return None
+
+def _init_ocr_worker():
+    global _worker_converter
+    _worker_converter = _build_ocr_converter()
+    # Warm up EasyOCR/Docling models before the first real page arrives
+    _ocr_page_bitmap(_worker_converter, -1, bytes(64 * 64), (64, 64))
+
+def _ocr_page_worker(task: Tuple[int, bytes, Tuple[int, int]]) -> Tuple[int, Optional[str]]:
+    page_idx, raw, size = task
+    return page_idx, _ocr_page_bitmap(_worker_converter, page_idx, raw, size)
+
 class DocumentProcessor:
-    def __init__(self):
+    def __init__(self, ocr_workers: int = None, cache_dir: str = None):
         logger.info("Initializing DocumentProcessor with Docling...")
+        self.ocr_workers = max(1, ocr_workers or int(os.getenv("OCR_WORKERS", "1")))
+        self.cache = IngestionCache(cache_dir)
         
-        # Setup English Converter (Standard PDF Parsing)
-        en_pipeline_opts = PdfPipelineOptions(do_table_structure=True)
-        self.converter_en = DocumentConverter(
+        # Setup Text-Layer Converter (Standard PDF Parsing)
+        text_pipeline_opts = PdfPipelineOptions(do_table_structure=True)
+        self.converter_text = DocumentConverter(
             format_options={
-                InputFormat.PDF: PdfFormatOption(pipeline_options=en_pipeline_opts)
+                InputFormat.PDF: PdfFormatOption(pipeline_options=text_pipeline_opts)
             }
         )
 
-        # Setup Thai Converter (Image -> EasyOCR)
-        ocr_options = EasyOcrOptions(lang=['th', 'en'], use_gpu=False) 
-        
-        th_pipeline_opts = PdfPipelineOptions(
-            do_ocr=True,
-            do_table_structure=True,
-            ocr_options=ocr_options
-        )
-        
-        self.converter_th = DocumentConverter(
-            format_options={
-                InputFormat.IMAGE: ImageFormatOption(pipeline_options=th_pipeline_opts)
-            }
-        )
-        logger.info("Docling converters ready.")
+        self.converter_ocr = _build_ocr_converter()
+        logger.info(f"Docling converters ready (OCR workers: {self.ocr_workers}).")
 
     def _get_logical_page(self, filename: str, physical_page_idx: int) -> str:
         physical_page_num = physical_page_idx + 1 
@@ -75,133 +204,353 @@ class DocumentProcessor:
         return str(physical_page_num)
 
     def ingest_manual(self, dataset_folder: str) -> List[Document]:
-        documents = []
+        return list(self.iter_documents(dataset_folder))
+
+    def iter_documents(self, dataset_folder: str) -> Iterator[Document]:
+        """Pages of every PDF in the folder. Files that fail are skipped, then reported
+        together by an IngestionError once the other files' pages have been yielded."""
         if not os.path.exists(dataset_folder):
             logger.error(f"Folder not found: {dataset_folder}")
-            return []
+            return
 
         files = [f for f in os.listdir(dataset_folder) if f.endswith(".pdf")]
         logger.info(f"Found {len(files)} PDF files in '{dataset_folder}'")
         
-        for file in files:
-            file_path = os.path.join(dataset_folder, file)
-            logger.info(f"Processing: {file}...")
+        failed = []
+        try:
+            for file in files:
+                file_path = os.path.join(dataset_folder, file)
+                logger.info(f"Processing: {file}...")
 
-            try:
-                if "thailand-web-security" in file:
-                    docs = self._process_thai_pdf(file_path, file)
-                else:
-                    docs = self._process_english_pdf(file_path, file)
-                
-                documents.extend(docs)
-                logger.info(f"Finished {file}: Obtained {len(docs)} chunks.")
-            except Exception as e:
-                logger.error(f"Error processing {file}: {str(e)}")
+                page_count = 0
+                try:
+                    for doc in self._iter_pdf_pages(file_path, file):
+                        page_count += 1
+                        yield doc
+                    logger.info(f"Finished {file}: Obtained {page_count} chunks.")
+                except Exception as e:
+                    logger.error(f"Error processing {file}: {str(e)}")
+                    failed.append(file)
+        finally:
+            self.cache.evict(files)
+            self.cache.save()
+            logger.info(f"Ingestion cache: {self.cache.page_hits} page hits, {self.cache.page_misses} misses.")
 
-        return documents
+        if failed:
+            raise IngestionError(f"{len(failed)} of {len(files)} PDF files failed: {', '.join(failed)}")
 
-    def _process_english_pdf(self, file_path: str, filename: str) -> List[Document]:
-        conv_result = self.converter_en.convert(file_path)
-        docs = []
+    def iter_file(self, file_path: str) -> Iterator[Document]:
+        """Pages of a single PDF, for an incremental update; unlike iter_documents, errors propagate."""
+        filename = os.path.basename(file_path)
+        logger.info(f"Processing: {filename}...")
+        try:
+            yield from self._iter_pdf_pages(file_path, filename)
+        finally:
+            self.cache.save()
 
-        sorted_page_nums = sorted(conv_result.document.pages.keys())
+    def _converter_settings(self) -> dict:
+        return {
+            "docling": _DOCLING_VERSION,
+            "table_structure": True,
+            "routing": {"min_text_chars": MIN_TEXT_CHARS, "max_garbled_ratio": MAX_GARBLED_RATIO},
+            "ocr_engine": "easyocr",
+            "ocr_lang": ["th", "en"],
+            "render_scale": [OCR_RENDER_SCALE, OCR_TARGET_GLYPH_PX, OCR_MIN_SCALE, OCR_MAX_SCALE]
+        }
 
-        for i, page_no in enumerate(sorted_page_nums):
-            text = conv_result.document.export_to_markdown(page_no=page_no)
-            
+    def _iter_pdf_pages(self, file_path: str, filename: str) -> Iterator[Document]:
+        settings_key = self.cache.settings_key(self._converter_settings())
+
+        file_hash = self.cache.hash_file(file_path)
+        texts = self.cache.get_file(filename, file_hash, settings_key)
+
+        if texts is not None:
+            logger.info(f"Unchanged file, served from ingestion cache: {filename}")
+            pages = ((i, texts[i]) for i in sorted(texts))
+        else:
+            pages = self._iter_converted_pages(file_path, filename, file_hash, settings_key)
+
+        for i, text in pages:
             if not text.strip():
                 continue
 
-            logical_page = self._get_logical_page(filename, i)
-            
-            docs.append(Document(
+            yield Document(
                 page_content=text,
                 metadata={
                     "source": filename,
-                    "logical_page": logical_page,
-                    "language": "en"
+                    "logical_page": self._get_logical_page(filename, i),
+                    "language": _detect_language(text)
                 }
-            ))
-            
-        return docs
+            )
+
+    def _needs_ocr(self, page: pdfium.PdfPage) -> bool:
+        text = page.get_textpage().get_text_range()
+        if sum(1 for c in text if not c.isspace()) < MIN_TEXT_CHARS:
+            return True
+        return _garbled_ratio(text) > MAX_GARBLED_RATIO
 
-    def _process_thai_pdf(self, file_path: str, filename: str) -> List[Document]:
+    def _iter_converted_pages(self, file_path: str, filename: str, file_hash: str,
+                              settings_key: str) -> Iterator[Tuple[int, str]]:
         pdf = pdfium.PdfDocument(file_path)
-        docs = []
+        page_hashes = [self.cache.hash_page(pdf[i]) for i in range(len(pdf))]
 
-        logger.info(f"Starting Image+OCR Pipeline for {filename}...")
-        
+        cached = {}
+        text_pages = []
+        ocr_pages = []
+        for i, page_hash in enumerate(page_hashes):
+            text = self.cache.get_page(page_hash, settings_key)
+            if text is not None:
+                cached[i] = text
+            elif self._needs_ocr(pdf[i]):
+                ocr_pages.append(i)
+            else:
+                text_pages.append(i)
+
+        if text_pages or ocr_pages:
+            logger.info(
+                f"Converting {filename}: {len(text_pages)} text-layer pages, "
+                f"{len(ocr_pages)} OCR pages, {len(cached)} cached..."
+            )
+
+        text_converted = self._convert_text_pages(file_path, pdf, text_pages) if text_pages else {}
+        ocr_converted = self._iter_ocr_text(pdf, ocr_pages, filename)
+
+        # All sources are in page order, so pages can be yielded as soon as they are ready
+        failed_pages = []
         for i in range(len(pdf)):
-            # Rasterize Page
-            page = pdf[i]
-            bitmap = page.render(scale=3.0) 
-            pil_image = bitmap.to_pil()
-
-            # Preprocess
-            pil_image = ImageOps.grayscale(pil_image)
-            pil_image = ImageOps.autocontrast(pil_image) 
-            
-            # Convert via Docling (Image Input)
-            img_byte_arr = BytesIO()
-            pil_image.save(img_byte_arr, format='PNG')
-            img_byte_arr.seek(0)
+            if i in cached:
+                yield i, cached[i]
+                continue
+
+            if i in text_converted:
+                text = text_converted[i]
+            else:
+                _, text = next(ocr_converted)
+
+            if text is None:
+                # Not cached: the file entry then misses this page, so the next ingest retries it
+                failed_pages.append(i)
+                yield i, ""
+                continue
+
+            self.cache.put_page(page_hashes[i], settings_key, text)
+            yield i, text
+
+        if failed_pages:
+            logger.warning(f"{filename}: OCR failed on pages {failed_pages}; they will be retried on the next ingest.")
+        self.cache.put_file(filename, file_hash, settings_key, page_hashes)
+
+    def _convert_text_pages(self, file_path: str, pdf: pdfium.PdfDocument, page_indices: List[int]) -> Dict[int, str]:
+        if len(page_indices) == len(pdf):
+            conv_result = self.converter_text.convert(file_path)
+        else:
+            # Only convert the selected pages: copy them into a smaller PDF
+            sub_pdf = pdfium.PdfDocument.new()
+            sub_pdf.import_pages(pdf, page_indices)
+            pdf_bytes = BytesIO()
+            sub_pdf.save(pdf_bytes)
+            pdf_bytes.seek(0)
+            conv_result = self.converter_text.convert(
+                DocumentStream(name=os.path.basename(file_path), stream=pdf_bytes)
+            )
+
+        texts = {}
+        page_texts = export_markdown_by_page(conv_result.document)
+        sorted_page_nums = sorted(page_texts.keys())
+
+        for i, page_no in zip(page_indices, sorted_page_nums):
+            text = page_texts[page_no]
+            texts[i] = normalize(text) if _detect_language(text) == "th" else text
+
+        # Keep one entry per requested page even if Docling dropped an empty one
+        return {i: texts.get(i, "") for i in page_indices}
+
+    def _ocr_render_scale(self, page: pdfium.PdfPage) -> float:
+        textpage = page.get_textpage()
+        char_count = textpage.count_chars()
+        if char_count == 0:
+            return OCR_RENDER_SCALE
+
+        # Even a garbled text layer has valid glyph boxes: size the render so the
+        # median glyph ink height lands where EasyOCR reads best
+        step = max(1, char_count // 200)
+        heights = sorted(
+            top - bottom
+            for left, bottom, right, top in (textpage.get_charbox(i) for i in range(0, char_count, step))
+            if top > bottom
+        )
+        if not heights:
+            return OCR_RENDER_SCALE
+
+        scale = OCR_TARGET_GLYPH_PX / heights[len(heights) // 2]
+        return min(OCR_MAX_SCALE, max(OCR_MIN_SCALE, scale))
+
+    def _render_page(self, pdf: pdfium.PdfDocument, page_idx: int) -> Tuple[int, bytes, Tuple[int, int]]:
+        # Rasterize Page
+        page = pdf[page_idx]
+        bitmap = page.render(scale=self._ocr_render_scale(page)) 
+        pil_image = bitmap.to_pil()
+
+        # Preprocess
+        pil_image = ImageOps.grayscale(pil_image)
+        pil_image = ImageOps.autocontrast(pil_image) 
+
+        return page_idx, pil_image.tobytes(), pil_image.size
+
+    def _ocr_pages(self, pdf: pdfium.PdfDocument, page_indices: Iterable[int]) -> Dict[int, Optional[str]]:
+        return dict(self._iter_ocr_pages(pdf, page_indices))
 
-            doc_stream = DocumentStream(name=f"page_{i}.png", stream=img_byte_arr)
+    def _iter_ocr_pages(self, pdf: pdfium.PdfDocument, page_indices: Iterable[int]) -> Iterator[Tuple[int, Optional[str]]]:
+        page_indices = list(page_indices)
 
-            try:
-                conv_result = self.converter_th.convert(doc_stream)
-                raw_text = conv_result.document.export_to_markdown()
-            except Exception as e:
-                logger.warning(f"OCR failed on page {i}: {e}")
-                raw_text = ""
+        if self.ocr_workers == 1:
+            pages = (
+                (i, _ocr_page_bitmap(self.converter_ocr, *self._render_page(pdf, i)))
+                for i in page_indices
+            )
+        else:
+            pages = self._iter_ocr_pages_parallel(pdf, page_indices)
 
+        # Only count time spent producing pages, not time the consumer holds the generator
+        busy = 0.0
+        n = 0
+        while True:
+            start_time = time.time()
+            item = next(pages, None)
+            busy += time.time() - start_time
+            if item is None:
+                break
+
+            n += 1
+            yield item
+            if n % 5 == 0:
+                logger.info(f"   Processed {n}/{len(page_indices)} pages...")
+
+        if n and busy > 0:
+            logger.info(
+                f"OCR throughput: {n / busy:.2f} pages/sec "
+                f"({n} pages, {self.ocr_workers} workers, {busy:.1f}s)"
+            )
+
+    def _iter_ocr_pages_parallel(self, pdf: pdfium.PdfDocument, page_indices: List[int]) -> Iterator[Tuple[int, Optional[str]]]:
+        # pdfium is not thread/process safe, so pages are rendered here and only
+        # the raw bitmaps are shipped to the workers. Keep a bounded number of
+        # pages in flight so large PDFs do not pile up rendered bitmaps in memory.
+        max_in_flight = self.ocr_workers * 2
+        to_submit = iter(page_indices)
+        pending = set()
+        finished = {}
+        next_pos = 0
+
+        # spawn: forking a parent that already holds torch/OCR threads can deadlock
+        with ProcessPoolExecutor(
+            max_workers=self.ocr_workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_ocr_worker
+        ) as pool:
+            while next_pos < len(page_indices):
+                for i in to_submit:
+                    pending.add(pool.submit(_ocr_page_worker, self._render_page(pdf, i)))
+                    if len(pending) >= max_in_flight:
+                        break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    page_idx, text = fut.result()
+                    finished[page_idx] = text
+
+                # Reassemble in page order so logical_page mapping stays unchanged
+                while next_pos < len(page_indices) and page_indices[next_pos] in finished:
+                    page_idx = page_indices[next_pos]
+                    yield page_idx, finished.pop(page_idx)
+                    next_pos += 1
+
+    def _iter_ocr_text(self, pdf: pdfium.PdfDocument, page_indices: List[int], filename: str) -> Iterator[Tuple[int, Optional[str]]]:
+        if not page_indices:
+            return
+
+        logger.info(f"Starting Image+OCR Pipeline for {filename}...")
+
+        for i, text in self._iter_ocr_pages(pdf, page_indices):
             # Normalize
-            clean_text = normalize(raw_text)
+            yield i, normalize(text) if text is not None else None
 
-            if not clean_text.strip():
-                continue
+def write_page_store(documents: Iterable[Document], store_path: str) -> Iterator[Document]:
+    # Pass-through: every page is appended to the JSONL store as soon as it is
+    # produced, so downstream chunking/embedding can start before ingestion ends.
+    # The store only replaces the previous one once the stream has completed
+    # without errors and with at least one page; otherwise the error reaches the
+    # consumer (e.g. build_index, which then publishes nothing) and the old store stays.
+    tmp_path = f"{store_path}.tmp"
+    count = 0
 
-            logical_page = self._get_logical_page(filename, i)
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for doc in documents:
+                f.write(json.dumps({"content": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False))
+                f.write("\n")
+                f.flush()
+                count += 1
+                yield doc
+        if not count:
+            raise IngestionError("Ingestion produced no pages")
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        logger.error(f"Keeping the previous page store at {store_path}.")
+        raise
 
-            docs.append(Document(
-                page_content=clean_text,
-                metadata={
-                    "source": filename,
-                    "logical_page": logical_page,
-                    "language": "th"
-                }
-            ))
-            
-            if (i + 1) % 5 == 0:
-                logger.info(f"   Processed {i+1}/{len(pdf)} pages...")
+    os.replace(tmp_path, store_path)
+    logger.info(f"Page store saved to {store_path} ({count} pages).")
+
+def replace_source_pages(store_path: str, source: str, documents: Iterable[Document]) -> int:
+    """Rewrites the page store with `source`'s pages replaced by `documents` (none = removed)."""
+    tmp_path = f"{store_path}.tmp"
+    count = 0
 
-        return docs
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        if os.path.exists(store_path):
+            with open(store_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip() and json.loads(line)["metadata"].get("source") != source:
+                        out.write(line)
+        for doc in documents:
+            out.write(json.dumps({"content": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False))
+            out.write("\n")
+            count += 1
+
+    os.replace(tmp_path, store_path)
+    logger.info(f"Page store updated for {source} ({count} pages).")
+    return count
 
 if __name__ == "__main__":
     print("\n--- Starting Ingestion Test ---")
     processor = DocumentProcessor()
     
     output_dir = "ingested_data"
-    output_file = os.path.join(output_dir, "ingested_documents.json")
+    output_file = os.path.join(output_dir, "ingested_documents.jsonl")
 
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
         print(f"Created output directory: '{output_dir}'")
     
     if os.path.exists("dataset"):
-        docs = processor.ingest_manual("dataset/")
+        page_count = 0
+        mitre_sample = []
+
+        try:
+            for doc in write_page_store(processor.iter_documents("dataset/"), output_file):
+                page_count += 1
+                if "mitre" in doc.metadata['source'] and len(mitre_sample) < 2:
+                    mitre_sample.append(doc)
+        except IngestionError as e:
+            print(f"\nFAILED: {e}. '{output_file}' was left unchanged.")
+            page_count = 0
         
-        if docs:
-            print(f"\nSUCCESS: Processed {len(docs)} pages.")
-            
-            debug_data = [{"content": d.page_content, "metadata": d.metadata} for d in docs]
-            
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(debug_data, f, ensure_ascii=False, indent=2)
-            
+        if page_count:
+            print(f"\nSUCCESS: Processed {page_count} pages.")
             print(f"Data saved to '{output_file}'")
             
-            mitre_sample = [d for d in docs if "mitre" in d.metadata['source']]
             if len(mitre_sample) > 1:
                 print(f"\n--- MITRE Page 2 Check (Expected 3a) ---")
                 print(f"Actual: {mitre_sample[1].metadata['logical_page']}")
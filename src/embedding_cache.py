@@ -0,0 +1,180 @@
+import os
+import json
+import hashlib
+import logging
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.batching import MicroBatcher
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S"
+)
+logger = logging.getLogger(__name__)
+
+class CachedEmbeddings(Embeddings):
+    """Disk-backed document embedding cache keyed by (model, normalization, chunk text).
+
+    Vectors are appended to a flat array file; `meta.json` maps each key to its row
+    and a last-used tick for LRU eviction. Queries are passed through uncached.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, normalize: bool,
+                 cache_dir: str, max_mb: float = 512, dtype: str = "float32"):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.normalize = normalize
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.vectors_path = os.path.join(cache_dir, "vectors.bin")
+        self.meta_path = os.path.join(cache_dir, "meta.json")
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.meta = {"dtype": dtype, "dim": None, "rows": 0, "tick": 0, "entries": {}}
+        if os.path.exists(self.meta_path):
+            try:
+                with open(self.meta_path, 'r', encoding='utf-8') as f:
+                    self.meta = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable embedding cache: {e}")
+
+        if self.meta["dtype"] != dtype:
+            logger.info(f"Embedding cache dtype changed to {dtype}, starting a new cache.")
+            self.meta = {"dtype": dtype, "dim": None, "rows": 0, "tick": 0, "entries": {}}
+            if os.path.exists(self.vectors_path):
+                os.remove(self.vectors_path)
+
+        self.dtype = np.dtype(self.meta["dtype"])
+        self._truncate_unsaved_rows()
+
+        self.hits = 0
+        self.misses = 0
+        # Optional MicroBatcher over embeddings.embed_documents, shared by concurrent queries
+        self.query_batcher = None
+
+    def _key(self, text: str) -> str:
+        payload = json.dumps([self.model_name, self.normalize, text], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _truncate_unsaved_rows(self):
+        # Rows appended after the last save() are not referenced by the manifest
+        if not os.path.exists(self.vectors_path):
+            self.meta["rows"] = 0
+            self.meta["entries"] = {}
+            return
+        dim = self.meta["dim"] or 0
+        expected = self.meta["rows"] * dim * self.dtype.itemsize
+        if os.path.getsize(self.vectors_path) > expected:
+            with open(self.vectors_path, 'r+b') as f:
+                f.truncate(expected)
+
+    def _read_rows(self, rows: List[int]) -> np.ndarray:
+        vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode='r',
+                            shape=(self.meta["rows"], self.meta["dim"]))
+        return np.asarray(vectors[rows], dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        entries = self.meta["entries"]
+        self.meta["tick"] += 1
+        tick = self.meta["tick"]
+
+        keys = [self._key(text) for text in texts]
+        result = [None] * len(texts)
+
+        hit_idx = [i for i, key in enumerate(keys) if key in entries]
+        if hit_idx:
+            rows = self._read_rows([entries[keys[i]][0] for i in hit_idx])
+            for i, vector in zip(hit_idx, rows):
+                result[i] = vector.tolist()
+                entries[keys[i]][1] = tick
+
+        # Duplicate chunks within the batch are embedded once
+        miss_keys = {}
+        for i, key in enumerate(keys):
+            if result[i] is None:
+                miss_keys.setdefault(key, []).append(i)
+
+        self.hits += len(hit_idx)
+        self.misses += len(texts) - len(hit_idx)
+
+        if miss_keys:
+            miss_texts = [texts[positions[0]] for positions in miss_keys.values()]
+            vectors = np.asarray(self.embeddings.embed_documents(miss_texts), dtype=np.float32)
+
+            if self.meta["dim"] is None:
+                self.meta["dim"] = int(vectors.shape[1])
+            with open(self.vectors_path, 'ab') as f:
+                f.write(vectors.astype(self.dtype).tobytes())
+
+            for (key, positions), vector in zip(miss_keys.items(), vectors):
+                entries[key] = [self.meta["rows"], tick]
+                self.meta["rows"] += 1
+                for i in positions:
+                    result[i] = vector.tolist()
+
+        return result
+
+    def set_query_batching(self, wait_ms: float, max_queries: int = 64):
+        """Batches concurrent embed_query/embed_queries calls into one forward pass (0 = off)."""
+        if self.query_batcher:
+            self.query_batcher.close()
+        self.query_batcher = None
+        if wait_ms > 0:
+            self.query_batcher = MicroBatcher(self.embeddings.embed_documents, max_batch_size=max_queries,
+                                              max_wait_ms=wait_ms, name="embed-batcher")
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.query_batcher:
+            return self.query_batcher.submit([text])[0]
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # One forward pass for many queries; like embed_query, queries bypass the cache
+        if self.query_batcher:
+            return self.query_batcher.submit(texts)
+        return self.embeddings.embed_documents(list(texts))
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def log_stats(self):
+        logger.info(
+            f"Embedding cache: {self.hits} hits, {self.misses} misses "
+            f"({self.hit_rate():.1%} hit rate), {len(self.meta['entries'])} vectors cached."
+        )
+
+    def _evict(self):
+        row_bytes = (self.meta["dim"] or 0) * self.dtype.itemsize
+        if not row_bytes or self.meta["rows"] * row_bytes <= self.max_bytes:
+            return
+
+        # Keep the most recently used vectors that fit in the budget, compacting the file
+        budget_rows = self.max_bytes // row_bytes
+        ranked = sorted(self.meta["entries"].items(), key=lambda item: item[1][1], reverse=True)
+        kept = ranked[:budget_rows]
+        old_rows = [row for _, (row, _) in kept]
+
+        vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode='r',
+                            shape=(self.meta["rows"], self.meta["dim"]))
+        tmp_path = f"{self.vectors_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(np.ascontiguousarray(vectors[old_rows]).tobytes())
+        del vectors
+        os.replace(tmp_path, self.vectors_path)
+
+        self.meta["entries"] = {key: [new_row, tick] for new_row, (key, (_, tick)) in enumerate(kept)}
+        self.meta["rows"] = len(kept)
+        logger.info(f"Evicted {len(ranked) - len(kept)} vectors from embedding cache.")
+
+    def save(self):
+        self._evict()
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self.meta_path)
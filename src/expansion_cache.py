@@ -0,0 +1,101 @@
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from src.rerank_cache import normalize_query
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S"
+)
+logger = logging.getLogger(__name__)
+
+class ExpansionCache:
+    """Persistent LRU of query expansions keyed by (expander model, normalized question).
+
+    Each new expansion is appended to a JSONL log, so a restart keeps them. On load the
+    log is replayed (later lines win, oldest beyond `max_entries` dropped) and rewritten
+    once it has grown past twice the live entries.
+    """
+
+    def __init__(self, path: str, model_name: str, max_entries: int = 10000):
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if self.max_entries > 0:
+            self._load()
+
+    def _key(self, question: str) -> str:
+        return normalize_query(question).casefold()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    lines += 1
+                    entry = json.loads(line)
+                    if entry["model"] != self.model_name:
+                        continue
+                    self._entries[entry["key"]] = entry["expansion"]
+                    self._entries.move_to_end(entry["key"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring the rest of an unreadable expansion cache: {e}")
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if lines > 2 * max(len(self._entries), 1):
+            self._rewrite()
+        logger.info(f"Loaded {len(self._entries)} cached query expansions.")
+
+    def _rewrite(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for key, expansion in self._entries.items():
+                f.write(json.dumps({"model": self.model_name, "key": key, "expansion": expansion},
+                                   ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def get(self, question: str) -> Optional[str]:
+        if self.max_entries <= 0:
+            return None
+        key = self._key(question)
+        with self._lock:
+            expansion = self._entries.get(key)
+            if expansion is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return expansion
+
+    def put(self, question: str, expansion: str):
+        if self.max_entries <= 0:
+            return
+        key = self._key(question)
+        with self._lock:
+            self._entries[key] = expansion
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({"model": self.model_name, "key": key, "expansion": expansion},
+                                       ensure_ascii=False) + "\n")
+            except OSError as e:
+                logger.warning(f"Could not persist query expansion: {e}")
@@ -0,0 +1,196 @@
+import time
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Collection, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.pydantic_v1 import Field
+from langchain_core.retrievers import BaseRetriever
+from langchain_community.vectorstores import FAISS
+
+from src.bm25_index import BM25IndexRetriever
+from src.embedding_cache import CachedEmbeddings
+from src.vector_index import filter_mask, filtered_search
+
+# Metadata filters: field -> allowed values, e.g. {"source": {"owasp-top-10.pdf"}}
+Filters = Dict[str, Collection[str]]
+
+# Timings of the last search made by the current thread (one request per thread)
+_timings = threading.local()
+
+def record_timings(**timings_ms: float):
+    if not hasattr(_timings, "last"):
+        _timings.last = {}
+    _timings.last.update({name: round(value, 2) for name, value in timings_ms.items()})
+
+def last_timings() -> Dict[str, float]:
+    return dict(getattr(_timings, "last", {}))
+
+def weighted_reciprocal_rank(doc_lists: List[List[Document]], weights: List[float],
+                             c: int = 60) -> Tuple[List[Document], List[float]]:
+    """Weighted RRF exactly as EnsembleRetriever.weighted_reciprocal_rank (id_key=None).
+
+    Returns the fused documents and their fused scores.
+    """
+    if len(doc_lists) != len(weights):
+        raise ValueError("Number of rank lists must be equal to the number of weights.")
+
+    rrf_score: Dict[str, float] = defaultdict(float)
+    for doc_list, weight in zip(doc_lists, weights):
+        for rank, doc in enumerate(doc_list, start=1):
+            rrf_score[doc.page_content] += weight / (rank + c)
+
+    # Deduplicate by content in chain order, then stable sort by score
+    unique_docs = []
+    seen = set()
+    for doc_list in doc_lists:
+        for doc in doc_list:
+            if doc.page_content not in seen:
+                seen.add(doc.page_content)
+                unique_docs.append(doc)
+    fused = sorted(unique_docs, reverse=True, key=lambda doc: rrf_score[doc.page_content])
+    return fused, [rrf_score[doc.page_content] for doc in fused]
+
+class FusedCandidates(NamedTuple):
+    """First-stage result of one query: fused ranking plus the two legs it came from."""
+    docs: List[Document]
+    scores: List[float]
+    bm25_docs: List[Document]
+    vector_docs: List[Document]
+
+class HybridRetriever(BaseRetriever):
+    """BM25 + FAISS retriever fused with weighted RRF, running both legs concurrently.
+
+    The BM25 leg (newmm tokenization and scoring) runs on `executor` while the
+    calling thread embeds the query and searches FAISS. With `filters`, both legs
+    rank only the matching chunks: FAISS through a bitmap selector, BM25 by taking
+    its top-k over the matching rows.
+    """
+
+    bm25_retriever: BM25IndexRetriever
+    vector_store: FAISS
+    executor: ThreadPoolExecutor
+    k: int = 15
+    weights: List[float] = [0.4, 0.6]
+    c: int = 60
+    # FAISS position masks per filter; cleared whenever the vector store changes
+    filter_masks: Dict[Tuple, np.ndarray] = Field(default_factory=dict)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def clear_filter_cache(self):
+        self.filter_masks.clear()
+
+    def _vector_mask(self, filters: Filters) -> np.ndarray:
+        key = tuple(sorted((field, tuple(sorted(values))) for field, values in filters.items()))
+        mask = self.filter_masks.get(key)
+        if mask is None or len(mask) != self.vector_store.index.ntotal:
+            mask = self.filter_masks[key] = filter_mask(self.vector_store, filters)
+        return mask
+
+    def _search_vectors(self, vectors, filters: Optional[Filters]) -> List[List[Document]]:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if filters:
+            _, indices = filtered_search(self.vector_store.index, vectors, self.k, self._vector_mask(filters))
+        else:
+            _, indices = self.vector_store.index.search(vectors, self.k)
+
+        # Hits are resolved as in FAISS.similarity_search_by_vector
+        mapping, docstore = self.vector_store.index_to_docstore_id, self.vector_store.docstore
+        doc_lists = []
+        for row in indices:
+            docs = []
+            for i in row:
+                if i == -1:
+                    continue
+                doc = docstore.search(mapping[int(i)])
+                if not isinstance(doc, Document):
+                    raise ValueError(f"Could not find document for id {mapping[int(i)]}, got {doc}")
+                docs.append(doc)
+            doc_lists.append(docs)
+        return doc_lists
+
+    def _bm25_leg(self, query: str, filters: Optional[Filters] = None):
+        start = time.perf_counter()
+        docs = self.bm25_retriever.invoke(query, filters=filters)
+        return docs, time.perf_counter() - start
+
+    def _vector_leg(self, query: str, filters: Optional[Filters] = None):
+        start = time.perf_counter()
+        embedding = self.vector_store.embedding_function.embed_query(query)
+        embed_s = time.perf_counter() - start
+        docs = self._search_vectors([embedding], filters)[0]
+        return docs, embed_s, time.perf_counter() - start
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, filters: Optional[Filters] = None
+    ) -> List[Document]:
+        return self.retrieve(query, filters).docs
+
+    def retrieve(self, query: str, filters: Optional[Filters] = None) -> FusedCandidates:
+        start = time.perf_counter()
+        bm25_future = self.executor.submit(self._bm25_leg, query, filters)
+        vector_docs, embed_s, vector_s = self._vector_leg(query, filters)
+        bm25_docs, bm25_s = bm25_future.result()
+
+        fusion_start = time.perf_counter()
+        docs, scores = weighted_reciprocal_rank([bm25_docs, vector_docs], self.weights, self.c)
+        end = time.perf_counter()
+
+        _timings.last = {}
+        record_timings(
+            bm25_ms=bm25_s * 1000,
+            embed_ms=embed_s * 1000,
+            vector_ms=vector_s * 1000,
+            fusion_ms=(end - fusion_start) * 1000,
+            retrieval_ms=(end - start) * 1000
+        )
+        return FusedCandidates(docs, scores, bm25_docs, vector_docs)
+
+    def _vector_leg_batch(self, queries: List[str], filters: Optional[Filters] = None):
+        start = time.perf_counter()
+        embeddings = self.vector_store.embedding_function
+        if isinstance(embeddings, CachedEmbeddings):
+            vectors = embeddings.embed_queries(queries)
+        else:
+            vectors = [embeddings.embed_query(query) for query in queries]
+        embed_s = time.perf_counter() - start
+
+        # One FAISS call for the whole batch
+        doc_lists = self._search_vectors(vectors, filters)
+        return doc_lists, embed_s, time.perf_counter() - start
+
+    def retrieve_many(self, queries: List[str], filters: Optional[Filters] = None) -> List[FusedCandidates]:
+        """Fused candidates for several queries: one BM25 sparse product, one embedding
+        batch and one FAISS search, with the BM25 leg again running on `executor`."""
+        start = time.perf_counter()
+        bm25_future = self.executor.submit(self._timed_bm25_batch, queries, filters)
+        vector_lists, embed_s, vector_s = self._vector_leg_batch(queries, filters)
+        bm25_lists, bm25_s = bm25_future.result()
+
+        fusion_start = time.perf_counter()
+        fused = [
+            FusedCandidates(*weighted_reciprocal_rank([bm25_docs, vector_docs], self.weights, self.c),
+                            bm25_docs, vector_docs)
+            for bm25_docs, vector_docs in zip(bm25_lists, vector_lists)
+        ]
+        end = time.perf_counter()
+
+        _timings.last = {}
+        record_timings(
+            bm25_ms=bm25_s * 1000,
+            embed_ms=embed_s * 1000,
+            vector_ms=vector_s * 1000,
+            fusion_ms=(end - fusion_start) * 1000,
+            retrieval_ms=(end - start) * 1000
+        )
+        return fused
+
+    def _timed_bm25_batch(self, queries: List[str], filters: Optional[Filters] = None):
+        start = time.perf_counter()
+        doc_lists = self.bm25_retriever.search_batch(queries, filters)
+        return doc_lists, time.perf_counter() - start
@@ -0,0 +1,124 @@
+import os
+import json
+import hashlib
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import pypdfium2 as pdfium
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S"
+)
+logger = logging.getLogger(__name__)
+
+# Low-resolution render used only to fingerprint page content (scanned pages have no text layer)
+FINGERPRINT_SCALE = 0.5
+
+class IngestionCache:
+    def __init__(self, cache_dir: str = None):
+        default_dir = os.path.join(os.getenv("OUTPUT_PATH", "ingested_data/"), "cache")
+        self.cache_dir = cache_dir or os.getenv("INGEST_CACHE_PATH", default_dir)
+        self.pages_dir = os.path.join(self.cache_dir, "pages")
+        self.manifest_path = os.path.join(self.cache_dir, "manifest.json")
+
+        os.makedirs(self.pages_dir, exist_ok=True)
+
+        self.manifest = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self.manifest = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable ingestion cache manifest: {e}")
+
+        self.page_hits = 0
+        self.page_misses = 0
+
+    @staticmethod
+    def hash_file(file_path: str) -> str:
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        return sha.hexdigest()
+
+    @staticmethod
+    def hash_page(page: pdfium.PdfPage) -> str:
+        sha = hashlib.sha256()
+        textpage = page.get_textpage()
+        sha.update(textpage.get_text_range().encode("utf-8", "surrogatepass"))
+        bitmap = page.render(scale=FINGERPRINT_SCALE, grayscale=True)
+        sha.update(bitmap.to_pil().tobytes())
+        return sha.hexdigest()
+
+    @staticmethod
+    def settings_key(settings: dict) -> str:
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def _page_path(self, page_hash: str, settings_key: str) -> str:
+        return os.path.join(self.pages_dir, f"{settings_key}-{page_hash}.txt")
+
+    def get_file(self, filename: str, file_hash: str, settings_key: str) -> Optional[Dict[int, str]]:
+        entry = self.manifest.get(filename)
+        if not entry or entry["file_hash"] != file_hash or entry["settings"] != settings_key:
+            return None
+
+        texts = {}
+        for i, page_hash in enumerate(entry["pages"]):
+            text = self.get_page(page_hash, settings_key)
+            if text is None:
+                return None
+            texts[i] = text
+        return texts
+
+    def get_page(self, page_hash: str, settings_key: str) -> Optional[str]:
+        path = self._page_path(page_hash, settings_key)
+        if not os.path.exists(path):
+            self.page_misses += 1
+            return None
+
+        self.page_hits += 1
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def put_page(self, page_hash: str, settings_key: str, text: str):
+        path = self._page_path(page_hash, settings_key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def put_file(self, filename: str, file_hash: str, settings_key: str, page_hashes: List[str]):
+        self.manifest[filename] = {
+            "file_hash": file_hash,
+            "settings": settings_key,
+            "pages": page_hashes
+        }
+
+    def evict(self, keep_filenames: Iterable[str]):
+        keep_filenames = set(keep_filenames)
+        for filename in list(self.manifest):
+            if filename not in keep_filenames:
+                logger.info(f"Evicting removed file from ingestion cache: {filename}")
+                del self.manifest[filename]
+
+        referenced = {
+            os.path.basename(self._page_path(page_hash, entry["settings"]))
+            for entry in self.manifest.values()
+            for page_hash in entry["pages"]
+        }
+        removed = 0
+        for name in os.listdir(self.pages_dir):
+            if name not in referenced:
+                os.remove(os.path.join(self.pages_dir, name))
+                removed += 1
+        if removed:
+            logger.info(f"Removed {removed} orphaned pages from ingestion cache.")
+
+    def save(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
@@ -1,12 +1,19 @@
 import os
+import json
+import asyncio
 import logging
 import re
-from typing import List
+from typing import AsyncIterator, List, Optional, Tuple
+import httpx
 from langchain_community.chat_models import ChatOllama
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.documents import Document
 from dotenv import load_dotenv
+
+from src.admission import PRIORITY_DEFAULT, AdmissionController, Overloaded
+from src.expansion_cache import ExpansionCache
+from src.prompt_builder import build_answer_messages
 load_dotenv()
 
 logging.basicConfig(
@@ -16,6 +23,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+GENERATION_ERROR = "Sorry, I encountered an error while generating the answer."
+NO_CONTEXT_ANSWER = "I cannot find relevant information in the provided documents."
+
+# LangChain message types to Ollama /api/chat roles
+OLLAMA_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
 class LLMClient:
     def __init__(self, model_name=None):
         base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
@@ -23,6 +36,36 @@ class LLMClient:
         self.generate_model_name = os.getenv("LLM_GENERATE_MODEL_NAME", "qwen2.5:7b-instruct-q4_0")
         temperature = float(os.getenv("LLM_TEMPERATURE", "0.2"))
         timeout = float(os.getenv("LLM_TIMEOUT", "120.0"))
+        self.temperature = temperature
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "2"))
+        max_connections = int(os.getenv("LLM_MAX_CONNECTIONS", "8"))
+        # Estimated generator tokens for the retrieved context (0 = no limit)
+        self.context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+
+        # Expansions survive restarts: the same questions come back day after day
+        self.expansion_cache = ExpansionCache(
+            os.getenv("EXPANSION_CACHE_PATH",
+                      os.path.join(os.getenv("DATABASE_PATH", "database"), "expansion_cache.jsonl")),
+            model_name=self.expand_model_name,
+            max_entries=int(os.getenv("EXPANSION_CACHE_SIZE", "10000"))
+        )
+
+        # One pooled keep-alive client for every async request to Ollama
+        self.http_client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+        # Each model gets its own slots, matched to what Ollama runs in parallel (OLLAMA_NUM_PARALLEL)
+        max_queue = int(os.getenv("LLM_QUEUE_SIZE", "32"))
+        max_wait = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+        self.expand_admission = AdmissionController(
+            "expander", int(os.getenv("LLM_EXPAND_CONCURRENCY", "2")), max_queue, max_wait
+        )
+        self.generate_admission = AdmissionController(
+            "generator", int(os.getenv("LLM_GENERATE_CONCURRENCY", "2")), max_queue, max_wait
+        )
         
         
         logger.info(f"Initializing Expander LLM: {self.expand_model_name}")
@@ -45,9 +88,7 @@ class LLMClient:
             request_timeout=timeout
         )
 
-    def expand_query(self, query: str) -> str:
-        logger.info(f"Expanding query: '{query}'")
-        
+    def _expand_prompt(self) -> ChatPromptTemplate:
         system_prompt = """You are a Bilingual Search Query Optimizer for Thai-English cybersecurity queries.
 
 TASK: Convert user queries into alternating Thai-English keyword pairs for hybrid search.
@@ -74,114 +115,205 @@ Output: การโจมตีแบบข้ามไซต์ Cross-Site ช
 
 Query:"""
         
-        prompt = ChatPromptTemplate.from_messages([
+        return ChatPromptTemplate.from_messages([
             ("system", system_prompt),
             ("human", "{query}")
         ])
+
+    @staticmethod
+    def _clean_expansion(keywords: str) -> str:
+        keywords = keywords.replace('\n', ' ').replace('"', '').replace('Output: ','') .strip()
+        keywords = re.sub(r'(Here is|The translation|However).*', '', keywords, flags=re.IGNORECASE)
+        # query = keywords.replace('?', '').strip()
+
+        # expanded_query = f"{query} {keywords}"
+        expanded_query = f"{keywords}"
+        logger.info(f"Expanded: {expanded_query}")
+        return expanded_query
+
+    def cached_expansion(self, query: str) -> Optional[str]:
+        """The stored expansion of `query`, or None; no LLM call."""
+        expanded_query = self.expansion_cache.get(query)
+        if expanded_query is not None:
+            logger.info(f"Expanded (cached): {expanded_query}")
+        return expanded_query
+
+    def _remember_expansion(self, query: str, keywords: str) -> str:
+        expanded_query = self._clean_expansion(keywords)
+        if expanded_query:
+            self.expansion_cache.put(query, expanded_query)
+        return expanded_query
+
+    def expand_query(self, query: str) -> str:
+        cached = self.cached_expansion(query)
+        if cached is not None:
+            return cached
+        logger.info(f"Expanding query: '{query}'")
         
-        chain = prompt | self.llm_expand | StrOutputParser()
+        chain = self._expand_prompt() | self.llm_expand | StrOutputParser()
         
         try:
-            keywords = chain.invoke({"query": query})
-            keywords = keywords.replace('\n', ' ').replace('"', '').replace('Output: ','') .strip()
-            keywords = re.sub(r'(Here is|The translation|However).*', '', keywords, flags=re.IGNORECASE)
-            # query = keywords.replace('?', '').strip()
-
-            # expanded_query = f"{query} {keywords}"
-            expanded_query = f"{keywords}"
-            logger.info(f"Expanded: {expanded_query}")
-            return expanded_query
+            return self._remember_expansion(query, chain.invoke({"query": query}))
         except Exception as e:
             logger.error(f"Expansion failed: {e}")
             return query 
 
+    def _chat_payload(self, model: str, prompt: ChatPromptTemplate, inputs: dict,
+                      num_predict: int, stream: bool = False) -> dict:
+        return {
+            "model": model,
+            "messages": [
+                {"role": OLLAMA_ROLES.get(message.type, message.type), "content": message.content}
+                for message in prompt.format_messages(**inputs)
+            ],
+            "stream": stream,
+            "keep_alive": "1h",
+            "options": {"temperature": self.temperature, "num_predict": num_predict}
+        }
+
+    @staticmethod
+    def _log_usage(model: str, result: dict):
+        # Prefill time falls sharply when Ollama reuses the cached prompt prefix
+        if "prompt_eval_count" in result:
+            logger.info(
+                f"{model}: {result['prompt_eval_count']} prompt tokens, "
+                f"prefill {result.get('prompt_eval_duration', 0) / 1e6:.0f} ms, "
+                f"{result.get('eval_count', 0)} generated in {result.get('eval_duration', 0) / 1e6:.0f} ms"
+            )
+
+    async def _achat(self, model: str, prompt: ChatPromptTemplate, inputs: dict, num_predict: int,
+                     admission: AdmissionController, priority: int = PRIORITY_DEFAULT) -> str:
+        """One non-streaming Ollama /api/chat call, retried with backoff on connection errors and 429/5xx."""
+        payload = self._chat_payload(model, prompt, inputs, num_predict)
+        async with admission.slot(priority):
+            return await self._post_chat(model, payload)
+
+    async def _post_chat(self, model: str, payload: dict) -> str:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.http_client.post("/api/chat", json=payload)
+                if response.status_code != 429 and response.status_code < 500:
+                    response.raise_for_status()
+                    result = response.json()
+                    self._log_usage(model, result)
+                    return result["message"]["content"]
+                error = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                error = repr(e)
+            if attempt < self.max_retries:
+                logger.warning(f"Ollama request failed ({error}), retry {attempt + 1}/{self.max_retries}")
+                await asyncio.sleep(0.5 * 2 ** attempt)
+        raise RuntimeError(f"Ollama request failed after {self.max_retries + 1} attempts: {error}")
+
+    async def aexpand_query(self, query: str, priority: int = PRIORITY_DEFAULT) -> str:
+        """expand_query without blocking the event loop; the raw query is used when the expander is overloaded."""
+        cached = self.cached_expansion(query)
+        if cached is not None:
+            return cached
+        logger.info(f"Expanding query: '{query}'")
+        try:
+            keywords = await self._achat(self.expand_model_name, self._expand_prompt(), {"query": query}, 100,
+                                         self.expand_admission, priority)
+            return self._remember_expansion(query, keywords)
+        except Overloaded as e:
+            logger.warning(f"Skipping expansion: {e}")
+            return query
+        except Exception as e:
+            logger.error(f"Expansion failed: {e}")
+            return query
+
+    def _answer_prompt(self, query: str, context_docs: List[Document]) -> Tuple[ChatPromptTemplate, dict]:
+        messages, stats = build_answer_messages(query, context_docs, self.context_token_budget)
+        logger.info(
+            f"Context: {stats['chunks']} chunks -> {stats['passages']} passages, "
+            f"~{stats['context_tokens']} tokens ({stats['dropped']} dropped, {stats['truncated']} truncated)"
+        )
+        # Message objects are taken verbatim: chunk text is never parsed as a template
+        return ChatPromptTemplate.from_messages(messages), {}
+
     def generate_answer(self, query: str, context_docs: List[Document]) -> str:
         if not context_docs:
-            return "I cannot find relevant information in the provided documents."
+            return NO_CONTEXT_ANSWER
 
         logger.info(f"Generating answer from {len(context_docs)} documents...")
+        prompt, inputs = self._answer_prompt(query, context_docs)
+        chain = prompt | self.llm_generate | StrOutputParser()
 
-        context_text = ""
-        for i, doc in enumerate(context_docs):
-            source = doc.metadata.get("source", "unknown")
-            page = doc.metadata.get("logical_page", "-")
-            content = doc.page_content.replace("\n", " ").strip()
-            content = content.replace("{", "{{").replace("}", "}}")
-            
-            context_text += f"\n--- Document {i+1} (Source: {source}, Page: {page}) ---\n{content}\n"
-
-        system_prompt = """You are a Cybersecurity Compliance Specialist answering questions using ONLY the provided Context.
-
-CORE RULES:
-1. Base answers EXCLUSIVELY on Context - ignore all outside knowledge
-2. Cite every claim immediately: [Source: filename, Page: X]
-3. Output in ENGLISH only (translate Thai terms to English)
-4. If answer not in Context, respond: "I cannot find this information in the provided documents."
-
-CITATION FORMAT:
-- Inline only - no reference sections
-- Single source: [Source: policy.pdf, Page: 5]
-- Multiple sources: [Source: doc1.pdf, Page: 3; Source: doc2.pdf, Page: 7]
-- Note conflicts explicitly when documents disagree
-
-RESPONSE STRUCTURE:
-- Direct answer first
-- Support with bullet points if needed
-- Keep concise and professional
-
-EXAMPLES:
-
-Example 1: Single Source (Thai to English)
-Context:
---- Document 1 (Source: policy_th.pdf, Page: 12) ---
-รหัสผ่านต้องมีความยาวอย่างน้อย 8 ตัวอักษร และต้องประกอบด้วยตัวเลขและอักษรพิเศษ
-
-Question: What are the password complexity requirements?
-Answer: Passwords must be at least 8 characters long and contain both numbers and special characters [Source: policy_th.pdf, Page: 12].
-
-Example 2: Multiple Sources & Conflict
-Context:
---- Document 1 (Source: old_standard.pdf, Page: 5) ---
-Data retention period is 90 days.
---- Document 2 (Source: new_reg_2024.pdf, Page: 2) ---
-All logs must be retained for at least 1 year.
-
-Question: How long should logs be kept?
-Answer: There is conflicting information in the provided documents. One document states the retention period is 90 days [Source: old_standard.pdf, Page: 5], while a newer regulation requires logs to be retained for at least 1 year [Source: new_reg_2024.pdf, Page: 2].
+        try:
+            response = chain.invoke(inputs)
+            response = response.strip()
+            return response
+        except Exception as e:
+            logger.error(f"Generation failed: {e}")
+            return GENERATION_ERROR
 
-Example 3: Insufficient Information
-Context:
---- Document 1 (Source: firewall_config.pdf, Page: 1) ---
-Port 80 and 443 should be open for web traffic.
+    async def agenerate_answer(self, query: str, context_docs: List[Document],
+                               priority: int = PRIORITY_DEFAULT) -> str:
+        """generate_answer without blocking the event loop. Raises Overloaded when no generator slot is free in time."""
+        if not context_docs:
+            return NO_CONTEXT_ANSWER
 
-Question: How do I configure the backup server?
-Answer: I cannot find this information in the provided documents. **In this case, there's no need to enter a source files**
+        logger.info(f"Generating answer from {len(context_docs)} documents...")
+        prompt, inputs = self._answer_prompt(query, context_docs)
+        try:
+            response = await self._achat(self.generate_model_name, prompt, inputs, 350,
+                                         self.generate_admission, priority)
+            return response.strip()
+        except Overloaded:
+            raise
+        except Exception as e:
+            logger.error(f"Generation failed: {e}")
+            return GENERATION_ERROR
 
-Context:
-{context}
+    def admission_stats(self) -> dict:
+        return {"expander": self.expand_admission.stats(), "generator": self.generate_admission.stats()}
 
-Question: {question}
+    async def aclose(self):
+        await self.http_client.aclose()
 
-Answer:"""
+    async def astream_answer(self, query: str, context_docs: List[Document],
+                             priority: int = PRIORITY_DEFAULT) -> AsyncIterator[str]:
+        """Same answer as agenerate_answer, yielded in pieces as the generator model produces them.
 
+        Raises Overloaded, before the first piece, when no generator slot is free in time.
+        """
+        if not context_docs:
+            yield NO_CONTEXT_ANSWER
+            return
 
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("human", "User Question: {question}")
-        ])
+        logger.info(f"Streaming answer from {len(context_docs)} documents...")
+        prompt, inputs = self._answer_prompt(query, context_docs)
+        payload = self._chat_payload(self.generate_model_name, prompt, inputs, 350, stream=True)
 
-        chain = prompt | self.llm_generate | StrOutputParser()
+        async with self.generate_admission.slot(priority):
+            async for token in self._stream_chat(payload):
+                yield token
 
+    async def _stream_chat(self, payload: dict) -> AsyncIterator[str]:
+        started = False
         try:
-            response = chain.invoke({
-                "context": context_text,
-                "question": query
-            })
-            response = response.strip()
-            return response
+            async with self.http_client.stream("POST", "/api/chat", json=payload) as response:
+                response.raise_for_status()
+                # Ollama streams one JSON object per line
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise RuntimeError(chunk["error"])
+                    token = chunk.get("message", {}).get("content", "")
+                    # Leading whitespace is dropped, as agenerate_answer strips the full response
+                    if not started:
+                        token = token.lstrip()
+                        started = bool(token)
+                    if token:
+                        yield token
+                    if chunk.get("done"):
+                        self._log_usage(self.generate_model_name, chunk)
+                        break
         except Exception as e:
             logger.error(f"Generation failed: {e}")
-            return "Sorry, I encountered an error while generating the answer."
+            yield GENERATION_ERROR if not started else f"\n\n{GENERATION_ERROR}"
 
 if __name__ == "__main__":
     try:
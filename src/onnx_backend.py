@@ -0,0 +1,230 @@
+import os
+import json
+import logging
+from typing import List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_community.cross_encoders import BaseCrossEncoder
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S"
+)
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKENDS = ["torch", "onnx"]
+MODEL_KINDS = ["embedding", "cross-encoder"]
+
+# Exported directory layout: model.onnx (fp32), model.int8.onnx, tokenizer.json, backend.json
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+CONFIG_FILE = "backend.json"
+
+def export_dir(root: str, model_name: str, kind: str) -> str:
+    return os.path.join(root, kind, model_name.strip("/").replace("/", "--"))
+
+def _pooling_mode(model_name: str) -> str:
+    """Pooling used by the sentence-transformers model (its 1_Pooling/config.json); mean if absent."""
+    path = os.path.join(model_name, "1_Pooling", "config.json")
+    if not os.path.isdir(model_name):
+        try:
+            from huggingface_hub import hf_hub_download
+            path = hf_hub_download(model_name, "1_Pooling/config.json")
+        except Exception:
+            return "mean"
+    if not os.path.exists(path):
+        return "mean"
+
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    if config.get("pooling_mode_cls_token"):
+        return "cls"
+    if config.get("pooling_mode_mean_tokens", True):
+        return "mean"
+    raise ValueError(f"Unsupported pooling in {path}; the ONNX backend supports mean and CLS pooling")
+
+def export_model(model_name: str, kind: str, directory: str, max_length: int = 512) -> str:
+    """Exports an embedding or cross-encoder model to ONNX plus a dynamically quantized int8 copy.
+
+    Only the export needs torch and transformers; serving the exported files needs
+    onnxruntime and tokenizers alone.
+    """
+    if kind not in MODEL_KINDS:
+        raise ValueError(f"Unknown model kind '{kind}', expected one of {MODEL_KINDS}")
+
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    from transformers import AutoModel, AutoModelForSequenceClassification, AutoTokenizer
+
+    logger.info(f"Exporting {model_name} ({kind}) to ONNX in {directory}...")
+    os.makedirs(directory, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if kind == "embedding":
+        model = AutoModel.from_pretrained(model_name)
+    else:
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+
+    input_names = list(tokenizer.model_input_names)
+
+    class Wrapper(torch.nn.Module):
+        # Positional inputs in `input_names` order; returns last_hidden_state or logits
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, *inputs):
+            return self.inner(**dict(zip(input_names, inputs)), return_dict=False)[0]
+
+    sample = tokenizer(["query", "a longer sample passage"], padding=True, return_tensors="pt")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["output"] = {0: "batch", 1: "sequence"} if kind == "embedding" else {0: "batch"}
+
+    fp32_path = os.path.join(directory, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            Wrapper(model),
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["output"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+            dynamo=False
+        )
+    # Shape inference and graph cleanup first, as ONNX Runtime recommends before quantizing
+    prepared_path = f"{fp32_path}.prep"
+    quant_pre_process(fp32_path, prepared_path, skip_symbolic_shape=True)
+    quantize_dynamic(prepared_path, os.path.join(directory, INT8_FILE), weight_type=QuantType.QInt8)
+    os.remove(prepared_path)
+
+    tokenizer.save_pretrained(directory)
+    config = {
+        "kind": kind,
+        "model_name": model_name,
+        "inputs": input_names,
+        "max_length": min(max_length, tokenizer.model_max_length,
+                          getattr(model.config, "max_position_embeddings", max_length)),
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id
+    }
+    if kind == "embedding":
+        config["pooling"] = _pooling_mode(model_name)
+    else:
+        # As sentence-transformers' CrossEncoder.predict: sigmoid on single-logit models
+        config["num_labels"] = model.config.num_labels
+        config["activation"] = "sigmoid" if model.config.num_labels == 1 else "identity"
+    with open(os.path.join(directory, CONFIG_FILE), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+
+    logger.info(f"Exported {model_name} ({os.path.getsize(fp32_path) / 2**20:.1f} MB fp32).")
+    return directory
+
+def ensure_exported(model_name: str, kind: str, root: str, max_length: int = 512) -> str:
+    directory = export_dir(root, model_name, kind)
+    if not os.path.exists(os.path.join(directory, CONFIG_FILE)):
+        export_model(model_name, kind, directory, max_length=max_length)
+    return directory
+
+class _OnnxModel:
+    """Tokenizer plus ONNX Runtime session over an exported directory."""
+
+    def __init__(self, directory: str, quantized: bool = True, intra_op_threads: int = 0,
+                 device: str = "cpu", max_length: int = 0):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as exc:
+            raise ImportError(
+                "INFERENCE_BACKEND=onnx needs onnxruntime and tokenizers. "
+                "Install them with `pip install onnxruntime tokenizers`."
+            ) from exc
+
+        with open(os.path.join(directory, CONFIG_FILE), 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+        self.input_names = self.config["inputs"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, "tokenizer.json"))
+        # Never past what the model was exported for (its position embeddings)
+        self.tokenizer.enable_truncation(min(max_length or self.config["max_length"], self.config["max_length"]))
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        providers = ["CPUExecutionProvider"]
+        if device == "cuda" and "CUDAExecutionProvider" in ort.get_available_providers():
+            providers.insert(0, "CUDAExecutionProvider")
+
+        path = os.path.join(directory, INT8_FILE if quantized else FP32_FILE)
+        self.session = ort.InferenceSession(path, options, providers=providers)
+
+    def run(self, inputs) -> Tuple[np.ndarray, np.ndarray]:
+        """Model output and attention mask for a batch of texts or (text, text) pairs."""
+        encodings = self.tokenizer.encode_batch(inputs)
+        arrays = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64)
+        }
+        feed = {name: arrays[name] for name in self.input_names}
+        return self.session.run(None, feed)[0], arrays["attention_mask"]
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence embeddings (mean or CLS pooling) from an exported model through ONNX Runtime."""
+
+    def __init__(self, directory: str, quantized: bool = True, batch_size: int = 32,
+                 normalize: bool = True, intra_op_threads: int = 0, device: str = "cpu"):
+        self.model = _OnnxModel(directory, quantized=quantized, intra_op_threads=intra_op_threads, device=device)
+        self.batch_size = batch_size
+        self.normalize = normalize
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        hidden, mask = self.model.run(texts)
+        if self.model.config["pooling"] == "cls":
+            vectors = hidden[:, 0]
+        else:
+            weights = mask[..., None].astype(np.float32)
+            vectors = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        if self.normalize:
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # Batch texts of similar length together (as sentence-transformers does) to cut padding
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        vectors = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            batch = self._embed_batch([texts[i] for i in rows])
+            if vectors.shape[1] == 0:
+                vectors = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+            vectors[rows] = batch
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+class OnnxCrossEncoder(BaseCrossEncoder):
+    """Cross-encoder scores from an exported model through ONNX Runtime."""
+
+    def __init__(self, directory: str, quantized: bool = True, max_length: int = 512,
+                 intra_op_threads: int = 0, device: str = "cpu"):
+        self.model = _OnnxModel(directory, quantized=quantized, intra_op_threads=intra_op_threads,
+                                device=device, max_length=max_length)
+
+    def score(self, text_pairs: List[Tuple[str, str]]) -> np.ndarray:
+        if not text_pairs:
+            return np.zeros(0, dtype=np.float32)
+        logits, _ = self.model.run([tuple(pair) for pair in text_pairs])
+        if self.model.config["activation"] == "sigmoid":
+            logits = 1.0 / (1.0 + np.exp(-logits))
+        # Single-logit models give one score per pair; others keep their columns
+        return logits[:, 0] if logits.shape[1] == 1 else logits
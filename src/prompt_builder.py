@@ -0,0 +1,182 @@
+import re
+import math
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+# Docling marks every figure with this comment; it carries no text for the model
+IMAGE_PLACEHOLDER = re.compile(r"<!--\s*image\s*-->", re.IGNORECASE)
+TRAILING_SPACES = re.compile(r"[ \t]+$", re.MULTILINE)
+BLANK_LINES = re.compile(r"\n{3,}")
+
+# Overlaps shorter than this between neighbouring chunks are treated as coincidence
+MIN_OVERLAP_CHARS = 20
+# A passage cut to fit the budget must keep at least this many tokens to be worth sending
+MIN_PASSAGE_TOKENS = 50
+
+# Byte-identical for every request, so Ollama reuses its KV cache for the whole
+# instruction and few-shot prefix; only the user message changes
+ANSWER_SYSTEM_PROMPT = """You are a Cybersecurity Compliance Specialist answering questions using ONLY the provided Context.
+
+CORE RULES:
+1. Base answers EXCLUSIVELY on Context - ignore all outside knowledge
+2. Cite every claim immediately: [Source: filename, Page: X]
+3. Output in ENGLISH only (translate Thai terms to English)
+4. If answer not in Context, respond: "I cannot find this information in the provided documents."
+
+CITATION FORMAT:
+- Inline only - no reference sections
+- Single source: [Source: policy.pdf, Page: 5]
+- Multiple sources: [Source: doc1.pdf, Page: 3; Source: doc2.pdf, Page: 7]
+- Note conflicts explicitly when documents disagree
+
+RESPONSE STRUCTURE:
+- Direct answer first
+- Support with bullet points if needed
+- Keep concise and professional
+
+EXAMPLES:
+
+Example 1: Single Source (Thai to English)
+Context:
+--- Document 1 (Source: policy_th.pdf, Page: 12) ---
+รหัสผ่านต้องมีความยาวอย่างน้อย 8 ตัวอักษร และต้องประกอบด้วยตัวเลขและอักษรพิเศษ
+
+Question: What are the password complexity requirements?
+Answer: Passwords must be at least 8 characters long and contain both numbers and special characters [Source: policy_th.pdf, Page: 12].
+
+Example 2: Multiple Sources & Conflict
+Context:
+--- Document 1 (Source: old_standard.pdf, Page: 5) ---
+Data retention period is 90 days.
+--- Document 2 (Source: new_reg_2024.pdf, Page: 2) ---
+All logs must be retained for at least 1 year.
+
+Question: How long should logs be kept?
+Answer: There is conflicting information in the provided documents. One document states the retention period is 90 days [Source: old_standard.pdf, Page: 5], while a newer regulation requires logs to be retained for at least 1 year [Source: new_reg_2024.pdf, Page: 2].
+
+Example 3: Insufficient Information
+Context:
+--- Document 1 (Source: firewall_config.pdf, Page: 1) ---
+Port 80 and 443 should be open for web traffic.
+
+Question: How do I configure the backup server?
+Answer: I cannot find this information in the provided documents. **In this case, there's no need to enter a source files**
+
+The Context and the Question are in the user message."""
+
+def _token_weight(text: str) -> float:
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars / 4 + (len(text) - ascii_chars) / 2
+
+def estimate_tokens(text: str) -> int:
+    """Rough generator token count: ~4 chars per token for ASCII, ~2 for Thai and other scripts."""
+    return math.ceil(_token_weight(text))
+
+def clean_text(text: str) -> str:
+    """Drops image placeholders and surplus blank lines, keeping the Markdown line structure (tables, lists, headings)."""
+    text = TRAILING_SPACES.sub("", IMAGE_PLACEHOLDER.sub("", text))
+    return BLANK_LINES.sub("\n\n", text).strip()
+
+def _chunk_number(doc: Document) -> int:
+    # chunk_id is "<source>#<page>#<n>", n counting the chunks of the page in order
+    try:
+        return int(doc.metadata.get("chunk_id", "").rsplit("#", 1)[1])
+    except (IndexError, ValueError):
+        return -1
+
+def _join(left: str, right: str) -> str:
+    """Joins consecutive chunks, writing the text they share (the splitter's overlap) once."""
+    for size in range(min(len(left), len(right)), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    if right in left:
+        return left
+    return f"{left}\n{right}"
+
+def merge_passages(docs: List[Document]) -> List[Tuple[Dict, str]]:
+    """(metadata, text) passages: chunks of the same page merged, in best-rank order.
+
+    Consecutive chunks of a page become one passage with their overlap removed;
+    non-consecutive ones are joined with a "..." line. Empty chunks (images only) are dropped.
+    """
+    pages: "OrderedDict[Tuple, List[Document]]" = OrderedDict()
+    for doc in docs:
+        key = (doc.metadata.get("source"), doc.metadata.get("logical_page"))
+        pages.setdefault(key, []).append(doc)
+
+    passages = []
+    for chunks in pages.values():
+        chunks = sorted(chunks, key=_chunk_number)
+        text, previous = "", None
+        for chunk in chunks:
+            content = clean_text(chunk.page_content)
+            number = _chunk_number(chunk)
+            if not content:
+                continue
+            if not text:
+                text = content
+            elif previous is not None and number == previous + 1 and number >= 0:
+                text = _join(text, content)
+            elif content not in text:
+                text = f"{text}\n...\n{content}"
+            previous = number
+        if text:
+            passages.append((chunks[0].metadata, text))
+    return passages
+
+def _truncate(text: str, max_tokens: int) -> str:
+    # Cut on a word boundary so that the estimate fits
+    kept, weight = [], 1.0  # the trailing " ..."
+    for word in text.split(" "):
+        weight += _token_weight(word + " ")
+        if weight > max_tokens:
+            break
+        kept.append(word)
+    return " ".join(kept) + " ..."
+
+def pack_context(docs: List[Document], token_budget: int = 0) -> Tuple[str, Dict[str, int]]:
+    """Context block of merged passages, cut to `token_budget` estimated tokens (0 = no limit).
+
+    Passages are added in rank order; the first that does not fit is truncated if
+    enough room is left, and the rest are dropped.
+    """
+    passages = merge_passages(docs)
+    blocks, used, truncated = [], 0, 0
+    for metadata, text in passages:
+        header = (f"--- Document {len(blocks) + 1} (Source: {metadata.get('source', 'unknown')}, "
+                  f"Page: {metadata.get('logical_page', '-')}) ---")
+        cost = estimate_tokens(f"{header}\n{text}\n")
+        if token_budget and used + cost > token_budget:
+            room = token_budget - used - estimate_tokens(header) - 2
+            if room >= MIN_PASSAGE_TOKENS:
+                text = _truncate(text, room)
+                cost = estimate_tokens(f"{header}\n{text}\n")
+                truncated = 1
+            else:
+                break
+        blocks.append(f"{header}\n{text}\n")
+        used += cost
+        if truncated:
+            break
+
+    stats = {
+        "chunks": len(docs),
+        "passages": len(blocks),
+        "dropped": len(passages) - len(blocks),
+        "truncated": truncated,
+        "context_tokens": used
+    }
+    return "\n".join(blocks), stats
+
+def build_answer_messages(query: str, context_docs: List[Document],
+                          token_budget: int = 0) -> Tuple[List[BaseMessage], Dict[str, int]]:
+    """Static system prompt, then one user message with the packed Context and the question."""
+    context, stats = pack_context(context_docs, token_budget)
+    messages = [
+        SystemMessage(content=ANSWER_SYSTEM_PROMPT),
+        HumanMessage(content=f"Context:\n{context}\nUser Question: {query}")
+    ]
+    return messages, stats
@@ -1,21 +1,47 @@
 import os
+import copy
 import json
 import logging
-import pickle
 import shutil
-from typing import List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
 
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
-from langchain_community.retrievers import BM25Retriever
-from langchain.retrievers import EnsembleRetriever
-from langchain.retrievers import ContextualCompressionRetriever
-from langchain.retrievers.document_compressors import CrossEncoderReranker
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.cross_encoders import HuggingFaceCrossEncoder
 from pythainlp.tokenize import word_tokenize
-import torch
+
+from src.bm25_index import BM25IndexRetriever
+from src.embedding_cache import CachedEmbeddings
+from src.hybrid_retriever import (
+    Filters,
+    HybridRetriever,
+    last_timings,
+    record_timings,
+    weighted_reciprocal_rank
+)
+from src.onnx_backend import INFERENCE_BACKENDS, OnnxCrossEncoder, OnnxEmbeddings, ensure_exported
+from src.rerank_budget import RERANK_MODES, RerankRetriever
+from src.rerank_cache import CachedCrossEncoder, CachedCrossEncoderReranker
+from src.vector_index import (
+    TRAINED_INDEX_TYPES,
+    create_faiss_index,
+    detach_index,
+    empty_like,
+    filter_mask,
+    load_vector_store,
+    save_vector_store,
+    supports_remove,
+    tune_faiss_index
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -27,21 +53,66 @@ logger = logging.getLogger(__name__)
 def thai_tokenizer(text: str) -> List[str]:
     return word_tokenize(text, engine="newmm")
 
+def torch_device() -> str:
+    # Imported here so the ONNX backend never pays for loading torch
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def _batched(items: Iterable, batch_size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
 class RAGEngine:
     def __init__(self, db_path=None):
         self.db_path = db_path or os.getenv("DATABASE_PATH", "database")
-        self.faiss_path = os.path.join(self.db_path, "faiss_index")
-        self.bm25_path = os.path.join(self.db_path, "bm25_retriever.pkl")
+        # Each full build goes to versions/<id>/; CURRENT names the published one
+        self.versions_path = os.path.join(self.db_path, "versions")
+        self.current_path = os.path.join(self.db_path, "CURRENT")
+        self.keep_versions = int(os.getenv("INDEX_KEEP_VERSIONS", "2"))
+        self.index_version = None
+        self.index_revision = 0  # incremental updates applied to index_version in this process
+        self._use_index_dir(self.db_path)
         
         self.embedding_model_name = os.getenv("EMBEDDING_MODEL_NAME", "intfloat/multilingual-e5-small")
+        # torch: PyTorch fp32; onnx: int8-quantized ONNX Runtime models exported on first use
+        self.inference_backend = os.getenv("INFERENCE_BACKEND", "torch")
+        if self.inference_backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Unknown INFERENCE_BACKEND '{self.inference_backend}', expected one of {INFERENCE_BACKENDS}")
+        self.onnx_model_path = os.getenv("ONNX_MODEL_PATH", "models/onnx")
+        self.onnx_threads = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))  # 0 = one per physical core
         # Auto-detect device: use CUDA if available, else CPU
-        self.embedding_device = os.getenv("EMBEDDING_DEVICE", "cuda" if torch.cuda.is_available() else "cpu")
+        self.embedding_device = os.getenv("EMBEDDING_DEVICE") or (
+            torch_device() if self.inference_backend == "torch" else "cpu"
+        )
         self.reranker_model_name = os.getenv("RERANKER_MODEL_NAME", "BAAI/bge-reranker-base")
         
         self.chunk_size = int(os.getenv("CHUNK_SIZE", "1100"))
         self.chunk_overlap = int(os.getenv("CHUNK_OVERLAP", "200"))
         self.retrieval_k = int(os.getenv("RETRIEVAL_K", "15"))
         self.rerank_top_n = int(os.getenv("RERANK_TOP_N", "5"))
+        self.rerank_batch_size = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+        self.rerank_max_length = int(os.getenv("RERANK_MAX_LENGTH", "512"))  # tokens per (query, chunk) pair
+        self.rerank_max_chars = int(os.getenv("RERANK_MAX_CHARS", "1500"))  # chunk text cut before tokenizing
+        # full: rerank every fused candidate; adaptive: budget from BM25/FAISS agreement and fused score gap
+        self.rerank_mode = os.getenv("RERANK_MODE", "full")
+        if self.rerank_mode not in RERANK_MODES:
+            raise ValueError(f"Unknown RERANK_MODE '{self.rerank_mode}', expected one of {RERANK_MODES}")
+        self.rerank_min_candidates = int(os.getenv("RERANK_MIN_CANDIDATES", "10"))
+        self.rerank_gap_ratio = float(os.getenv("RERANK_GAP_RATIO", "0.5"))
+        self.rerank_skip_agreement = float(os.getenv("RERANK_SKIP_AGREEMENT", "0.8"))
+        self.index_batch_size = int(os.getenv("INDEX_BATCH_SIZE", "32"))
+
+        # Vector index type (Flat, HNSW, IVFFlat, IVFPQ, SQfp16, SQ8) and its build/search parameters
+        self.faiss_index_type = os.getenv("FAISS_INDEX_TYPE", "Flat")
+        self.faiss_hnsw_m = int(os.getenv("FAISS_HNSW_M", "32"))
+        self.faiss_nlist = int(os.getenv("FAISS_NLIST", "0"))
+        self.faiss_pq_m = int(os.getenv("FAISS_PQ_M", "48"))
+        self.faiss_ef_search = int(os.getenv("FAISS_EF_SEARCH", "64"))
+        self.faiss_nprobe = int(os.getenv("FAISS_NPROBE", "8"))
+        # "mmap": index and chunk texts are memory-mapped and shared by all workers; "memory": heap copies
+        self.index_load_mode = os.getenv("INDEX_LOAD_MODE", "mmap")
+        self._index_mmapped = False
 
         if not os.path.exists(self.db_path):
             os.makedirs(self.db_path)
@@ -52,31 +123,167 @@ class RAGEngine:
         # Optimize batch size based on device
         batch_size = 64 if self.embedding_device == 'cuda' else 32
         
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=self.embedding_model_name,
-            model_kwargs={'device': self.embedding_device}, 
-            encode_kwargs={
-                'normalize_embeddings': True,
-                'batch_size': batch_size
-            }
+        if self.inference_backend == "onnx":
+            base_embeddings = OnnxEmbeddings(
+                ensure_exported(self.embedding_model_name, "embedding", self.onnx_model_path),
+                batch_size=batch_size,
+                normalize=True,
+                intra_op_threads=self.onnx_threads,
+                device=self.embedding_device
+            )
+        else:
+            base_embeddings = HuggingFaceEmbeddings(
+                model_name=self.embedding_model_name,
+                model_kwargs={'device': self.embedding_device}, 
+                encode_kwargs={
+                    'normalize_embeddings': True,
+                    'batch_size': batch_size
+                }
+            )
+
+        # int8 vectors differ slightly from fp32 ones, so each backend gets its own cache keys
+        backend_model_name = self.embedding_model_name
+        if self.inference_backend == "onnx":
+            backend_model_name = f"{self.embedding_model_name}@onnx-int8"
+
+        # Shared across rebuilds so unchanged chunks are never re-encoded
+        self.embeddings = CachedEmbeddings(
+            base_embeddings,
+            model_name=backend_model_name,
+            normalize=True,
+            cache_dir=os.getenv("EMBEDDING_CACHE_PATH", os.path.join(self.db_path, "embedding_cache")),
+            max_mb=float(os.getenv("EMBEDDING_CACHE_MAX_MB", "512")),
+            dtype=os.getenv("EMBEDDING_CACHE_DTYPE", "float32")
         )
         
         logger.info(f"Loading Reranker Model ({self.reranker_model_name})...")
         
-        # Use HuggingFaceCrossEncoder with device specification
-        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        if self.inference_backend == "onnx":
+            device = self.embedding_device
+            self.reranker_model = OnnxCrossEncoder(
+                ensure_exported(self.reranker_model_name, "cross-encoder", self.onnx_model_path),
+                max_length=self.rerank_max_length,
+                intra_op_threads=self.onnx_threads,
+                device=device
+            )
+        else:
+            # Use HuggingFaceCrossEncoder with device specification
+            device = torch_device()
+            
+            self.reranker_model = HuggingFaceCrossEncoder(
+                model_name=self.reranker_model_name,
+                model_kwargs={'device': device, 'max_length': self.rerank_max_length}
+            )
         
-        self.reranker_model = HuggingFaceCrossEncoder(
-            model_name=self.reranker_model_name,
-            model_kwargs={'device': device}
+        logger.info(f"Reranker using device: {device} ({self.inference_backend} backend)")
+
+        # Pair scores are shared by every engine instance (and index version) built from this one
+        self.rerank_scorer = CachedCrossEncoder(
+            self.reranker_model,
+            model_name=self.reranker_model_name if self.inference_backend == "torch"
+            else f"{self.reranker_model_name}@onnx-int8",
+            cache_size=int(os.getenv("RERANK_CACHE_SIZE", "50000")),
+            batch_size=self.rerank_batch_size,
+            max_chars=self.rerank_max_chars
         )
         
-        logger.info(f"Reranker using device: {device}")
-        
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,      
+            chunk_overlap=self.chunk_overlap,   
+            separators=["\n\n", "\n", " ", ""]
+        )
+
+        # Off by default: a window adds up to MICROBATCH_WAIT_MS to every search
+        self.configure_micro_batching(
+            wait_ms=float(os.getenv("MICROBATCH_WAIT_MS", "0")),
+            max_queries=int(os.getenv("MICROBATCH_MAX_QUERIES", "64")),
+            max_pairs=int(os.getenv("MICROBATCH_MAX_PAIRS", "512"))
+        )
+
+        # Runs the BM25 leg of each search while the request thread does the vector leg
+        self.retrieval_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RETRIEVAL_LEG_WORKERS", "4")),
+            thread_name_prefix="bm25-leg"
+        )
+
         self.vector_store = None
         self.bm25_retriever = None
+        self.hybrid_retriever = None
+        self.reranker = None
         self.compression_retriever = None
 
+    def configure_micro_batching(self, wait_ms: float, max_queries: int = 64, max_pairs: int = 512):
+        """Batches query embeddings and cross-encoder pairs across concurrent searches.
+
+        Work arriving within `wait_ms` of the first waiting call (or until `max_queries`
+        queries / `max_pairs` pairs are queued) runs as one model call; 0 turns it off.
+        Shared by every engine made with new_instance().
+        """
+        self.embeddings.set_query_batching(wait_ms, max_queries)
+        self.rerank_scorer.set_batching(wait_ms, max_pairs)
+        if wait_ms > 0:
+            logger.info(f"Micro-batching embeddings and reranking over {wait_ms:g} ms windows.")
+
+    def _use_index_dir(self, index_dir: str):
+        self.index_dir = index_dir
+        self.faiss_path = os.path.join(index_dir, "faiss_index")
+        self.bm25_path = os.path.join(index_dir, "bm25_index.bin")
+        self.chunks_path = os.path.join(index_dir, "chunks.bin")
+        self.journal_path = os.path.join(index_dir, "index_journal")
+
+    def new_instance(self, db_path: str = None) -> "RAGEngine":
+        """Engine sharing this one's models and settings, with no index loaded.
+
+        Used to build a new index version while this engine keeps serving the old one.
+        With `db_path`, the engine works on another database directory instead.
+        """
+        engine = copy.copy(self)
+        if db_path:
+            engine.db_path = db_path
+            engine.versions_path = os.path.join(db_path, "versions")
+            engine.current_path = os.path.join(db_path, "CURRENT")
+        engine.vector_store = None
+        engine.bm25_retriever = None
+        engine.hybrid_retriever = None
+        engine.reranker = None
+        engine.compression_retriever = None
+        engine.index_version = None
+        engine.index_revision = 0
+        engine._index_mmapped = False
+        engine._use_index_dir(engine.db_path)
+        return engine
+
+    @property
+    def cache_version(self) -> str:
+        """Identifies the served index contents, for caches of search results and answers."""
+        return f"{self.index_version}+{self.index_revision}"
+
+    def current_version(self):
+        if not os.path.exists(self.current_path):
+            return None
+        with open(self.current_path, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+
+    def _publish_version(self, version: str):
+        # os.replace is atomic: readers see either the old or the new version, never a mix
+        tmp_path = f"{self.current_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.current_path)
+        logger.info(f"Published index version {version}.")
+        self._collect_old_versions()
+
+    def _collect_old_versions(self):
+        current = self.current_version()
+        versions = sorted(os.listdir(self.versions_path), reverse=True)
+        # Files stay readable to processes that still have them mapped after removal
+        for version in versions[self.keep_versions:]:
+            if version != current:
+                shutil.rmtree(os.path.join(self.versions_path, version), ignore_errors=True)
+                logger.info(f"Removed old index version {version}.")
+
     def load_documents_from_json(self, json_path: str) -> List[Document]:
         if not os.path.exists(json_path):
             raise FileNotFoundError(f"JSON file not found: {json_path}")
@@ -92,51 +299,188 @@ class RAGEngine:
         logger.info(f"Loaded {len(documents)} source pages from JSON.")
         return documents
 
-    def build_index(self, documents: List[Document]):
-        if not documents:
-            logger.warning("No documents to index!")
+    def iter_documents_from_jsonl(self, jsonl_path: str) -> Iterator[Document]:
+        if not os.path.exists(jsonl_path):
+            raise FileNotFoundError(f"Page store not found: {jsonl_path}")
+
+        count = 0
+        with open(jsonl_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                count += 1
+                yield Document(page_content=item['content'], metadata=item['metadata'])
+
+        logger.info(f"Streamed {count} source pages from {jsonl_path}.")
+
+    def _split_documents(self, documents: List[Document]) -> List[Document]:
+        splits = []
+        for page in documents:
+            for n, chunk in enumerate(self.text_splitter.split_documents([page])):
+                # Stable ID: the same page always yields the same chunk IDs
+                chunk.metadata["chunk_id"] = f"{page.metadata.get('source')}#{page.metadata.get('logical_page')}#{n}"
+                splits.append(chunk)
+        return splits
+
+    def _new_vector_store(self, vectors: np.ndarray = None, index=None) -> FAISS:
+        if index is None:
+            index = create_faiss_index(
+                self.faiss_index_type,
+                vectors,
+                hnsw_m=self.faiss_hnsw_m,
+                nlist=self.faiss_nlist,
+                pq_m=self.faiss_pq_m
+            )
+            tune_faiss_index(index, ef_search=self.faiss_ef_search, nprobe=self.faiss_nprobe)
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={}
+        )
+
+    @staticmethod
+    def _add_chunks(vector_store: FAISS, chunks: List[Document], vectors, ids: List[str] = None):
+        vector_store.add_embeddings(
+            text_embeddings=list(zip([chunk.page_content for chunk in chunks], vectors)),
+            metadatas=[chunk.metadata for chunk in chunks],
+            ids=ids or [chunk.metadata["chunk_id"] for chunk in chunks]
+        )
+
+    def build_index(self, documents: Iterable[Document]):
+        # Time-ordered id, so the newest versions sort last
+        version = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        version_dir = os.path.join(self.versions_path, version)
+        previous_dir = self.index_dir
+        os.makedirs(version_dir)
+        self._use_index_dir(version_dir)
+
+        try:
+            built = self._build_index(documents)
+        except BaseException:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            self._use_index_dir(previous_dir)
+            raise
+
+        if not built:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            self._use_index_dir(previous_dir)
             return
 
+        self.index_version = version
+        self._publish_version(version)
+
+    def _build_index(self, documents: Iterable[Document]) -> bool:
         logger.info(f"Splitting documents (Chunk: {self.chunk_size}, Overlap: {self.chunk_overlap})...")
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,      
-            chunk_overlap=self.chunk_overlap,   
-            separators=["\n\n", "\n", " ", ""]
-        )
-        splits = text_splitter.split_documents(documents)
-        logger.info(f"Created {len(splits)} chunks from {len(documents)} pages.")
 
-        logger.info("Building FAISS Vector Index...")
-        self.vector_store = FAISS.from_documents(splits, self.embeddings)
-        self.vector_store.save_local(self.faiss_path)
+        # Pages are consumed lazily in bounded batches: each batch is chunked and
+        # embedded as soon as it arrives, so memory for the source pages stays flat
+        # and indexing can overlap with an upstream ingestion generator.
+        logger.info(f"Building FAISS Vector Index ({self.faiss_index_type})...")
+        vector_store = None
+        splits = []
+        vectors = []
+        page_count = 0
+
+        for batch in _batched(documents, self.index_batch_size):
+            page_count += len(batch)
+            batch_splits = self._split_documents(batch)
+            if not batch_splits:
+                continue
+
+            batch_vectors = self.embeddings.embed_documents([chunk.page_content for chunk in batch_splits])
+            if self.faiss_index_type in TRAINED_INDEX_TYPES:
+                # Training needs the whole corpus before the first vector can be added
+                vectors.extend(batch_vectors)
+            else:
+                if vector_store is None:
+                    vector_store = self._new_vector_store(np.asarray(batch_vectors, dtype=np.float32))
+                self._add_chunks(vector_store, batch_splits, batch_vectors)
+
+            # BM25 statistics need the whole corpus, so chunks are kept for it
+            splits.extend(batch_splits)
+            logger.info(f"Embedded {len(splits)} chunks from {page_count} pages so far...")
+
+        if not splits:
+            logger.warning("No documents to index!")
+            return False
+
+        if vector_store is None:
+            vector_store = self._new_vector_store(np.asarray(vectors, dtype=np.float32))
+            self._add_chunks(vector_store, splits, vectors)
+
+        logger.info(f"Created {len(splits)} chunks from {page_count} pages.")
+        self.embeddings.log_stats()
+        self.embeddings.save()
+
+        self.vector_store = vector_store
+        self._index_mmapped = False
+        save_vector_store(self.vector_store, self.faiss_path)
         logger.info(f"FAISS index saved to {self.faiss_path}")
 
         logger.info("Building BM25 Keyword Index...")
-        self.bm25_retriever = BM25Retriever.from_documents(
+        self.bm25_retriever = BM25IndexRetriever.from_documents(
             splits, 
-            preprocess_func=thai_tokenizer
+            preprocess_func=thai_tokenizer,
+            k=self.retrieval_k
         )
-        self.bm25_retriever.k = self.retrieval_k
-        
-        with open(self.bm25_path, 'wb') as f:
-            pickle.dump(self.bm25_retriever, f)
+        self.bm25_retriever.save(self.bm25_path, self.chunks_path)
         logger.info(f"BM25 index saved to {self.bm25_path}")
 
+        # A full rebuild supersedes any pending incremental changes
+        self._clear_journal()
         self._setup_retrieval_pipeline()
+        return True
 
     def load_index(self):
-        if os.path.exists(self.faiss_path) and os.path.exists(self.bm25_path):
-            logger.info("Loading indexes from disk...")
+        version = self.current_version()
+        if version:
+            self._use_index_dir(os.path.join(self.versions_path, version))
+        else:
+            # Layout from before versioned builds: files directly under db_path
+            self._use_index_dir(self.db_path)
+        self.index_version = version
+
+        if os.path.exists(os.path.join(self.faiss_path, "index.faiss")):
+            logger.info(f"Loading indexes from disk (version: {version or 'unversioned'})...")
             
-            self.vector_store = FAISS.load_local(
-                self.faiss_path, 
-                self.embeddings,
-                allow_dangerous_deserialization=True
-            )
+            if os.path.exists(os.path.join(self.faiss_path, "chunks.bin")):
+                self.vector_store = load_vector_store(
+                    self.faiss_path,
+                    self.embeddings,
+                    mmap=self.index_load_mode == "mmap"
+                )
+                self._index_mmapped = self.index_load_mode == "mmap"
+            else:
+                # Older indexes pickle the docstore; compact_index() converts them
+                self.vector_store = FAISS.load_local(
+                    self.faiss_path, 
+                    self.embeddings,
+                    allow_dangerous_deserialization=True
+                )
+                self._index_mmapped = False
+            tune_faiss_index(self.vector_store.index, ef_search=self.faiss_ef_search, nprobe=self.faiss_nprobe)
             
-            with open(self.bm25_path, 'rb') as f:
-                self.bm25_retriever = pickle.load(f)
+            if os.path.exists(self.bm25_path) and os.path.exists(self.chunks_path):
+                self.bm25_retriever = BM25IndexRetriever.load(
+                    self.bm25_path,
+                    self.chunks_path,
+                    preprocess_func=thai_tokenizer,
+                    k=self.retrieval_k
+                )
+            else:
+                # Indexes from older versions only have the (untrusted) BM25 pickle
+                logger.info("BM25 index not found, rebuilding it from the FAISS docstore...")
+                docstore = self.vector_store.docstore
+                self.bm25_retriever = BM25IndexRetriever.from_documents(
+                    (docstore.search(doc_id) for doc_id in self.vector_store.index_to_docstore_id.values()),
+                    preprocess_func=thai_tokenizer,
+                    k=self.retrieval_k
+                )
+                self.bm25_retriever.save(self.bm25_path, self.chunks_path)
             
+            self._replay_journal()
             logger.info("Indexes loaded successfully.")
             self._setup_retrieval_pipeline()
             return True
@@ -144,45 +488,233 @@ class RAGEngine:
             logger.warning("Indexes not found. Please run build_index() first.")
             return False
 
+    def upsert_source(self, source: str, documents: Iterable[Document]) -> int:
+        if not self.vector_store or not self.bm25_retriever:
+            raise ValueError("Indexes not loaded!")
+
+        # Replaces every chunk of `source`; only the new pages are embedded
+        splits = self._split_documents([doc for doc in documents if doc.metadata.get("source") == source])
+        vectors = self.embeddings.embed_documents([chunk.page_content for chunk in splits]) if splits else []
+
+        self.embeddings.save()
+
+        self._apply_delta(source, splits, vectors)
+        self._append_journal(source, splits, vectors)
+        logger.info(f"Upserted {source}: {len(splits)} chunks.")
+        return len(splits)
+
+    def delete_source(self, source: str) -> int:
+        if not self.vector_store or not self.bm25_retriever:
+            raise ValueError("Indexes not loaded!")
+
+        removed = self._apply_delta(source, [], [])
+        self._append_journal(source, [], [])
+        logger.info(f"Deleted {source}: {removed} chunks.")
+        return removed
+
+    def compact_index(self):
+        # Fold the journal into a fresh full snapshot
+        if not self.vector_store or not self.bm25_retriever:
+            raise ValueError("Indexes not loaded!")
+
+        save_vector_store(self.vector_store, self.faiss_path)
+        self.bm25_retriever.save(self.bm25_path, self.chunks_path)
+        self._clear_journal()
+        logger.info("Index snapshot compacted.")
+
+    def _apply_delta(self, source: str, chunks: List[Document], vectors) -> int:
+        if self._index_mmapped:
+            # Mapped indexes are read-only views; edits go to a private heap copy
+            self.vector_store.index = detach_index(self.vector_store.index)
+            self._index_mmapped = False
+
+        # From the stored source codes; only chunks added since loading are decoded
+        mapping = self.vector_store.index_to_docstore_id
+        stale_ids = [mapping[int(position)]
+                     for position in np.flatnonzero(filter_mask(self.vector_store, {"source": [source]}))]
+        if stale_ids:
+            if supports_remove(self.vector_store.index):
+                self.vector_store.delete(stale_ids)
+            else:
+                self._rebuild_vector_store(set(stale_ids))
+        self.bm25_retriever.remove_matching({"source": [source]})
+
+        if chunks:
+            self._add_chunks(self.vector_store, chunks, vectors)
+            self.bm25_retriever.add_documents(chunks)
+
+        if self.hybrid_retriever:
+            self.hybrid_retriever.clear_filter_cache()
+        self.index_revision += 1
+        return len(stale_ids)
+
+    def _rebuild_vector_store(self, drop_ids: set):
+        # For index types without positional removal (HNSW, IVF): re-add the remaining chunks
+        # to an emptied copy that keeps the IVF training; vectors come back from the embedding cache
+        docstore = self.vector_store.docstore
+        keep_ids = [doc_id for doc_id in self.vector_store.index_to_docstore_id.values() if doc_id not in drop_ids]
+        keep = [docstore.search(doc_id) for doc_id in keep_ids]
+        logger.info(f"Rebuilding FAISS index without {len(drop_ids)} chunks...")
+
+        vectors = np.asarray(
+            self.embeddings.embed_documents([doc.page_content for doc in keep]),
+            dtype=np.float32
+        ).reshape(len(keep), self.vector_store.index.d)
+
+        vector_store = self._new_vector_store(index=empty_like(self.vector_store.index))
+        if keep:
+            self._add_chunks(vector_store, keep, vectors, ids=keep_ids)
+        self.vector_store = vector_store
+        if self.compression_retriever:
+            self._setup_retrieval_pipeline()
+
+    def _append_journal(self, source: str, chunks: List[Document], vectors):
+        os.makedirs(self.journal_path, exist_ok=True)
+        journal_file = os.path.join(self.journal_path, "journal.jsonl")
+
+        seq = self._journal_length()
+        vectors_file = None
+        if chunks:
+            vectors_file = f"{seq:06d}.npy"
+            np.save(os.path.join(self.journal_path, vectors_file), np.asarray(vectors, dtype=np.float32))
+
+        entry = {
+            "seq": seq,
+            "source": source,
+            "chunks": [{"content": c.page_content, "metadata": c.metadata} for c in chunks],
+            "vectors": vectors_file
+        }
+        with open(journal_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _journal_length(self) -> int:
+        # Entries, not files: only upserts write a vectors file
+        journal_file = os.path.join(self.journal_path, "journal.jsonl")
+        if not os.path.exists(journal_file):
+            return 0
+        with open(journal_file, 'r', encoding='utf-8') as f:
+            return sum(1 for line in f if line.strip())
+
+    def _replay_journal(self):
+        journal_file = os.path.join(self.journal_path, "journal.jsonl")
+        if not os.path.exists(journal_file):
+            return
+
+        count = 0
+        with open(journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                chunks = [Document(page_content=c["content"], metadata=c["metadata"]) for c in entry["chunks"]]
+                vectors = np.load(os.path.join(self.journal_path, entry["vectors"])) if entry["vectors"] else []
+                self._apply_delta(entry["source"], chunks, vectors)
+                count += 1
+
+        logger.info(f"Replayed {count} incremental index changes from journal.")
+
+    def _clear_journal(self):
+        if os.path.exists(self.journal_path):
+            shutil.rmtree(self.journal_path)
+
     def _setup_retrieval_pipeline(self):
         if not self.vector_store or not self.bm25_retriever:
             raise ValueError("Indexes not loaded!")
 
-        faiss_retriever = self.vector_store.as_retriever(search_kwargs={"k": self.retrieval_k})
         self.bm25_retriever.k = self.retrieval_k
 
-        ensemble_retriever = EnsembleRetriever(
-            retrievers=[self.bm25_retriever, faiss_retriever],
-            weights=[0.4, 0.6] 
+        self.hybrid_retriever = HybridRetriever(
+            bm25_retriever=self.bm25_retriever,
+            vector_store=self.vector_store,
+            executor=self.retrieval_executor,
+            k=self.retrieval_k,
+            weights=[0.4, 0.6]
         )
 
-        compressor = CrossEncoderReranker(model=self.reranker_model, top_n=self.rerank_top_n)
+        self.reranker = CachedCrossEncoderReranker(scorer=self.rerank_scorer, top_n=self.rerank_top_n)
         
-        self.compression_retriever = ContextualCompressionRetriever(
-            base_compressor=compressor,
-            base_retriever=ensemble_retriever
+        self.compression_retriever = RerankRetriever(
+            retriever=self.hybrid_retriever,
+            reranker=self.reranker,
+            mode=self.rerank_mode,
+            min_candidates=self.rerank_min_candidates,
+            gap_ratio=self.rerank_gap_ratio,
+            skip_agreement=self.rerank_skip_agreement
         )
-        logger.info("Retrieval Pipeline Ready (Hybrid + Rerank).")
+        logger.info(f"Retrieval Pipeline Ready (Hybrid + Rerank, {self.rerank_mode} budget).")
+
+    @staticmethod
+    def _filters(sources: Optional[List[str]], languages: Optional[List[str]]) -> Optional[Filters]:
+        filters = {}
+        if sources:
+            filters["source"] = set(sources)
+        if languages:
+            filters["language"] = set(languages)
+        return filters or None
 
-    def search(self, query: str) -> List[Document]:
+    def search(self, query: str, sources: Optional[List[str]] = None,
+               languages: Optional[List[str]] = None) -> List[Document]:
+        """Hybrid search + rerank, optionally restricted to chunks from `sources` and in `languages`."""
         if not self.compression_retriever:
             raise ValueError("Engine not ready! Load or Build index first.")
         
-        logger.info(f"Searching for: '{query}'")
-        return self.compression_retriever.invoke(query)
+        filters = self._filters(sources, languages)
+        logger.info(f"Searching for: '{query}'" + (f" in {filters}" if filters else ""))
+        start = time.perf_counter()
+        docs = self.compression_retriever.invoke(query, filters=filters)
+        record_timings(search_ms=(time.perf_counter() - start) * 1000)
+        logger.info(f"Search timings: {last_timings()}")
+        return docs
+
+    def search_many(self, queries: List[str], sources: Optional[List[str]] = None,
+                    languages: Optional[List[str]] = None) -> List[List[Document]]:
+        """Same results as [search(q) for q in queries], computed in batches.
+
+        All queries are embedded in one pass, searched with one FAISS call, scored
+        with one BM25 sparse product, and the (query, chunk) pairs to rerank go to
+        the cross-encoder in one batched call.
+        """
+        if not self.compression_retriever:
+            raise ValueError("Engine not ready! Load or Build index first.")
+        if not queries:
+            return []
+
+        logger.info(f"Searching for {len(queries)} queries in one batch")
+        start = time.perf_counter()
+        results = self.compression_retriever.search_many(queries, self._filters(sources, languages))
+
+        record_timings(search_ms=(time.perf_counter() - start) * 1000)
+        logger.info(f"Batch search timings: {last_timings()}")
+        return results
+
+    def merge_results(self, result_lists: List[List[Document]], weights: Optional[List[float]] = None) -> List[Document]:
+        """Fuses the reranked results of several phrasings of one question (weighted RRF), keeping rerank_top_n.
+
+        Ties go to the earlier list.
+        """
+        weights = weights or [1.0 / len(result_lists)] * len(result_lists)
+        fused, _ = weighted_reciprocal_rank(result_lists, weights)
+        return fused[:self.rerank_top_n]
+
+    @staticmethod
+    def last_timings() -> dict:
+        """Per-stage timings (ms) and rerank cache counts of the calling thread's last search."""
+        return last_timings()
 
 if __name__ == "__main__":
     engine = RAGEngine()
-    json_input = "ingested_data/ingested_documents.json"
+    store_input = "ingested_data/ingested_documents.jsonl"
     
     if not engine.load_index():
-        print("\nBuilding new index from JSON...")
-        if os.path.exists(json_input):
-            docs = engine.load_documents_from_json(json_input)
+        print("\nBuilding new index from page store...")
+        if os.path.exists(store_input):
+            docs = engine.iter_documents_from_jsonl(store_input)
             engine.build_index(docs)
             print("\nBuild Complete!")
         else:
-            print(f"Error: {json_input} not found.")
+            print(f"Error: {store_input} not found.")
             exit()
 
     query = "What are the logging requirements?"
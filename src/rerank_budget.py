@@ -0,0 +1,97 @@
+import math
+from typing import List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.hybrid_retriever import Filters, FusedCandidates, HybridRetriever, record_timings
+from src.rerank_cache import CachedCrossEncoderReranker
+
+RERANK_MODES = ["full", "adaptive"]
+
+def leg_agreement(candidates: FusedCandidates, top_n: int) -> float:
+    """Share of the top-n chunks that BM25 and FAISS both rank in their own top-n."""
+    if top_n <= 0:
+        return 0.0
+    bm25_top = {doc.page_content for doc in candidates.bm25_docs[:top_n]}
+    vector_top = {doc.page_content for doc in candidates.vector_docs[:top_n]}
+    return len(bm25_top & vector_top) / top_n
+
+def rerank_budget(candidates: FusedCandidates, top_n: int, min_candidates: int,
+                  gap_ratio: float, skip_agreement: float) -> Tuple[int, float]:
+    """Number of fused candidates worth reranking (0 = keep the fused order) and the leg agreement.
+
+    The budget shrinks from every candidate toward `min_candidates` as the legs agree
+    more on their top-n, and candidates whose fused score is below `gap_ratio` times
+    the n-th fused score are cut: they would need to overtake a chunk both legs
+    ranked far higher.
+    """
+    total = len(candidates.docs)
+    agreement = leg_agreement(candidates, top_n)
+    if total <= top_n:
+        return total, agreement
+    if agreement >= skip_agreement:
+        return 0, agreement
+
+    budget = top_n + math.ceil((1.0 - agreement) * (total - top_n))
+    if gap_ratio > 0:
+        threshold = gap_ratio * candidates.scores[top_n - 1]
+        budget = min(budget, sum(1 for score in candidates.scores if score >= threshold))
+    return max(budget, min(min_candidates, total), top_n), agreement
+
+class RerankRetriever(BaseRetriever):
+    """Hybrid first stage followed by cross-encoder reranking.
+
+    In "full" mode every fused candidate is reranked, as ContextualCompressionRetriever
+    did. In "adaptive" mode only the top `rerank_budget` fused candidates are, and
+    none when both legs agree on at least `skip_agreement` of their top-n.
+    """
+
+    retriever: HybridRetriever
+    reranker: CachedCrossEncoderReranker
+    mode: str = "full"
+    min_candidates: int = 10
+    gap_ratio: float = 0.5
+    skip_agreement: float = 0.8
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _budgets(self, fused: List[FusedCandidates]) -> List[int]:
+        if self.mode != "adaptive":
+            return [len(candidates.docs) for candidates in fused]
+        budgets, agreements = zip(*(
+            rerank_budget(candidates, self.reranker.top_n, self.min_candidates, self.gap_ratio, self.skip_agreement)
+            for candidates in fused
+        ))
+        record_timings(
+            rerank_candidates=sum(len(candidates.docs) for candidates in fused),
+            rerank_budget=sum(budgets),
+            rerank_skipped=sum(1 for budget in budgets if budget == 0),
+            leg_agreement=sum(agreements) / len(agreements)
+        )
+        return list(budgets)
+
+    def _rerank(self, queries: List[str], fused: List[FusedCandidates]) -> List[List[Document]]:
+        if not fused:
+            return []
+        budgets = self._budgets(fused)
+        reranked = iter(self.reranker.rerank_many(
+            [query for query, budget in zip(queries, budgets) if budget],
+            [candidates.docs[:budget] for candidates, budget in zip(fused, budgets) if budget]
+        ))
+        # Candidates past the budget are dropped; a skipped query keeps its fused order
+        return [next(reranked) if budget else candidates.docs[:self.reranker.top_n]
+                for candidates, budget in zip(fused, budgets)]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, filters: Optional[Filters] = None
+    ) -> List[Document]:
+        candidates = self.retriever.retrieve(query, filters)
+        if not candidates.docs:
+            return []
+        return self._rerank([query], [candidates])[0]
+
+    def search_many(self, queries: List[str], filters: Optional[Filters] = None) -> List[List[Document]]:
+        return self._rerank(queries, self.retriever.retrieve_many(queries, filters))
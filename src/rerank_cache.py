@@ -0,0 +1,167 @@
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+from langchain_community.cross_encoders import BaseCrossEncoder, HuggingFaceCrossEncoder
+
+from src.batching import MicroBatcher
+from src.hybrid_retriever import record_timings
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S"
+)
+logger = logging.getLogger(__name__)
+
+def normalize_query(query: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", query).split())
+
+class CachedCrossEncoder:
+    """In-memory LRU of cross-encoder scores keyed by (model, normalized query, chunk).
+
+    A chunk is identified by its chunk_id plus a digest of the text that is scored,
+    so a re-ingested chunk with the same id is never served a stale score. Pairs
+    missing from the cache are deduplicated, truncated to `max_chars` and scored
+    in batches of `batch_size`.
+    """
+
+    def __init__(self, model: BaseCrossEncoder, model_name: str, cache_size: int = 50000,
+                 batch_size: int = 32, max_chars: int = 0):
+        self.model = model
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.max_chars = max_chars
+
+        self._scores: "OrderedDict[Tuple[str, str, str, bytes], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Optional MicroBatcher over _predict, merging the misses of concurrent searches
+        self.batcher = None
+
+    def _text(self, doc: Document) -> str:
+        return doc.page_content[:self.max_chars] if self.max_chars else doc.page_content
+
+    def _key(self, query: str, doc: Document) -> Tuple[str, str, str, bytes]:
+        digest = hashlib.blake2b(self._text(doc).encode("utf-8"), digest_size=8).digest()
+        return (self.model_name, query, doc.metadata.get("chunk_id", ""), digest)
+
+    def _predict(self, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        if isinstance(self.model, HuggingFaceCrossEncoder):
+            # Call sentence-transformers directly: HuggingFaceCrossEncoder.score has no batch size
+            scores = self.model.client.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        else:
+            scores = np.concatenate([
+                np.asarray(list(self.model.score(pairs[i:i + self.batch_size])), dtype=np.float32)
+                for i in range(0, len(pairs), self.batch_size)
+            ])
+        scores = np.asarray(scores)
+        # Two-logit models (not relevant, relevant) score with the second column
+        return scores[:, 1] if scores.ndim > 1 else scores
+
+    def set_batching(self, wait_ms: float, max_pairs: int = 512):
+        """Scores the misses of concurrent score_many calls in one model call (0 = off)."""
+        if self.batcher:
+            self.batcher.close()
+        self.batcher = None
+        if wait_ms > 0:
+            self.batcher = MicroBatcher(self._predict, max_batch_size=max_pairs,
+                                        max_wait_ms=wait_ms, name="rerank-batcher")
+
+    def score_many(self, queries: List[str], doc_lists: List[Sequence[Document]]) -> List[List[float]]:
+        """Scores each query against its own candidates, one model call for all misses."""
+        start = time.perf_counter()
+        queries = [normalize_query(query) for query in queries]
+        keys = [[self._key(query, doc) for doc in docs] for query, docs in zip(queries, doc_lists)]
+
+        found: Dict[Tuple[str, str, str, bytes], float] = {}
+        with self._lock:
+            for key in (key for row in keys for key in row):
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    found[key] = self._scores[key]
+
+        # Identical candidates (same query and chunk) are scored once
+        missing: Dict[Tuple[str, str, str, bytes], Tuple[str, str]] = {}
+        for query, docs, row in zip(queries, doc_lists, keys):
+            for doc, key in zip(docs, row):
+                if key not in found and key not in missing:
+                    missing[key] = (query, self._text(doc))
+
+        if missing:
+            pairs = list(missing.values())
+            scores = self.batcher.submit(pairs) if self.batcher else self._predict(pairs)
+            with self._lock:
+                for key, score in zip(missing, scores):
+                    found[key] = self._scores[key] = float(score)
+                while len(self._scores) > self.cache_size:
+                    self._scores.popitem(last=False)
+
+        total = sum(len(row) for row in keys)
+        hits = total - sum(1 for row in keys for key in row if key in missing)
+        with self._lock:
+            self.hits += hits
+            self.misses += total - hits
+
+        record_timings(
+            rerank_ms=(time.perf_counter() - start) * 1000,
+            rerank_pairs=total,
+            rerank_cache_hits=hits,
+            rerank_scored=len(missing)
+        )
+        return [[found[key] for key in row] for row in keys]
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hit_rate(), 4),
+                "entries": len(self._scores)
+            }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"Rerank cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.1%} hit rate), {stats['entries']} cached scores"
+        )
+
+class CachedCrossEncoderReranker(BaseDocumentCompressor):
+    """Drop-in for CrossEncoderReranker that scores through a CachedCrossEncoder."""
+
+    scorer: CachedCrossEncoder
+    top_n: int = 3
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _rank(self, documents: Sequence[Document], scores: List[float]) -> List[Document]:
+        # Stable sort by score, as CrossEncoderReranker does
+        ranked = sorted(zip(documents, scores), key=lambda pair: pair[1], reverse=True)
+        return [doc for doc, _ in ranked[:self.top_n]]
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        return self._rank(documents, self.scorer.score_many([query], [documents])[0])
+
+    def rerank_many(self, queries: List[str], doc_lists: List[Sequence[Document]]) -> List[List[Document]]:
+        scores = self.scorer.score_many(queries, doc_lists)
+        return [self._rank(docs, row) for docs, row in zip(doc_lists, scores)]
@@ -0,0 +1,188 @@
+import os
+import math
+import logging
+
+import numpy as np
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+from src.chunk_store import ChunkDocstore, ChunkStore, RowIdMap, matches, row_id
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S"
+)
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ["Flat", "HNSW", "IVFFlat", "IVFPQ", "SQfp16", "SQ8"]
+# These learn centroids/ranges from the data, so they need all vectors before the first add
+TRAINED_INDEX_TYPES = {"IVFFlat", "IVFPQ", "SQ8"}
+
+# IVF/PQ training is capped; k-means quality barely improves past a few hundred points per centroid
+MAX_TRAIN_VECTORS = 100000
+
+def auto_nlist(n_vectors: int) -> int:
+    # ~4*sqrt(n) lists, with at least 39 training points per centroid (FAISS's own minimum)
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+def factory_string(index_type: str, dim: int, n_vectors: int,
+                   hnsw_m: int = 32, nlist: int = 0, pq_m: int = 48) -> str:
+    if index_type == "Flat":
+        return "Flat"
+    if index_type == "HNSW":
+        return f"HNSW{hnsw_m}"
+    if index_type in ("IVFFlat", "IVFPQ"):
+        nlist = nlist or auto_nlist(n_vectors)
+        if index_type == "IVFFlat":
+            return f"IVF{nlist},Flat"
+        if dim % pq_m:
+            raise ValueError(f"FAISS_PQ_M={pq_m} must divide the embedding dimension {dim}")
+        # 8-bit codebooks need 256 training points; tiny corpora get smaller codebooks
+        nbits = min(8, max(1, int(math.log2(max(2, n_vectors // 39)))))
+        return f"IVF{nlist},PQ{pq_m}x{nbits}"
+    if index_type in ("SQfp16", "SQ8"):
+        return index_type
+    raise ValueError(f"Unknown FAISS_INDEX_TYPE '{index_type}', expected one of {INDEX_TYPES}")
+
+def create_faiss_index(index_type: str, vectors: np.ndarray, hnsw_m: int = 32,
+                       nlist: int = 0, pq_m: int = 48) -> faiss.Index:
+    """Creates an empty (but trained) L2 index of the given type for `vectors`."""
+    n_vectors, dim = vectors.shape
+    spec = factory_string(index_type, dim, n_vectors, hnsw_m=hnsw_m, nlist=nlist, pq_m=pq_m)
+    index = faiss.index_factory(dim, spec, faiss.METRIC_L2)
+
+    if not index.is_trained:
+        sample = vectors
+        if n_vectors > MAX_TRAIN_VECTORS:
+            rows = np.random.default_rng(0).choice(n_vectors, MAX_TRAIN_VECTORS, replace=False)
+            sample = vectors[rows]
+        logger.info(f"Training FAISS index '{spec}' on {len(sample)} vectors...")
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+    else:
+        logger.info(f"Created FAISS index '{spec}'.")
+
+    return index
+
+def tune_faiss_index(index: faiss.Index, ef_search: int = 64, nprobe: int = 8):
+    """Applies query-time parameters; they are not needed to read or write the index."""
+    base = faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = ef_search
+        return
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return
+    ivf.nprobe = min(nprobe, ivf.nlist)
+
+def _search_params(index: faiss.Index, selector, widen: bool = False) -> faiss.SearchParameters:
+    # IVF and HNSW reject untyped parameters or ignore their tuning, so keep nprobe/efSearch
+    base = faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        ef_search = base.hnsw.efSearch
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search * 4 if widen else ef_search)
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return faiss.SearchParameters(sel=selector)
+    return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nlist if widen else ivf.nprobe)
+
+def filtered_search(index: faiss.Index, vectors: np.ndarray, k: int, mask: np.ndarray):
+    """k-NN over only the positions where `mask` is set (bitmap prefilter, no post-filtering).
+
+    Exact for Flat/SQ. When an approximate index returns fewer than min(k, allowed)
+    hits inside the partition, the search is repeated with every IVF list probed
+    (or a 4x HNSW beam) instead of losing recall to the filter.
+    """
+    allowed = int(mask.sum())
+    if allowed == 0:
+        return (np.full((len(vectors), k), np.inf, dtype=np.float32),
+                np.full((len(vectors), k), -1, dtype=np.int64))
+
+    bits = np.packbits(mask, bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bits))
+    distances, indices = index.search(vectors, k, params=_search_params(index, selector))
+    if (indices[:, :min(k, allowed)] == -1).any():
+        distances, indices = index.search(vectors, k, params=_search_params(index, selector, widen=True))
+    return distances, indices
+
+def filter_mask(vector_store: FAISS, filters) -> np.ndarray:
+    """Boolean mask over FAISS positions of the chunks matching `filters`."""
+    n = vector_store.index.ntotal
+    docstore, mapping = vector_store.docstore, vector_store.index_to_docstore_id
+
+    result = np.zeros(n, dtype=bool)
+    start = 0
+    if isinstance(docstore, ChunkDocstore) and isinstance(mapping, RowIdMap):
+        # Positions loaded from chunks.bin use its stored codes; only later additions are decoded
+        start = min(mapping.file_positions(), n)
+        result[:start] = docstore.chunks.mask(filters)[:start]
+    for position in range(start, n):
+        result[position] = matches(docstore.search(mapping[position]).metadata, filters)
+    return result
+
+def supports_remove(index: faiss.Index) -> bool:
+    # LangChain's FAISS.delete expects remove_ids to renumber the remaining vectors, which
+    # only flat-code indexes (Flat, SQ) do. IVF keeps stale ids and HNSW cannot remove at all.
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlatCodes)
+
+def empty_like(index: faiss.Index) -> faiss.Index:
+    """Copy of `index` with its training and search parameters but no vectors."""
+    clone = faiss.clone_index(index)
+    clone.reset()
+    return clone
+
+def detach_index(index: faiss.Index) -> faiss.Index:
+    """Heap copy of a memory-mapped index; mapped indexes must not be modified in place."""
+    return faiss.deserialize_index(faiss.serialize_index(index))
+
+def save_vector_store(vector_store: FAISS, faiss_path: str):
+    """Writes index.faiss plus chunks.bin (docstore in index order) instead of a docstore pickle."""
+    os.makedirs(faiss_path, exist_ok=True)
+
+    # Replace, never overwrite: other workers may have the current files mapped
+    index_file = os.path.join(faiss_path, "index.faiss")
+    faiss.write_index(vector_store.index, f"{index_file}.tmp")
+    os.replace(f"{index_file}.tmp", index_file)
+
+    docstore = vector_store.docstore
+    mapping = vector_store.index_to_docstore_id
+    ChunkStore.write(
+        os.path.join(faiss_path, "chunks.bin"),
+        (docstore.search(mapping[i]) for i in range(vector_store.index.ntotal))
+    )
+
+    legacy_pickle = os.path.join(faiss_path, "index.pkl")
+    if os.path.exists(legacy_pickle):
+        os.remove(legacy_pickle)
+
+def load_vector_store(faiss_path: str, embeddings, mmap: bool = True) -> FAISS:
+    """Loads a store written by save_vector_store.
+
+    With `mmap` the index codes and chunk texts stay in the page cache, shared by
+    every process, and documents are decoded only for returned hits.
+    """
+    index_file = os.path.join(faiss_path, "index.faiss")
+    chunks = ChunkStore.open(os.path.join(faiss_path, "chunks.bin"))
+
+    if mmap:
+        # IO_FLAG_MMAP_IFC maps Flat/SQ codes (also HNSW storage) without copying
+        flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        index = faiss.read_index(index_file, flag)
+        docstore = ChunkDocstore(chunks)
+        index_to_docstore_id = RowIdMap(len(chunks))
+    else:
+        index = faiss.read_index(index_file)
+        documents = list(chunks)
+        ids = [doc.metadata.get("chunk_id") or row_id(i) for i, doc in enumerate(documents)]
+        docstore = InMemoryDocstore(dict(zip(ids, documents)))
+        index_to_docstore_id = dict(enumerate(ids))
+
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id
+    )
@@ -0,0 +1,80 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.rag_engine import RAGEngine
+
+
+ROOT = Path(__file__).resolve().parent.parent
+TEST_QUERIES = ROOT / "tests" / "test_queries.json"
+
+
+def timed_search(engine, query):
+    start = time.perf_counter()
+    engine.search(query)
+    return time.perf_counter() - start
+
+
+def run_level(engine, questions, users, requests):
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(lambda q: timed_search(engine, q), islice(cycle(questions), requests)))
+        elapsed = time.perf_counter() - start
+    return requests / elapsed, np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000
+
+
+def run_benchmark(db_path, windows, users_levels, requests, max_queries, max_pairs):
+    engine = RAGEngine(db_path=db_path)
+    if not engine.load_index():
+        print(f"No index at {db_path}; build one first (python -m src.rag_engine).")
+        sys.exit(1)
+    # Every search must reach the cross-encoder, as distinct user questions would
+    engine.rerank_scorer.cache_size = 0
+    # Enough BM25 leg workers that the legs are not the bottleneck at the highest level
+    engine.retrieval_executor = ThreadPoolExecutor(max_workers=max(users_levels), thread_name_prefix="bm25-leg")
+    engine._setup_retrieval_pipeline()
+
+    with open(TEST_QUERIES, 'r', encoding='utf-8') as f:
+        questions = [q['question'] for q in json.load(f)['queries']]
+    for q in questions[:4]:
+        engine.search(q)  # warm-up
+
+    print(f"{requests} searches per level, rerank cache off, "
+          f"batches of at most {max_queries} queries / {max_pairs} pairs\n")
+    print("| Concurrent users | Window (ms) | Searches per rerank batch | Throughput (searches/s) "
+          "| p50 (ms) | p99 (ms) | Speedup |")
+    print("|------------------|-------------|---------------------------|-------------------------"
+          "|----------|----------|---------|")
+    for users in users_levels:
+        baseline = None
+        for window in windows:
+            engine.configure_micro_batching(window, max_queries, max_pairs)
+            qps, p50, p99 = run_level(engine, questions, users, requests)
+            baseline = baseline or qps
+            batcher = engine.rerank_scorer.batcher
+            per_batch = batcher.mean_requests_per_batch() if batcher else 1.0
+            label = f"{window:g}" if window else "off"
+            print(f"| {users} | {label} | {per_batch:.1f} | {qps:.1f} | {p50:.0f} | {p99:.0f} "
+                  f"| {qps / baseline:.2f}x |")
+    engine.configure_micro_batching(0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross-request micro-batching of query embedding and reranking under concurrency")
+    parser.add_argument("--db", default=os.getenv("DATABASE_PATH", "database"))
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 5, 10, 20], help="ms; 0 = no batching")
+    parser.add_argument("--users", type=int, nargs="+", default=[8, 32, 64])
+    parser.add_argument("--requests", type=int, default=256, help="Searches per level")
+    parser.add_argument("--max-queries", type=int, default=int(os.getenv("MICROBATCH_MAX_QUERIES", "64")))
+    parser.add_argument("--max-pairs", type=int, default=int(os.getenv("MICROBATCH_MAX_PAIRS", "512")))
+    args = parser.parse_args()
+
+    run_benchmark(args.db, args.windows, args.users, args.requests, args.max_queries, args.max_pairs)
@@ -0,0 +1,106 @@
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.rag_engine import thai_tokenizer
+from src.bm25_index import BM25Index, top_k
+
+
+PAGE_STORE = Path(__file__).resolve().parent.parent / "ingested_data" / "ingested_documents.jsonl"
+CORPUS_SIZES = [1000, 10000, 100000]
+QUERIES = [
+    "What are the logging requirements?",
+    "SQL injection prevention",
+    "MITRE ATT&CK tactics and techniques",
+    "การเข้ารหัสข้อมูลที่มีความอ่อนไหว",
+    "มาตรฐานการยืนยันตัวตนด้วยรหัสผ่าน",
+    "broken access control",
+    "การบันทึกข้อมูลล็อก",
+    "security misconfiguration"
+]
+K = 15
+
+
+def load_chunk_tokens():
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1100, chunk_overlap=200, separators=["\n\n", "\n", " ", ""])
+    with open(PAGE_STORE, 'r', encoding='utf-8') as f:
+        pages = [json.loads(line)['content'] for line in f if line.strip()]
+    return [thai_tokenizer(chunk) for page in pages for chunk in splitter.split_text(page)]
+
+
+def synthetic_corpus(seed_docs, size, rng):
+    # Recombine real chunk token spans so term statistics stay close to the real corpus
+    corpus = []
+    for _ in range(size):
+        doc = rng.choice(seed_docs)
+        length = len(doc)
+        start = rng.randrange(max(1, length // 2))
+        tokens = doc[start:] + rng.choice(seed_docs)[:start]
+        corpus.append(tokens)
+    return corpus
+
+
+def time_per_query(func, queries, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for q in queries:
+            func(q)
+    return (time.perf_counter() - start) / (repeats * len(queries)) * 1000
+
+
+def run_benchmark(sizes, repeats):
+    rng = random.Random(0)
+    seed_docs = load_chunk_tokens()
+    queries = [thai_tokenizer(q) for q in QUERIES]
+    rows = []
+
+    for size in sizes:
+        corpus = synthetic_corpus(seed_docs, size, rng)
+        print(f"Indexing {size} chunks...")
+
+        okapi = BM25Okapi(corpus)
+        index = BM25Index.from_tokenized(corpus)
+
+        reference = [np.argsort(okapi.get_scores(q))[::-1][:K] for q in queries]
+        sparse_top = [top_k(index.get_scores(q), K) for q in queries]
+        same_scores = all(np.array_equal(okapi.get_scores(q), index.get_scores(q)) for q in queries)
+        # Synthetic corpora contain duplicate chunks, so compare ranked scores rather than tied ids
+        same_sets = all(np.array_equal(okapi.get_scores(q)[a], okapi.get_scores(q)[b])
+                        for q, a, b in zip(queries, reference, sparse_top))
+
+        okapi_ms = time_per_query(lambda q: np.argsort(okapi.get_scores(q))[::-1][:K], queries,
+                                  max(1, repeats // 10) if size >= 100000 else repeats)
+        sparse_ms = time_per_query(lambda q: top_k(index.get_scores(q), K), queries, repeats)
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for row in index.score_batch(queries):
+                top_k(row, K)
+        batch_ms = (time.perf_counter() - start) / (repeats * len(queries)) * 1000
+
+        rows.append((size, okapi_ms, sparse_ms, batch_ms, same_scores, same_sets))
+
+    print(f"\n| Chunks | rank_bm25 (ms/query) | Sparse (ms/query) | Batch of {len(queries)} (ms/query) "
+          f"| Speedup | Identical scores | Same top-{K} scores |")
+    print("|--------|----------------------|-------------------|--------------------------|---------|"
+          "------------------|--------------------|")
+    for size, okapi_ms, sparse_ms, batch_ms, same_scores, same_sets in rows:
+        print(f"| {size} | {okapi_ms:.2f} | {sparse_ms:.3f} | {batch_ms:.3f} | {okapi_ms / sparse_ms:.0f}x | "
+              f"{'yes' if same_scores else 'NO'} | {'yes' if same_sets else 'NO'} |")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BM25 query latency: rank_bm25 vs sparse postings scoring")
+    parser.add_argument("--sizes", type=int, nargs="+", default=CORPUS_SIZES)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    run_benchmark(args.sizes, args.repeats)
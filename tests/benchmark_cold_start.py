@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import pickle
+import shutil
+import argparse
+import tempfile
+import multiprocessing as mp
+from functools import partial
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+MODES = ["legacy", "memory", "mmap"]
+QUERY = "What are the logging requirements?"
+
+
+def memory_mb():
+    # Linux only: RSS counts every resident page, PSS splits shared pages between processes
+    stats = {}
+    with open("/proc/self/smaps_rollup", 'r') as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                stats[key] = int(rest.split()[0]) / 1024
+    return stats["Rss"], stats["Pss"]
+
+
+def pss_mb(pid):
+    with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def tokenizer():
+    from pythainlp.tokenize import word_tokenize
+    return partial(word_tokenize, engine="newmm")
+
+
+def write_legacy_copy(db_path, legacy_path):
+    """The pre-mmap layout: FAISS save_local (pickled docstore) plus a pickled BM25Retriever."""
+    from langchain_community.retrievers import BM25Retriever
+    from src.chunk_store import ChunkStore
+    from src.vector_index import load_vector_store
+
+    vector_store = load_vector_store(os.path.join(db_path, "faiss_index"), None, mmap=False)
+    vector_store.save_local(os.path.join(legacy_path, "faiss_index"))
+
+    chunks = list(ChunkStore.open(os.path.join(db_path, "chunks.bin")))
+    retriever = BM25Retriever.from_documents(chunks, preprocess_func=tokenizer())
+    with open(os.path.join(legacy_path, "bm25_retriever.pkl"), 'wb') as f:
+        pickle.dump(retriever, f)
+
+
+def load_worker(mode, db_path, legacy_path, results, release):
+    import numpy as np
+    from langchain_community.vectorstores import FAISS
+    from src.bm25_index import BM25IndexRetriever
+    from src.vector_index import load_vector_store
+    preprocess = tokenizer()
+    preprocess("warm up")
+
+    rss_before, pss_before = memory_mb()
+    start = time.perf_counter()
+
+    if mode == "legacy":
+        vector_store = FAISS.load_local(os.path.join(legacy_path, "faiss_index"), None,
+                                        allow_dangerous_deserialization=True)
+        with open(os.path.join(legacy_path, "bm25_retriever.pkl"), 'rb') as f:
+            bm25 = pickle.load(f)
+    else:
+        vector_store = load_vector_store(os.path.join(db_path, "faiss_index"), None, mmap=mode == "mmap")
+        bm25 = BM25IndexRetriever.load(os.path.join(db_path, "bm25_index.bin"), os.path.join(db_path, "chunks.bin"),
+                                       preprocess_func=preprocess)
+    load_s = time.perf_counter() - start
+    rss_loaded, _ = memory_mb()
+
+    # One query touches the pages a worker needs to serve traffic
+    query_vector = np.random.default_rng(0).random(vector_store.index.d).astype(np.float32)
+    vector_store.similarity_search_by_vector(query_vector.tolist(), k=15)
+    bm25.invoke(QUERY)
+    rss_query, _ = memory_mb()
+
+    results.put((os.getpid(), load_s, rss_loaded - rss_before, rss_query - rss_before, pss_before))
+    release.wait()
+
+
+def run_mode(mode, workers, db_path, legacy_path):
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    release = ctx.Event()
+    procs = [ctx.Process(target=load_worker, args=(mode, db_path, legacy_path, results, release))
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+
+    rows = [results.get() for _ in procs]
+    # Read PSS while every worker is alive, so shared pages are split between them
+    pss_index = sum(pss_mb(pid) - pss_before for pid, _, _, _, pss_before in rows)
+    release.set()
+    for p in procs:
+        p.join()
+
+    load_ms = sum(r[1] for r in rows) / len(rows) * 1000
+    rss_loaded = sum(r[2] for r in rows) / len(rows)
+    rss_query = sum(r[3] for r in rows) / len(rows)
+    return load_ms, rss_loaded, rss_query, pss_index
+
+
+def run_benchmark(workers_list, db_path):
+    if not os.path.exists(os.path.join(db_path, "faiss_index", "chunks.bin")):
+        print(f"No index at {db_path}; build one first (python -m src.rag_engine).")
+        sys.exit(1)
+
+    legacy_path = tempfile.mkdtemp(prefix="legacy_index_")
+    try:
+        write_legacy_copy(db_path, legacy_path)
+        rows = []
+        for workers in workers_list:
+            for mode in MODES:
+                print(f"Loading with {workers} worker(s), mode={mode}...")
+                rows.append((workers, mode) + run_mode(mode, workers, db_path, legacy_path))
+    finally:
+        shutil.rmtree(legacy_path)
+
+    print("\n| Workers | Mode | Load (ms) | RSS after load (MB/worker) | RSS after query (MB/worker) "
+          "| Index PSS, all workers (MB) |")
+    print("|---------|------|-----------|----------------------------|-----------------------------|"
+          "-----------------------------|")
+    for workers, mode, load_ms, rss_loaded, rss_query, pss_index in rows:
+        print(f"| {workers} | {mode} | {load_ms:.1f} | {rss_loaded:.1f} | {rss_query:.1f} | {pss_index:.1f} |")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index cold start: load time and memory per worker")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--db", default=os.getenv("DATABASE_PATH", "database"))
+    args = parser.parse_args()
+
+    run_benchmark(args.workers, args.db)
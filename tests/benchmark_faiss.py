@@ -0,0 +1,103 @@
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import faiss
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.rag_engine import RAGEngine
+from src.vector_index import create_faiss_index, tune_faiss_index
+
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGE_STORE = ROOT / "ingested_data" / "ingested_documents.jsonl"
+TEST_QUERIES = ROOT / "tests" / "test_queries.json"
+K = 15
+
+# (index type, tuning parameter, values)
+CONFIGS = [
+    ("Flat", None, [None]),
+    ("HNSW", "ef_search", [16, 64, 128]),
+    ("IVFFlat", "nprobe", [1, 8, 32]),
+    ("IVFPQ", "nprobe", [8, 32]),
+    ("SQfp16", None, [None]),
+    ("SQ8", None, [None])
+]
+
+
+def load_vectors(engine, scale, noise):
+    pages = list(engine.iter_documents_from_jsonl(str(PAGE_STORE)))
+    chunks = engine._split_documents(pages)
+    vectors = np.asarray(engine.embeddings.embed_documents([c.page_content for c in chunks]), dtype=np.float32)
+
+    with open(TEST_QUERIES, 'r', encoding='utf-8') as f:
+        questions = [q['question'] for q in json.load(f)['queries']]
+    queries = np.asarray([engine.embeddings.embed_query(q) for q in questions], dtype=np.float32)
+
+    # Optional synthetic growth: noisy, re-normalized copies of the real chunk vectors
+    rng = np.random.default_rng(0)
+    copies = [vectors]
+    for _ in range(scale - 1):
+        jittered = vectors + rng.normal(0, noise, vectors.shape).astype(np.float32)
+        copies.append(jittered / np.linalg.norm(jittered, axis=1, keepdims=True))
+    return np.vstack(copies), queries
+
+
+def measure(index, queries, ground_truth, repeats):
+    _, found = index.search(queries, K)
+    recall = np.mean([len(set(f) & set(g)) / K for f, g in zip(found, ground_truth)])
+
+    latencies = []
+    for _ in range(repeats):
+        for q in queries:
+            start = time.perf_counter()
+            index.search(q.reshape(1, -1), K)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return recall, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def run_benchmark(scale, noise, repeats, pq_m):
+    faiss.omp_set_num_threads(1)
+    engine = RAGEngine()
+    vectors, queries = load_vectors(engine, scale, noise)
+    print(f"{len(vectors)} vectors (dim {vectors.shape[1]}), {len(queries)} queries, k={K}\n")
+
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    _, ground_truth = flat.search(queries, K)
+
+    rows = []
+    for index_type, param, values in CONFIGS:
+        start = time.perf_counter()
+        index = create_faiss_index(index_type, vectors, pq_m=pq_m)
+        index.add(vectors)
+        build_s = time.perf_counter() - start
+        memory_mb = faiss.serialize_index(index).nbytes / (1024 * 1024)
+
+        for value in values:
+            if param == "ef_search":
+                tune_faiss_index(index, ef_search=value)
+            elif param == "nprobe":
+                tune_faiss_index(index, nprobe=value)
+            recall, p50, p99 = measure(index, queries, ground_truth, repeats)
+            label = f"{index_type} ({param}={value})" if param else index_type
+            rows.append((label, recall, p50, p99, memory_mb, build_s))
+
+    print(f"| Index | Recall@{K} vs Flat | p50 (ms) | p99 (ms) | Memory (MB) | Build (s) |")
+    print("|-------|-------------------|----------|----------|-------------|-----------|")
+    for label, recall, p50, p99, memory_mb, build_s in rows:
+        print(f"| {label} | {recall:.3f} | {p50:.3f} | {p99:.3f} | {memory_mb:.2f} | {build_s:.2f} |")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FAISS index types: recall@k vs Flat, latency and memory")
+    parser.add_argument("--scale", type=int, default=1, help="Replicate the corpus N times with noise")
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--pq-m", type=int, default=48)
+    args = parser.parse_args()
+
+    run_benchmark(args.scale, args.noise, args.repeats, args.pq_m)
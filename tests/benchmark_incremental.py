@@ -0,0 +1,110 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.rag_engine import RAGEngine
+
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGE_STORE = ROOT / "ingested_data" / "ingested_documents.jsonl"
+TEST_QUERIES = ROOT / "tests" / "test_queries.json"
+
+
+def results(engine, questions):
+    return [[doc.metadata["chunk_id"] for doc in engine.search(q)] for q in questions]
+
+
+def agreement(found, expected):
+    same = sum(f == e for f, e in zip(found, expected))
+    return f"{same}/{len(expected)}"
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    value = func(*args)
+    return value, time.perf_counter() - start
+
+
+def row(label, seconds, engine, questions, expected, reference):
+    # Compared right away: the next step changes the engine
+    return (label, seconds, engine.vector_store.index.ntotal, agreement(results(engine, questions), expected), reference)
+
+
+def loaded(base, db_path):
+    engine = base.new_instance(db_path)
+    engine.load_index()
+    return engine
+
+
+def run_check(db_path, source):
+    if not PAGE_STORE.exists():
+        print(f"No page store at {PAGE_STORE}; ingest first (python -m src.document_processor).")
+        sys.exit(1)
+
+    base = RAGEngine(db_path=db_path)
+    pages = list(base.iter_documents_from_jsonl(str(PAGE_STORE)))
+    # Default: the smallest source, as when one new PDF is added to a large corpus
+    source = source or min(Counter(p.metadata["source"] for p in pages).items(), key=lambda x: x[1])[0]
+    source_pages = [p for p in pages if p.metadata["source"] == source]
+    other_pages = [p for p in pages if p.metadata["source"] != source]
+    if not source_pages:
+        print(f"No pages of {source} in {PAGE_STORE}.")
+        sys.exit(1)
+
+    with open(TEST_QUERIES, 'r', encoding='utf-8') as f:
+        questions = [q['question'] for q in json.load(f)['queries']]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        incremental_dir, full_dir = os.path.join(tmp, "incremental"), os.path.join(tmp, "full")
+
+        without = base.new_instance(incremental_dir)
+        _, rebuild_time = timed(without.build_index, other_pages)
+        expected_without = results(without, questions)
+
+        # Before the full rebuild, so the source's chunks are embedded here, as for a new PDF
+        chunks, upsert_time = timed(without.upsert_source, source, source_pages)
+        upserted = (without.vector_store.index.ntotal, results(without, questions))
+
+        full = base.new_instance(full_dir)
+        _, full_time = timed(full.build_index, pages)
+        expected_with = results(full, questions)
+        rows.append(("upsert_source", upsert_time, upserted[0], agreement(upserted[1], expected_with), "with"))
+
+        replayed, load_time = timed(loaded, base, incremental_dir)
+        rows.append(row("load_index (journal replay)", load_time, replayed, questions, expected_with, "with"))
+
+        _, delete_time = timed(replayed.delete_source, source)
+        rows.append(row("delete_source", delete_time, replayed, questions, expected_without, "without"))
+
+        _, compact_time = timed(replayed.compact_index)
+        compacted = loaded(base, incremental_dir)
+        rows.append(row("compact_index, then load_index", compact_time, compacted, questions,
+                        expected_without, "without"))
+
+        print(f"{source}: {len(source_pages)} pages, {chunks} chunks; corpus {len(pages)} pages, "
+              f"{len(questions)} queries\n")
+        print(f"Full rebuild with {source}: {full_time:.2f} s; without it: {rebuild_time:.2f} s "
+              f"(embedding cache shared: only the first run embeds the other sources)\n")
+        print("| Step | Time (s) | Vectors | Same top-N as the full rebuild |")
+        print("|------|----------|---------|--------------------------------|")
+        for label, seconds, vectors, same, reference in rows:
+            print(f"| {label} | {seconds:.2f} | {vectors} | {same} ({reference} {source}) |")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Incremental upsert/delete/journal replay of one source, checked against full rebuilds"
+    )
+    parser.add_argument("--db", default=os.getenv("DATABASE_PATH", "database"),
+                        help="Database whose embedding cache is reused; the indexes are built in a temporary directory")
+    parser.add_argument("--source", help="Source file name in the page store (default: the smallest)")
+    args = parser.parse_args()
+
+    run_check(args.db, args.source)
@@ -0,0 +1,53 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.document_processor import DocumentProcessor, export_markdown_by_page
+
+
+DATASET_DIR = Path(__file__).resolve().parent.parent / "dataset"
+PDF_FILES = ["owasp-top-10.pdf", "mitre-attack-philosophy-2020.pdf"]
+REPEATS = 3
+
+
+def export_per_page(document):
+    return {page_no: document.export_to_markdown(page_no=page_no) for page_no in sorted(document.pages)}
+
+
+def best_of(func, document):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func(document)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def run_benchmark():
+    processor = DocumentProcessor()
+    rows = []
+
+    for filename in PDF_FILES:
+        print(f"Converting {filename}...")
+        document = processor.converter_text.convert(str(DATASET_DIR / filename)).document
+
+        per_page_time, per_page = best_of(export_per_page, document)
+        single_pass_time, single_pass = best_of(export_markdown_by_page, document)
+
+        mismatched = [p for p in per_page if per_page[p] != single_pass.get(p)]
+        rows.append((filename, len(document.pages), per_page_time, single_pass_time, mismatched))
+
+    print("\n| Document | Pages | Per-page export (s) | Single-pass export (s) | Speedup | Byte-identical |")
+    print("|----------|-------|---------------------|------------------------|---------|----------------|")
+    for filename, pages, per_page_time, single_pass_time, mismatched in rows:
+        identical = "yes" if not mismatched else f"NO (pages {mismatched})"
+        print(f"| {filename} | {pages} | {per_page_time:.3f} | {single_pass_time:.3f} | "
+              f"{per_page_time / single_pass_time:.1f}x | {identical} |")
+
+    if any(row[4] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,55 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import pypdfium2 as pdfium
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.document_processor import DocumentProcessor
+
+
+THAI_PDF = Path(__file__).resolve().parent.parent / "dataset" / "thailand-web-security-standard-2025.pdf"
+WORKER_COUNTS = [1, 2, 4]
+
+
+def benchmark(worker_counts, max_pages):
+    pdf = pdfium.PdfDocument(str(THAI_PDF))
+    page_count = min(len(pdf), max_pages) if max_pages else len(pdf)
+    results = []
+
+    print(f"OCR benchmark on {THAI_PDF.name} ({page_count} pages)\n")
+
+    for workers in worker_counts:
+        processor = DocumentProcessor(ocr_workers=workers)
+
+        start = time.time()
+        texts = processor._ocr_pages(pdf, range(page_count))
+        elapsed = time.time() - start
+
+        non_empty = sum(1 for t in texts.values() if t and t.strip())
+        results.append({
+            'workers': workers,
+            'seconds': elapsed,
+            'pages_per_sec': page_count / elapsed,
+            'non_empty_pages': non_empty
+        })
+        print(f"  {workers} worker(s): {elapsed:.1f}s, {page_count / elapsed:.2f} pages/sec")
+
+    baseline = results[0]['pages_per_sec']
+    print("\n| Workers | Time (s) | Pages/sec | Speedup | Non-empty pages |")
+    print("|---------|----------|-----------|---------|-----------------|")
+    for r in results:
+        print(f"| {r['workers']} | {r['seconds']:.1f} | {r['pages_per_sec']:.2f} | "
+              f"{r['pages_per_sec'] / baseline:.2f}x | {r['non_empty_pages']} |")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Thai OCR throughput per worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=WORKER_COUNTS)
+    parser.add_argument("--pages", type=int, default=0, help="Limit to the first N pages (0 = all)")
+    args = parser.parse_args()
+
+    benchmark(args.workers, args.pages)
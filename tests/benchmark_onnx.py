@@ -0,0 +1,131 @@
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.onnx_backend import OnnxCrossEncoder, OnnxEmbeddings, ensure_exported
+from src.rag_engine import RAGEngine
+
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGE_STORE = ROOT / "ingested_data" / "ingested_documents.jsonl"
+TEST_QUERIES = ROOT / "tests" / "test_queries.json"
+TOP_N = 5
+
+
+def torch_models(engine, threads):
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+    if threads:
+        torch.set_num_threads(threads)
+    embeddings = HuggingFaceEmbeddings(
+        model_name=engine.embedding_model_name,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True, 'batch_size': 32}
+    )
+    reranker = HuggingFaceCrossEncoder(
+        model_name=engine.reranker_model_name,
+        model_kwargs={'device': 'cpu', 'max_length': engine.rerank_max_length}
+    )
+    return embeddings, reranker
+
+
+def onnx_models(engine, threads, quantized):
+    embeddings = OnnxEmbeddings(
+        ensure_exported(engine.embedding_model_name, "embedding", engine.onnx_model_path),
+        quantized=quantized, batch_size=32, intra_op_threads=threads
+    )
+    reranker = OnnxCrossEncoder(
+        ensure_exported(engine.reranker_model_name, "cross-encoder", engine.onnx_model_path),
+        quantized=quantized, max_length=engine.rerank_max_length, intra_op_threads=threads
+    )
+    return embeddings, reranker
+
+
+def rerank_scores(reranker, query, docs):
+    scores = np.asarray(list(reranker.score([(query, d.page_content) for d in docs])))
+    return scores[:, 1] if scores.ndim > 1 else scores
+
+
+def top_n(docs, scores):
+    order = sorted(range(len(docs)), key=lambda i: scores[i], reverse=True)[:TOP_N]
+    return [docs[i].page_content for i in order]
+
+
+def run_benchmark(db_path, sample, threads, repeats):
+    engine = RAGEngine(db_path=db_path)
+    if not engine.load_index():
+        print(f"No index at {db_path}; build one first (python -m src.rag_engine).")
+        sys.exit(1)
+
+    pages = list(engine.iter_documents_from_jsonl(str(PAGE_STORE)))
+    chunks = [c.page_content for c in engine._split_documents(pages)][:sample]
+    with open(TEST_QUERIES, 'r', encoding='utf-8') as f:
+        questions = [q['question'] for q in json.load(f)['queries']]
+    candidates = [engine.hybrid_retriever.retrieve(q).docs for q in questions]
+
+    backends = {
+        "torch fp32": torch_models(engine, threads),
+        "onnx fp32": onnx_models(engine, threads, quantized=False),
+        "onnx int8": onnx_models(engine, threads, quantized=True)
+    }
+
+    # Reference outputs from the PyTorch fp32 models
+    ref_embeddings, ref_reranker = backends["torch fp32"]
+    ref_vectors = np.asarray(ref_embeddings.embed_documents(chunks + questions))
+    ref_top = [top_n(docs, rerank_scores(ref_reranker, q, docs)) for q, docs in zip(questions, candidates)]
+
+    print(f"{len(chunks)} chunks, {len(questions)} queries, "
+          f"{np.mean([len(c) for c in candidates]):.1f} rerank candidates/query, threads={threads or 'default'}\n")
+    print(f"| Backend | Cosine drift mean | Cosine drift max | Top-{TOP_N} agreement | Same top-{TOP_N} order "
+          "| Query embed p50 (ms) | Chunks/s | Rerank p50 (ms/query) | Pairs/s |")
+    print("|---------|-------------------|------------------|-----------------|------------------|"
+          "----------------------|----------|-----------------------|---------|")
+
+    for label, (embeddings, reranker) in backends.items():
+        vectors = np.asarray(embeddings.embed_documents(chunks + questions))
+        drift = 1.0 - np.sum(vectors * ref_vectors, axis=1)
+
+        tops = [top_n(docs, rerank_scores(reranker, q, docs)) for q, docs in zip(questions, candidates)]
+        agreement = np.mean([len(set(t) & set(r)) / TOP_N for t, r in zip(tops, ref_top)])
+        same_order = np.mean([t == r for t, r in zip(tops, ref_top)])
+
+        query_ms = []
+        for _ in range(repeats):
+            for q in questions:
+                start = time.perf_counter()
+                embeddings.embed_query(q)
+                query_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        embeddings.embed_documents(chunks)
+        chunks_per_s = len(chunks) / (time.perf_counter() - start)
+
+        rerank_ms = []
+        for _ in range(repeats):
+            for q, docs in zip(questions, candidates):
+                start = time.perf_counter()
+                rerank_scores(reranker, q, docs)
+                rerank_ms.append((time.perf_counter() - start) * 1000)
+        pairs_per_s = sum(len(c) for c in candidates) * repeats / (sum(rerank_ms) / 1000)
+
+        print(f"| {label} | {drift.mean():.2e} | {drift.max():.2e} | {agreement:.3f} | {same_order:.2f} "
+              f"| {np.percentile(query_ms, 50):.1f} | {chunks_per_s:.1f} | {np.percentile(rerank_ms, 50):.1f} "
+              f"| {pairs_per_s:.1f} |")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ONNX Runtime (fp32/int8) vs PyTorch fp32: accuracy and CPU latency")
+    parser.add_argument("--db", default=os.getenv("DATABASE_PATH", "database"))
+    parser.add_argument("--sample", type=int, default=512, help="Chunks used for drift and throughput")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("ONNX_INTRA_OP_THREADS", "0")))
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    run_benchmark(args.db, args.sample, args.threads, args.repeats)
@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.prompt_builder import ANSWER_SYSTEM_PROMPT, build_answer_messages, estimate_tokens
+from src.rag_engine import RAGEngine
+
+
+ROOT = Path(__file__).resolve().parent.parent
+TEST_QUERIES = ROOT / "tests" / "test_queries.json"
+
+# The instructions and examples are unchanged; the old layout only differed in where the context went
+STATIC_INSTRUCTIONS = ANSWER_SYSTEM_PROMPT.rsplit("\n\nThe Context and the Question", 1)[0]
+
+
+def legacy_messages(query, docs):
+    """The previous layout: raw chunks spliced into the system prompt ahead of the question."""
+    context_text = ""
+    for i, doc in enumerate(docs):
+        source = doc.metadata.get("source", "unknown")
+        page = doc.metadata.get("logical_page", "-")
+        content = doc.page_content.replace("\n", " ").strip()
+        content = content.replace("{", "{{").replace("}", "}}")
+        context_text += f"\n--- Document {i+1} (Source: {source}, Page: {page}) ---\n{content}\n"
+    system = f"{STATIC_INSTRUCTIONS}\n\nContext:\n{context_text}\n\nQuestion: {query}\n\nAnswer:"
+    return [{"role": "system", "content": system}, {"role": "user", "content": f"User Question: {query}"}]
+
+
+def packed_messages(query, docs, budget):
+    messages, stats = build_answer_messages(query, docs, budget)
+    roles = {"system": "system", "human": "user"}
+    return [{"role": roles[m.type], "content": m.content} for m in messages], stats
+
+
+def prefill(client, model, messages):
+    # One generated token: the timing is the prompt evaluation alone
+    response = client.post("/api/chat", json={
+        "model": model, "messages": messages, "stream": False, "keep_alive": "1h",
+        "options": {"temperature": 0, "num_predict": 1}
+    })
+    response.raise_for_status()
+    result = response.json()
+    return result.get("prompt_eval_count", 0), result.get("prompt_eval_duration", 0) / 1e6
+
+
+def run_benchmark(db_path, budget, ollama_url, model):
+    engine = RAGEngine(db_path=db_path)
+    if not engine.load_index():
+        print(f"No index at {db_path}; build one first (python -m src.rag_engine).")
+        sys.exit(1)
+
+    with open(TEST_QUERIES, 'r', encoding='utf-8') as f:
+        questions = [q['question'] for q in json.load(f)['queries']]
+    retrieved = engine.search_many(questions)
+
+    packed = [packed_messages(q, docs, budget) for q, docs in zip(questions, retrieved)]
+    layouts = {
+        "spliced system prompt (before)": [legacy_messages(q, docs) for q, docs in zip(questions, retrieved)],
+        f"static prefix + packed context, budget {budget or 'none'} (after)": [messages for messages, _ in packed]
+    }
+    passages = [stats["passages"] for _, stats in packed]
+    chunks = np.mean([len(docs) for docs in retrieved])
+
+    client = None
+    if ollama_url:
+        client = httpx.Client(base_url=ollama_url, timeout=600)
+        try:
+            prefill(client, model, [{"role": "user", "content": "warm up"}])
+        except httpx.HTTPError as e:
+            print(f"Ollama not reachable at {ollama_url} ({e}); reporting estimated tokens only.\n")
+            client = None
+
+    print(f"{len(questions)} queries, {chunks:.1f} retrieved chunks each -> {np.mean(passages):.1f} packed passages\n")
+    print("| Layout | Prompt tokens (est.) | Prompt tokens evaluated (Ollama) | Prefill p50 (ms) | Prefill mean (ms) |")
+    print("|--------|----------------------|----------------------------------|------------------|-------------------|")
+    for label, requests in layouts.items():
+        estimated = np.mean([sum(estimate_tokens(m["content"]) for m in messages) for messages in requests])
+        if client:
+            # Sequential, as requests arrive: each may reuse the previous one's cached prefix
+            evaluated, prefill_ms = zip(*(prefill(client, model, messages) for messages in requests))
+            print(f"| {label} | {estimated:.0f} | {np.mean(evaluated):.0f} "
+                  f"| {np.percentile(prefill_ms, 50):.0f} | {np.mean(prefill_ms):.0f} |")
+        else:
+            print(f"| {label} | {estimated:.0f} | - | - | - |")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer prompt size and Ollama prefill time, old layout vs prompt builder")
+    parser.add_argument("--db", default=os.getenv("DATABASE_PATH", "database"))
+    parser.add_argument("--budget", type=int, default=int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000")))
+    parser.add_argument("--ollama-url", default=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+                        help="Empty to report estimated tokens only")
+    parser.add_argument("--model", default=os.getenv("LLM_GENERATE_MODEL_NAME", "qwen2.5:7b-instruct-q4_0"))
+    args = parser.parse_args()
+
+    run_benchmark(args.db, args.budget, args.ollama_url, args.model)
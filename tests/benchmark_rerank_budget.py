@@ -0,0 +1,93 @@
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.rag_engine import RAGEngine
+from src.rerank_budget import rerank_budget
+
+
+ROOT = Path(__file__).resolve().parent.parent
+TEST_QUERIES = ROOT / "tests" / "test_queries.json"
+
+# (label, fixed top-m or None, min_candidates, gap_ratio, skip_agreement)
+CONFIGS = [
+    ("full", None, None, None, None),
+    ("top-5", 5, None, None, None),
+    ("top-10", 10, None, None, None),
+    ("top-15", 15, None, None, None),
+    ("top-20", 20, None, None, None),
+    ("adaptive (gap 0, no skip)", None, 5, 0.0, 2.0),
+    ("adaptive (gap 0.5, no skip)", None, 10, 0.5, 2.0),
+    ("adaptive (gap 0.5, skip 1.0)", None, 10, 0.5, 1.0),
+    ("adaptive (gap 0.5, skip 0.8)", None, 10, 0.5, 0.8),
+    ("adaptive (gap 0.7, skip 0.6)", None, 5, 0.7, 0.6),
+]
+
+
+def topic_hit(docs, topics):
+    text = " ".join(d.page_content for d in docs).lower()
+    return any(t.lower() in text for t in topics)
+
+
+def run_benchmark(db_path, repeats):
+    engine = RAGEngine(db_path=db_path)
+    if not engine.load_index():
+        print(f"No index at {db_path}; build one first (python -m src.rag_engine).")
+        sys.exit(1)
+
+    # Time real cross-encoder work, not cache lookups
+    engine.rerank_scorer.cache_size = 0
+    top_n = engine.rerank_top_n
+
+    with open(TEST_QUERIES, 'r', encoding='utf-8') as f:
+        queries = json.load(f)['queries']
+    fused = [engine.hybrid_retriever.retrieve(q['question']) for q in queries]
+    reference = [engine.reranker.rerank_many([q['question']], [c.docs])[0] for q, c in zip(queries, fused)]
+
+    print(f"{len(queries)} queries, top_n={top_n}, {np.mean([len(c.docs) for c in fused]):.1f} fused candidates/query\n")
+    print(f"| Budget | Recall@{top_n} vs full | Source hit | Topic hit | Pairs/query | Skipped | Rerank p50 (ms) | Rerank mean (ms) |")
+    print("|--------|-------------------|------------|-----------|-------------|---------|-----------------|------------------|")
+
+    for label, fixed, min_candidates, gap_ratio, skip_agreement in CONFIGS:
+        recalls, source_hits, topic_hits, pairs, skipped, latencies = [], [], [], [], 0, []
+        for q, candidates, expected in zip(queries, fused, reference):
+            if fixed is not None:
+                budget = min(fixed, len(candidates.docs))
+            elif min_candidates is None:
+                budget = len(candidates.docs)
+            else:
+                budget, _ = rerank_budget(candidates, top_n, min_candidates, gap_ratio, skip_agreement)
+
+            for _ in range(repeats):
+                start = time.perf_counter()
+                if budget:
+                    docs = engine.reranker.rerank_many([q['question']], [candidates.docs[:budget]])[0]
+                else:
+                    docs = candidates.docs[:top_n]
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            expected_ids = {d.page_content for d in expected}
+            recalls.append(len(expected_ids & {d.page_content for d in docs}) / max(1, len(expected_ids)))
+            source_hits.append(any(d.metadata.get("source") == q['document_source'] for d in docs))
+            topic_hits.append(topic_hit(docs, q['expected_topics']))
+            pairs.append(budget)
+            skipped += budget == 0
+
+        print(f"| {label} | {np.mean(recalls):.3f} | {np.mean(source_hits):.2f} | {np.mean(topic_hits):.2f} "
+              f"| {np.mean(pairs):.1f} | {skipped}/{len(queries)} | {np.percentile(latencies, 50):.1f} "
+              f"| {np.mean(latencies):.1f} |")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rerank budget: quality vs cross-encoder time on the test queries")
+    parser.add_argument("--db", default=os.getenv("DATABASE_PATH", "database"))
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    run_benchmark(args.db, args.repeats)
@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from langchain.retrievers import EnsembleRetriever
+from src.hybrid_retriever import HybridRetriever, last_timings
+from src.rag_engine import RAGEngine
+
+
+ROOT = Path(__file__).resolve().parent.parent
+TEST_QUERIES = ROOT / "tests" / "test_queries.json"
+
+
+def timed(retriever, questions, repeats):
+    latencies = []
+    for _ in range(repeats):
+        for q in questions:
+            start = time.perf_counter()
+            retriever.invoke(q)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 99), np.mean(latencies)
+
+
+def run_benchmark(db_path, repeats):
+    engine = RAGEngine(db_path=db_path)
+    if not engine.load_index():
+        print(f"No index at {db_path}; build one first (python -m src.rag_engine).")
+        sys.exit(1)
+
+    with open(TEST_QUERIES, 'r', encoding='utf-8') as f:
+        questions = [q['question'] for q in json.load(f)['queries']]
+
+    # The pipeline before: both legs invoked one after the other
+    sequential = EnsembleRetriever(
+        retrievers=[engine.bm25_retriever, engine.vector_store.as_retriever(search_kwargs={"k": engine.retrieval_k})],
+        weights=[0.4, 0.6]
+    )
+    concurrent = HybridRetriever(
+        bm25_retriever=engine.bm25_retriever,
+        vector_store=engine.vector_store,
+        executor=engine.retrieval_executor,
+        k=engine.retrieval_k,
+        weights=[0.4, 0.6]
+    )
+
+    mismatches = 0
+    legs = []
+    for q in questions:
+        expected = [d.page_content for d in sequential.invoke(q)]
+        fused = [d.page_content for d in concurrent.invoke(q)]
+        mismatches += expected != fused
+        legs.append(last_timings())
+    print(f"{len(questions)} queries, k={engine.retrieval_k}: fused rankings differ on {mismatches} query(ies)\n")
+
+    # Warm up tokenizer, embedding model and page cache before timing
+    timed(sequential, questions, 1)
+    timed(concurrent, questions, 1)
+
+    print("| Retriever | p50 (ms) | p99 (ms) | Mean (ms) |")
+    print("|-----------|----------|----------|-----------|")
+    for label, retriever in (("EnsembleRetriever (sequential)", sequential), ("HybridRetriever (concurrent)", concurrent)):
+        p50, p99, mean = timed(retriever, questions, repeats)
+        print(f"| {label} | {p50:.2f} | {p99:.2f} | {mean:.2f} |")
+
+    print("\n| Stage | Mean (ms) |")
+    print("|-------|-----------|")
+    for stage in ("bm25_ms", "embed_ms", "vector_ms", "fusion_ms", "retrieval_ms"):
+        print(f"| {stage} | {np.mean([t[stage] for t in legs]):.2f} |")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hybrid retrieval latency: sequential vs concurrent BM25/FAISS legs")
+    parser.add_argument("--db", default=os.getenv("DATABASE_PATH", "database"))
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    run_benchmark(args.db, args.repeats)
@@ -0,0 +1,62 @@
+import os
+import sys
+import json
+import time
+import argparse
+from itertools import cycle, islice
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.rag_engine import RAGEngine
+
+
+ROOT = Path(__file__).resolve().parent.parent
+TEST_QUERIES = ROOT / "tests" / "test_queries.json"
+
+
+def same_results(a, b):
+    return [(d.page_content, d.metadata) for d in a] == [(d.page_content, d.metadata) for d in b]
+
+
+def run_benchmark(db_path, batch_sizes, repeats):
+    engine = RAGEngine(db_path=db_path)
+    if not engine.load_index():
+        print(f"No index at {db_path}; build one first (python -m src.rag_engine).")
+        sys.exit(1)
+
+    with open(TEST_QUERIES, 'r', encoding='utf-8') as f:
+        questions = [q['question'] for q in json.load(f)['queries']]
+
+    # Correctness: every bundled query, batched vs one at a time
+    expected = [engine.search(q) for q in questions]
+    batched = engine.search_many(questions)
+    mismatches = sum(not same_results(a, b) for a, b in zip(expected, batched))
+    print(f"{len(questions)} queries: search_many differs from search on {mismatches} query(ies)\n")
+
+    print("| Batch size | search() loop (queries/s) | search_many() (queries/s) | Speedup |")
+    print("|------------|---------------------------|---------------------------|---------|")
+    for size in batch_sizes:
+        batch = list(islice(cycle(questions), size))
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for q in batch:
+                engine.search(q)
+        loop_qps = size * repeats / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            engine.search_many(batch)
+        batch_qps = size * repeats / (time.perf_counter() - start)
+
+        print(f"| {size} | {loop_qps:.1f} | {batch_qps:.1f} | {batch_qps / loop_qps:.2f}x |")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched multi-query search throughput vs one search() per query")
+    parser.add_argument("--db", default=os.getenv("DATABASE_PATH", "database"))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    run_benchmark(args.db, args.batch_sizes, args.repeats)
@@ -0,0 +1,103 @@
+import sys
+import json
+import argparse
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.rag_engine import thai_tokenizer
+from src.bm25_index import BM25IndexRetriever
+
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGE_STORE = ROOT / "ingested_data" / "ingested_documents.jsonl"
+TEST_QUERIES = ROOT / "tests" / "test_queries.json"
+K = 15
+# Relative score tolerance: incremental statistics may differ from a fresh build in the last bits
+TOLERANCE = 1e-9
+
+
+def load_chunks():
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1100, chunk_overlap=200, separators=["\n\n", "\n", " ", ""])
+    chunks = []
+    with open(PAGE_STORE, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            page = Document(page_content=item['content'], metadata=item['metadata'])
+            for n, chunk in enumerate(splitter.split_documents([page])):
+                chunk.metadata["chunk_id"] = f"{page.metadata['source']}#{page.metadata.get('logical_page')}#{n}"
+                chunks.append(chunk)
+    return chunks
+
+
+def scores_by_id(retriever, query):
+    scores = retriever.index.get_scores(thai_tokenizer(query))
+    return {doc.metadata["chunk_id"]: score for doc, score in zip(retriever.chunks, scores)}
+
+
+def compare(updated, fresh, queries):
+    """Largest relative score difference, and queries whose top-K differs beyond score ties."""
+    max_diff, reordered = 0.0, 0
+    for query in queries:
+        expected, found = scores_by_id(fresh, query), scores_by_id(updated, query)
+        if expected.keys() != found.keys():
+            return float("inf"), len(queries)
+        scale = max(max(expected.values(), default=0.0), 1.0)
+        max_diff = max(max_diff, max(abs(found[key] - expected[key]) for key in expected) / scale)
+
+        # Positions may only swap chunks whose scores tie within the tolerance
+        ranked_fresh = [doc.metadata["chunk_id"] for doc in fresh.invoke(query)]
+        ranked_updated = [doc.metadata["chunk_id"] for doc in updated.invoke(query)]
+        reordered += any(abs(expected[a] - expected[b]) > TOLERANCE * scale
+                         for a, b in zip(ranked_fresh, ranked_updated))
+    return max_diff, reordered
+
+
+def run_check(sources):
+    if not PAGE_STORE.exists():
+        print(f"No page store at {PAGE_STORE}; ingest first (python -m src.document_processor).")
+        sys.exit(1)
+
+    chunks = load_chunks()
+    with open(TEST_QUERIES, 'r', encoding='utf-8') as f:
+        queries = [q['question'] for q in json.load(f)['queries']]
+    sources = sources or sorted({chunk.metadata["source"] for chunk in chunks})
+
+    def build(documents):
+        return BM25IndexRetriever.from_documents(documents, preprocess_func=thai_tokenizer, k=K)
+
+    failures = 0
+    print(f"{len(chunks)} chunks, {len(queries)} queries, top {K}\n")
+    print("| Source | Step | Max relative score difference | Top-K differing beyond ties |")
+    print("|--------|------|-------------------------------|-----------------------------|")
+    for source in sources:
+        own = [chunk for chunk in chunks if chunk.metadata["source"] == source]
+        others = [chunk for chunk in chunks if chunk.metadata["source"] != source]
+
+        removed = build(chunks)
+        removed.remove_matching({"source": [source]})
+        added = build(others)
+        added.add_documents(own)
+
+        for step, updated, fresh in [("remove_matching", removed, build(others)),
+                                     ("add_documents", added, build(chunks))]:
+            max_diff, reordered = compare(updated, fresh, queries)
+            failures += max_diff > TOLERANCE or reordered > 0
+            print(f"| {source} | {step} | {max_diff:.1e} | {reordered}/{len(queries)} |")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="BM25 index updated in place per source, checked against a fresh build of the same chunks"
+    )
+    parser.add_argument("--source", action="append", help="Source file name in the page store (default: every source)")
+    args = parser.parse_args()
+
+    run_check(args.source)
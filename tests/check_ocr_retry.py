@@ -0,0 +1,78 @@
+import sys
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import pypdfium2 as pdfium
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.document_processor import DocumentProcessor
+from src.ingestion_cache import IngestionCache
+
+
+class FlakyConverter:
+    """Stands in for the OCR converter: raises on the calls listed in `fail_calls`, like a crashed worker."""
+
+    def __init__(self, fail_calls):
+        self.fail_calls = set(fail_calls)
+        self.calls = 0
+
+    def convert(self, stream):
+        self.calls += 1
+        if self.calls in self.fail_calls:
+            raise MemoryError("simulated OCR worker failure")
+        text = f"recognized text of {stream.name}"
+        return SimpleNamespace(document=SimpleNamespace(export_to_markdown=lambda: text))
+
+
+def scanned_pdf(path, pages):
+    # Image-only pages (no text layer, so all go to OCR), each different so their hashes differ
+    images = []
+    for i in range(pages):
+        image = Image.new("L", (595, 842), 255)
+        ImageDraw.Draw(image).rectangle([50, 50 + 100 * i, 300, 120 + 100 * i], fill=0)
+        images.append(image)
+    images[0].save(str(path), save_all=True, append_images=images[1:])
+
+
+def cached_pages(cache_dir, processor, path):
+    cache = IngestionCache(cache_dir)
+    settings_key = cache.settings_key(processor._converter_settings())
+    pdf = pdfium.PdfDocument(str(path))
+    return [cache.get_page(cache.hash_page(pdf[i]), settings_key) is not None for i in range(len(pdf))]
+
+
+def run_check():
+    failures = 0
+
+    def check(label, ok):
+        nonlocal failures
+        failures += not ok
+        print(f"| {label} | {'ok' if ok else 'FAILED'} |")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path, cache_dir = Path(tmp) / "scan.pdf", str(Path(tmp) / "cache")
+        scanned_pdf(path, 3)
+
+        print("| Check | Result |")
+        print("|-------|--------|")
+
+        processor = DocumentProcessor(ocr_workers=1, cache_dir=cache_dir)
+        processor.converter_ocr = FlakyConverter(fail_calls=[2])
+        pages = list(processor.iter_file(str(path)))
+        check("failed page is left out of the ingested pages", len(pages) == 2)
+        check("failed page is not cached, the others are", cached_pages(cache_dir, processor, path) == [True, False, True])
+
+        processor = DocumentProcessor(ocr_workers=1, cache_dir=cache_dir)
+        processor.converter_ocr = FlakyConverter(fail_calls=[])
+        pages = list(processor.iter_file(str(path)))
+        check("next ingest OCRs only the failed page", processor.converter_ocr.calls == 1)
+        check("next ingest returns every page", len(pages) == 3)
+        check("every page is cached afterwards", all(cached_pages(cache_dir, processor, path)))
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    run_check()
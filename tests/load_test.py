@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+import threading
+from itertools import cycle, islice
+from pathlib import Path
+
+import httpx
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+ROOT = Path(__file__).resolve().parent.parent
+TEST_QUERIES = ROOT / "tests" / "test_queries.json"
+
+def stand_in_ollama(latency, capacity):
+    """Ollama /api/chat look-alike: each call holds one of `capacity` slots for `latency` seconds."""
+    server = FastAPI()
+    slots = asyncio.Semaphore(capacity)
+    answer = "Stand-in answer [Source: stand-in.pdf, Page: 1]."
+
+    @server.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        message = {"role": "assistant", "content": answer}
+        if not body.get("stream"):
+            async with slots:
+                await asyncio.sleep(latency)
+            return {"model": body["model"], "message": message, "done": True}
+
+        async def tokens():
+            async with slots:
+                words = answer.split(" ")
+                for word in words:
+                    await asyncio.sleep(latency / len(words))
+                    yield json.dumps({"message": {"role": "assistant", "content": word + " "}, "done": False}) + "\n"
+                yield json.dumps({"message": {"role": "assistant", "content": ""}, "done": True}) + "\n"
+
+        return StreamingResponse(tokens(), media_type="application/x-ndjson")
+
+    return server
+
+def start_in_thread(server_app, port):
+    server = uvicorn.Server(uvicorn.Config(server_app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def start_app(db_path, port, ollama_url, search_workers):
+    env = dict(os.environ,
+               OLLAMA_BASE_URL=ollama_url,
+               DATABASE_PATH=db_path,
+               ANSWER_CACHE_SIZE="0")  # every request must reach the backend
+    if search_workers:
+        env["SEARCH_WORKERS"] = str(search_workers)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+async def wait_ready(client, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return (await client.post("/chat", json={"question": "warm up"})).status_code == 200
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(1)
+    return False
+
+async def run_level(client, clients, requests_per_client, questions):
+    latencies, health_ms, rejected_ms, errors = [], [], [], 0
+    done = asyncio.Event()
+
+    async def chat_client(offset):
+        nonlocal errors
+        for question in islice(cycle(questions[offset:] + questions[:offset]), requests_per_client):
+            start = time.perf_counter()
+            response = await client.post("/chat", json={"question": question})
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            elif response.status_code in (429, 503) and "Retry-After" in response.headers:
+                # Turned away by admission control: it should be quick
+                rejected_ms.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+
+    async def health_probe():
+        # What every other caller sees while the chat requests are in flight
+        while not done.is_set():
+            start = time.perf_counter()
+            await client.get("/health")
+            health_ms.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0.05)
+
+    probe = asyncio.create_task(health_probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(chat_client(i % len(questions)) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe
+    return latencies, health_ms, rejected_ms, errors, elapsed
+
+async def run_load_test(args):
+    with open(TEST_QUERIES, 'r', encoding='utf-8') as f:
+        questions = [q['question'] for q in json.load(f)['queries']]
+
+    start_in_thread(stand_in_ollama(args.latency, args.capacity), args.ollama_port)
+    process = None
+    url = args.url
+    if not url:
+        process = start_app(args.db, args.port, f"http://127.0.0.1:{args.ollama_port}", args.search_workers)
+        url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        limits = httpx.Limits(max_connections=max(args.clients) + 4)
+        async with httpx.AsyncClient(base_url=url, timeout=600, limits=limits) as client:
+            if not await wait_ready(client, args.startup_timeout):
+                print(f"No index at {args.db}; build one first (python -m src.rag_engine).")
+                sys.exit(1)
+
+            # Each /chat makes two backend calls (expansion, generation) of `latency` seconds
+            ceiling = args.capacity / (2 * args.latency)
+            print(f"Stand-in Ollama: {args.latency:.2f}s per call, {args.capacity} concurrent slots "
+                  f"-> at most {ceiling:.2f} req/s\n")
+            print("| Clients | Requests | Throughput (req/s) | Chat p50 (s) | Chat p95 (s) "
+                  "| /health p50 (ms) | /health max (ms) | Rejected (429/503) | Rejection max (ms) | Errors |")
+            print("|---------|----------|--------------------|--------------|--------------"
+                  "|------------------|------------------|--------------------|--------------------|--------|")
+            for clients in args.clients:
+                latencies, health_ms, rejected_ms, errors, elapsed = await run_level(
+                    client, clients, args.requests, questions
+                )
+                chat_p50, chat_p95 = np.percentile(latencies, [50, 95]) if latencies else (float("nan"),) * 2
+                print(f"| {clients} | {len(latencies) + len(rejected_ms) + errors} | {len(latencies) / elapsed:.2f} "
+                      f"| {chat_p50:.2f} | {chat_p95:.2f} "
+                      f"| {np.percentile(health_ms, 50):.1f} | {max(health_ms):.1f} "
+                      f"| {len(rejected_ms)} | {max(rejected_ms, default=0):.0f} | {errors} |")
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Concurrent /chat clients against the API backed by a stand-in Ollama server"
+    )
+    parser.add_argument("--db", default=os.getenv("DATABASE_PATH", "database"))
+    parser.add_argument("--url", help="Use an API already running with OLLAMA_BASE_URL at the stand-in "
+                                      "and ANSWER_CACHE_SIZE=0, instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ollama-port", type=int, default=11435)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=4, help="Requests per client at each level")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per stand-in LLM call")
+    parser.add_argument("--capacity", type=int, default=4, help="Concurrent calls the stand-in serves")
+    parser.add_argument("--search-workers", type=int, default=0, help="SEARCH_WORKERS for the started API")
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    asyncio.run(run_load_test(args))